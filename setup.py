@@ -6,10 +6,13 @@ Algorithm are compiling to python code or executing.
 Read the doc: <https://github.com/vslutov/turingmarkov>
 """
 
-from setuptools import setup, find_packages
+from setuptools import setup, find_packages, Extension
 
 VERSION = "0.1.4" # Don't forget fix in __main__.py
 
+# Optional: without C compiler pure python loops are used
+NATIVE = Extension('turingmarkov._native', ['turingmarkov/_native.c'], optional=True)
+
 setup(name='turingmarkov',
       version=VERSION,
       description=__doc__,
@@ -30,6 +33,8 @@ setup(name='turingmarkov',
                    "Topic :: Utilities",
                    "Topic :: Scientific/Engineering"],
       install_requires=['pytest'],
+      extras_require={'numpy': ['numpy']}, # For --engine numpy
       packages=find_packages(),
+      ext_modules=[NATIVE],
       include_package_data=True,
       entry_points={'console_scripts': ['turingmarkov = turingmarkov.__main__:exec_main']})
@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
 
-"""turingmarkov - Turing machine and markov algorithm emulator."""
+"""turingmarkov - Turing machine and markov algorithm emulator.
 
-from .markov import Algorithm
-from .turing import build_machine
-import pytest, os, sys
+Every command imports only modules it needs (e.g. run markov doesn't
+import turing machine and pytest), so start is fast.
+"""
+
+from contextlib import contextmanager
+from .limits import LimitExceeded
+import os, sys
 
 VERSION = "0.1.4" # Don't forget fix in setup.py
 
@@ -14,48 +18,287 @@ Available commands:
     compile turing : make python code from turing machine and put to stdout
     run markov     : run markov algorithm (from requred file); stdin->stdout
     run turing     : run turing machine (from requred file); stdin->stdout
+    bench          : run benchmark, print json report to stdout
+    serve          : run judging server on --socket or --port (json lines)
+    judge DIR TESTS: run every program *.markov, *.turing from DIR on every test
+                     from TESTS (json lines), print verdict matrix to stdout
     test           : run internal tests
     version        : print version and exit
-    help           : print this help and exit'''
+    help           : print this help and exit
+Available options:
+    --matcher NAME : markov rule matcher: scan (default), automaton or incremental
+    --word NAME    : markov word representation: str (default), rope or bytes
+    --engine NAME  : turing machine engine: dict, table, macro, block or numpy
+                     (default is table, if native backend is built, otherwise dict;
+                     table is ~3 times faster than dict in python, ~40 in native)
+    --backend NAME : inner loops: python or native (default is native, if it's built)
+    --jobs N       : count of processes for running lines in parallel (default 1)
+    --max-tacts N  : stop every line after N tacts
+    --time-limit S : stop every line after S seconds
+    --detect-loops : stop line as soon as configuration is repeated
+    --profile      : print json statistics of rules or transitions to stderr
+                     (lines are executed in one process)
+    --trace FILE   : write every tact to binary trace FILE (lines are executed
+                     in one process, see turingmarkov.tracing.TraceReader)
+    --memo MB      : markov: remember results of runs in MB megabytes of memory
+                     (with --word str runs use python backend, see README)
+    --cache DIR    : keep parsed and checked programs in DIR (default is
+                     $TURINGMARKOV_CACHE, if it's set)
+    --scale N      : bench: multiply sizes of lines by N (default 1)
+    --baseline F   : bench: compare with report from file F, print regressions
+                     to stderr and exit with code 1, if there are any
+    --tolerance X  : bench: allowed part of slowdown or memory growth (default 0.2)
+    --buffer BYTES : write results by blocks of BYTES (default 65536, or every
+                     line at once, if stdout is terminal)
+    --mmap         : map input file to memory instead of reading it
+    --socket PATH  : serve: listen unix socket PATH
+    --port N       : serve: listen tcp port N
+    --host HOST    : serve: address for --port (default 127.0.0.1)
+    --format NAME  : judge: format of verdict matrix: json (default) or csv
+When line is stopped by limit, empty line is printed to stdout and json
+report to stderr, exit code is 1. For serve --jobs is count of workers,
+--max-tacts and --time-limit are limits of every job. For judge they are
+limits of every test, verdicts are OK, WA (wrong answer), TL (limit
+exceeded) and RE (runtime error).'''
 
-def load_markov(argv, stdin):
-    """Load and return markov algorithm."""
+OPTIONS = {'--matcher': 'scan',
+           '--word': 'str',
+           '--engine': None, # See turing.build_machine
+           '--backend': None,
+           '--jobs': '1',
+           '--max-tacts': None,
+           '--time-limit': None,
+           '--detect-loops': False,
+           '--profile': False,
+           '--trace': None,
+           '--cache': None,
+           '--memo': None,
+           '--scale': '1',
+           '--baseline': None,
+           '--tolerance': None, # See bench.TOLERANCE
+           '--buffer': None,
+           '--mmap': False,
+           '--socket': None,
+           '--host': '127.0.0.1',
+           '--port': None,
+           '--format': 'json'}
+
+FLAGS = {'--detect-loops', '--profile', '--mmap'} # Options without value
+
+def parse_options(argv):
+    """Split argv to positional arguments and options.
+
+    Return None if there is unknown option or option without value.
+    """
+    args, options = [], dict(OPTIONS)
+    i = 0
+    while i < len(argv):
+        if argv[i] in FLAGS:
+            options[argv[i]] = True
+            i += 1
+        elif argv[i].startswith('--'):
+            if argv[i] not in OPTIONS or i + 1 == len(argv):
+                return None
+            options[argv[i]] = argv[i + 1]
+            i += 2
+        else:
+            args.append(argv[i])
+            i += 1
+    return args, options
+
+def read_source(argv, stdin):
+    """Return lines of program from file (if it's given) or stdin."""
     if len(argv) > 3:
         with open(argv[3]) as input_file:
-            return Algorithm(input_file.readlines())
+            return list(input_file)
     else:
-        return Algorithm(stdin.readlines())
+        return list(stdin)
 
-def load_turing(argv, stdin):
-    """Load and return turing machine."""
-    if len(argv) > 3:
-        with open(argv[3]) as input_file:
-            return build_machine(input_file.readlines())
+def get_cache(options):
+    """Return program cache or None, if it's not enabled."""
+    directory = options['--cache'] or os.environ.get('TURINGMARKOV_CACHE')
+    if not directory:
+        return None
+    from .cache import ProgramCache
+    return ProgramCache(directory, VERSION)
+
+def get_output(options, stdout):
+    """Return output buffer for results."""
+    from .streams import BUFFER_SIZE, OutputBuffer
+    if options['--buffer'] is not None:
+        size = int(options['--buffer'])
+    elif hasattr(stdout, 'isatty') and stdout.isatty():
+        size = 0 # User waits for every line
     else:
-        return build_machine(stdin.readlines())
+        size = BUFFER_SIZE
+    return OutputBuffer(stdout, size)
+
+def load_markov(argv, stdin, matcher='scan', word='str', cache=None, backend=None):
+    """Load and return markov algorithm."""
+    from .markov import Algorithm
+    lines = read_source(argv, stdin)
+    build = lambda: Algorithm(lines, matcher=matcher, word=word, backend=backend)
+    if cache is None:
+        return build()
+    return cache.get('markov', lines, build, matcher=matcher, word=word, backend=backend)
 
-def main(argv, stdin, stdout):
+def load_turing(argv, stdin, engine=None, cache=None, backend=None):
+    """Load and return turing machine."""
+    from .turing import build_machine
+    lines = read_source(argv, stdin)
+    build = lambda: build_machine(lines, engine=engine, backend=backend)
+    if cache is None:
+        return build()
+    return cache.get('turing', lines, build, engine=engine, backend=backend)
+
+@contextmanager
+def open_trace(options, kind, program):
+    """Return trace of the program to the file from options (None, if it isn't given)."""
+    if options['--trace'] is None:
+        yield None
+        return
+    from . import tracing
+    with open(options['--trace'], 'wb') as stream:
+        if kind == 'markov':
+            trace = tracing.MarkovTrace(stream, program)
+        else:
+            trace = tracing.TuringTrace(stream, program)
+        try:
+            yield trace
+        finally:
+            trace.close()
+
+def run_lines(program, strings, options, stdout, stderr, profile=None, trace=None):
+    """Execute program on every string, print results.
+
+    If profile or trace is given, lines are executed in this process;
+    profile is printed to stderr at the end.
+    Return False if some line was stopped by limits.
+    """
+    max_tacts = options['--max-tacts']
+    max_time = options['--time-limit']
+    workers = int(options['--jobs']) if profile is None and trace is None else None
+    results = program.execute_many(strings, workers=workers,
+                                   max_tacts=int(max_tacts) if max_tacts else None,
+                                   max_time=float(max_time) if max_time else None,
+                                   detect_loops=options['--detect-loops'],
+                                   profile=profile, trace=trace, catch=LimitExceeded)
+    success = True
+    output = get_output(options, stdout)
+    try:
+        for number, result in enumerate(results, 1):
+            if isinstance(result, LimitExceeded):
+                import json
+                output.flush() # Keep order of results and reports
+                report = dict(result.as_dict(), line=number)
+                print(json.dumps(report, sort_keys=True), file=stderr)
+                result = ''
+                success = False
+            output.write_line(result)
+    finally:
+        output.flush()
+    if profile is not None:
+        import json
+        print(json.dumps({'profile': profile.as_dict()}, sort_keys=True), file=stderr)
+    return success
+
+def main(argv, stdin, stdout, stderr=None):
     """Execute, when user call turingmarkov."""
+    if stderr is None:
+        stderr = sys.stderr
+    parsed = parse_options(argv)
+    if parsed is not None:
+        argv, options = parsed
+    else:
+        argv, options = [], OPTIONS
+
     if len(argv) > 1 and argv[1:3] == ["compile", "markov"]:
-        algo = load_markov(argv, stdin)
+        algo = load_markov(argv, stdin, cache=get_cache(options))
         print(algo.compile(), file=stdout)
     elif len(argv) == 4 and argv[1:3] == ["run", "markov"]:
-        algo = load_markov(argv, stdin)
-        for line in stdin:
-            print(algo.execute(''.join(line.split())), file=stdout)
+        algo = load_markov(argv, stdin, matcher=options['--matcher'], word=options['--word'],
+                           cache=get_cache(options), backend=options['--backend'])
+        if options['--memo'] is not None:
+            from .memo import Memo
+            algo.memo = Memo(int(float(options['--memo']) * 1024 * 1024))
+        from .streams import read_lines, strip_spaces
+        strings = map(strip_spaces, read_lines(stdin, options['--mmap']))
+        profile = None
+        if options['--profile']:
+            from .profiling import MarkovProfile
+            profile = MarkovProfile(algo)
+        with open_trace(options, 'markov', algo) as trace:
+            success = run_lines(algo, strings, options, stdout, stderr, profile, trace)
+        if not success:
+            exit(1)
 
     elif len(argv) > 1 and argv[1:3] == ["compile", "turing"]:
-        machine = load_turing(argv, stdin)
+        machine = load_turing(argv, stdin, cache=get_cache(options))
         print(machine.compile(), file=stdout)
     elif len(argv) == 4 and argv[1:3] == ["run", "turing"]:
-        machine = load_turing(argv, stdin)
-        for line in stdin:
-            print(machine.execute(line), file=stdout)
+        machine = load_turing(argv, stdin, engine=options['--engine'],
+                              cache=get_cache(options), backend=options['--backend'])
+        profile = None
+        if options['--profile']:
+            from .profiling import TuringProfile
+            profile = TuringProfile()
+        from .streams import read_lines
+        strings = read_lines(stdin, options['--mmap'])
+        with open_trace(options, 'turing', machine) as trace:
+            success = run_lines(machine, strings, options, stdout, stderr, profile, trace)
+        if not success:
+            exit(1)
+
+    elif len(argv) == 2 and argv[1] == "bench":
+        from . import bench
+        import json
+        report = bench.run_bench(scale=int(options['--scale']), matcher=options['--matcher'],
+                                 word=options['--word'], engine=options['--engine'])
+        print(json.dumps(report, indent=2, sort_keys=True), file=stdout)
+        if options['--baseline'] is not None:
+            with open(options['--baseline']) as baseline_file:
+                baseline = json.load(baseline_file)
+            tolerance = options['--tolerance']
+            regressions = bench.compare(report, baseline,
+                                        float(tolerance) if tolerance else bench.TOLERANCE)
+            for regression in regressions:
+                print(regression, file=stderr)
+            if regressions:
+                exit(1)
+
+    elif (len(argv) == 2 and argv[1] == "serve" and
+          (options['--socket'] is not None or options['--port'] is not None)):
+        max_tacts = options['--max-tacts']
+        max_time = options['--time-limit']
+        from . import server
+        server.serve(path=options['--socket'], host=options['--host'],
+                     port=int(options['--port'] or 0), workers=int(options['--jobs']),
+                     max_tacts=int(max_tacts) if max_tacts else None,
+                     max_time=float(max_time) if max_time else None, stderr=stderr)
+
+    elif (len(argv) == 4 and argv[1] == "judge" and
+          options['--format'] in ('json', 'csv')):
+        max_tacts = options['--max-tacts']
+        max_time = options['--time-limit']
+        from . import judge
+        with open(argv[3]) as tests_file:
+            tests = judge.read_tests(tests_file)
+        matrix = judge.judge(judge.find_programs(argv[2]), tests,
+                             options={'markov': {'matcher': options['--matcher'],
+                                                 'word': options['--word'],
+                                                 'backend': options['--backend']},
+                                      'turing': {'engine': options['--engine'],
+                                                 'backend': options['--backend']}},
+                             workers=int(options['--jobs']),
+                             max_tacts=int(max_tacts) if max_tacts else None,
+                             max_time=float(max_time) if max_time else None,
+                             detect_loops=options['--detect-loops'])
+        judge.FORMATS[options['--format']](matrix, stdout)
 
     elif len(argv) == 2 and argv[1] == "test":
+        import pytest # Slow import, it's needed only here
         path = os.path.abspath(os.path.dirname(__file__))
-        argv[1] = path
-        pytest.main()
+        pytest.main([path])
     elif len(argv) == 2 and argv[1] == "version":
         print("TuringMarkov", VERSION, file=stdout)
 
@@ -0,0 +1,264 @@
+/* -*- coding: utf-8 -*-
+ *
+ * Native inner loops of turingmarkov (optional, see turingmarkov/backends.py).
+ *
+ * markov_run executes ASCII markov algorithm with scan matcher on bytearray,
+ * table_run executes TableMachine over its packed transition table.
+ * Both functions stop after limit tacts, so python code can check the
+ * time and tacts budget, and return counter of tacts to continue.
+ */
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <string.h>
+
+#define MARKOV_STOP 0     /* No applicable rule */
+#define MARKOV_TERMINAL 1 /* Terminal rule was applied */
+#define MARKOV_LIMIT 2    /* Counter reached limit */
+
+#define TABLE_HALT 0  /* Machine is in terminate state */
+#define TABLE_ERROR 1 /* There is no rule for the symbol */
+#define TABLE_LIMIT 2 /* Counter reached limit */
+#define TABLE_GROW 3  /* Head is out of tape, python should grow it */
+
+#define HALT_ROW -1 /* Same as TransitionTable.HALT */
+
+#define SIGNALS_EVERY 0xFFFF /* Check ctrl+C every 65536 tacts */
+
+#if (defined(__GLIBC__) || defined(__APPLE__) || defined(__FreeBSD__)) && \
+    !defined(TURINGMARKOV_NO_MEMMEM)
+#define HAVE_MEMMEM /* Two-way search of libc */
+#endif
+
+/* Same as bytes.find: memmem of libc or Boyer-Moore-Horspool search. */
+static Py_ssize_t
+find(const char *word, Py_ssize_t length, const char *pattern, Py_ssize_t size)
+{
+#ifdef HAVE_MEMMEM
+    const char *found;
+
+    if (size == 0)
+        return 0;
+    found = memmem(word, length, pattern, size);
+    return found == NULL ? -1 : found - word;
+#else
+    Py_ssize_t skip[256], pos, i;
+    unsigned char symbol, last;
+
+    if (size == 0)
+        return 0;
+    /* Window is shifted by its last symbol, so that it matches the pattern */
+    last = (unsigned char) pattern[size - 1];
+    for (i = 0; i < 256; i++)
+        skip[i] = size;
+    for (i = 0; i < size - 1; i++)
+        skip[(unsigned char) pattern[i]] = size - 1 - i;
+    for (pos = 0; pos + size <= length; pos += skip[symbol]) {
+        symbol = (unsigned char) word[pos + size - 1];
+        if (symbol == last && word[pos] == pattern[0] &&
+                memcmp(word + pos, pattern, size - 1) == 0)
+            return pos;
+    }
+    return -1;
+#endif
+}
+
+/* Replace word[pos:pos+removed] by text in place. */
+static int
+substitute(PyObject *word, Py_ssize_t pos, Py_ssize_t removed, PyObject *text)
+{
+    Py_ssize_t length = PyByteArray_GET_SIZE(word);
+    Py_ssize_t inserted = PyBytes_GET_SIZE(text);
+    Py_ssize_t tail = length - pos - removed;
+    char *buffer;
+
+    if (inserted > removed) {
+        if (PyByteArray_Resize(word, length + inserted - removed) < 0)
+            return -1;
+        buffer = PyByteArray_AS_STRING(word);
+        memmove(buffer + pos + inserted, buffer + pos + removed, tail);
+    }
+    else {
+        buffer = PyByteArray_AS_STRING(word);
+        memmove(buffer + pos + inserted, buffer + pos + removed, tail);
+        if (inserted < removed) {
+            if (PyByteArray_Resize(word, length + inserted - removed) < 0)
+                return -1;
+            buffer = PyByteArray_AS_STRING(word);
+        }
+    }
+    memcpy(buffer + pos, PyBytes_AS_STRING(text), inserted);
+    return 0;
+}
+
+PyDoc_STRVAR(markov_run_doc,
+"markov_run(word, lhs, rhs, terminal, counter, limit) -> (status, counter, index)\n\n"
+"Apply rules to bytearray word in place, until there is no applicable rule,\n"
+"terminal rule is applied or counter reaches limit. lhs and rhs are tuples\n"
+"of bytes, terminal is bytes of flags. Index is the last applied rule or -1.");
+
+static PyObject *
+markov_run(PyObject *self, PyObject *args)
+{
+    PyObject *word, *lhs, *rhs, *pattern;
+    const char *terminal;
+    Py_ssize_t count, terminal_size, counter, limit, index, pos, last = -1;
+
+    if (!PyArg_ParseTuple(args, "O!O!O!y#nn", &PyByteArray_Type, &word,
+                          &PyTuple_Type, &lhs, &PyTuple_Type, &rhs,
+                          &terminal, &terminal_size, &counter, &limit))
+        return NULL;
+
+    count = PyTuple_GET_SIZE(lhs);
+    if (PyTuple_GET_SIZE(rhs) != count || terminal_size != count) {
+        PyErr_SetString(PyExc_ValueError, "lhs, rhs and terminal have different sizes");
+        return NULL;
+    }
+    for (index = 0; index < count; index++) {
+        if (!PyBytes_Check(PyTuple_GET_ITEM(lhs, index)) ||
+                !PyBytes_Check(PyTuple_GET_ITEM(rhs, index))) {
+            PyErr_SetString(PyExc_TypeError, "parts of rules should be bytes");
+            return NULL;
+        }
+    }
+
+    while (1) {
+        pos = -1;
+        for (index = 0; index < count; index++) {
+            pattern = PyTuple_GET_ITEM(lhs, index);
+            pos = find(PyByteArray_AS_STRING(word), PyByteArray_GET_SIZE(word),
+                       PyBytes_AS_STRING(pattern), PyBytes_GET_SIZE(pattern));
+            if (pos != -1)
+                break;
+        }
+        if (pos == -1)
+            return Py_BuildValue("inn", MARKOV_STOP, counter, (Py_ssize_t) -1);
+
+        if (substitute(word, pos, PyBytes_GET_SIZE(pattern), PyTuple_GET_ITEM(rhs, index)) < 0)
+            return NULL;
+        counter++;
+        last = index;
+        if (terminal[index])
+            return Py_BuildValue("inn", MARKOV_TERMINAL, counter, last);
+        if (counter >= limit)
+            return Py_BuildValue("inn", MARKOV_LIMIT, counter, last);
+        if ((counter & SIGNALS_EVERY) == 0 && PyErr_CheckSignals() < 0)
+            return NULL;
+    }
+}
+
+PyDoc_STRVAR(table_run_doc,
+"table_run(tape, write, move, target, row, head, counter, limit) -> (status, row, head, counter)\n\n"
+"Execute machine on bytearray tape in place, until it halts, has no rule,\n"
+"counter reaches limit or head leaves the tape. write is bytes, move is\n"
+"array('b') and target is array('i') (see TransitionTable.packed).");
+
+static PyObject *
+table_run(PyObject *self, PyObject *args)
+{
+    PyObject *tape;
+    Py_buffer write, move, target;
+    Py_ssize_t row, head, counter, limit, size, cell;
+    unsigned char *cells;
+    const unsigned char *writes;
+    const signed char *moves;
+    const int *targets;
+    int next, status;
+
+    if (!PyArg_ParseTuple(args, "O!y*y*y*nnnn", &PyByteArray_Type, &tape,
+                          &write, &move, &target, &row, &head, &counter, &limit))
+        return NULL;
+
+    if (move.len != write.len || target.len != write.len * (Py_ssize_t) sizeof(int)) {
+        PyBuffer_Release(&write);
+        PyBuffer_Release(&move);
+        PyBuffer_Release(&target);
+        PyErr_SetString(PyExc_ValueError, "write, move and target have different sizes");
+        return NULL;
+    }
+
+    cells = (unsigned char *) PyByteArray_AS_STRING(tape);
+    size = PyByteArray_GET_SIZE(tape);
+    writes = write.buf;
+    moves = move.buf;
+    targets = target.buf;
+    status = TABLE_LIMIT;
+
+    while (1) {
+        if (head < 0 || head >= size) {
+            status = TABLE_GROW;
+            break;
+        }
+        cell = row + cells[head];
+        if (row < 0 || cell >= write.len) {
+            PyErr_SetString(PyExc_ValueError, "row is out of table");
+            status = -1;
+            break;
+        }
+        next = targets[cell];
+        if (next < 0) {
+            if (next == HALT_ROW) {
+                cells[head] = writes[cell];
+                head += moves[cell];
+                counter++;
+                row = next;
+                status = TABLE_HALT;
+            }
+            else
+                status = TABLE_ERROR;
+            break;
+        }
+        cells[head] = writes[cell];
+        head += moves[cell];
+        counter++;
+        row = next;
+        if (counter >= limit) {
+            status = TABLE_LIMIT;
+            break;
+        }
+        if ((counter & SIGNALS_EVERY) == 0 && PyErr_CheckSignals() < 0) {
+            status = -1;
+            break;
+        }
+    }
+
+    PyBuffer_Release(&write);
+    PyBuffer_Release(&move);
+    PyBuffer_Release(&target);
+    if (status < 0)
+        return NULL;
+    return Py_BuildValue("innn", status, row, head, counter);
+}
+
+static PyMethodDef native_methods[] = {
+    {"markov_run", markov_run, METH_VARARGS, markov_run_doc},
+    {"table_run", table_run, METH_VARARGS, table_run_doc},
+    {NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef native_module = {
+    PyModuleDef_HEAD_INIT,
+    "turingmarkov._native",
+    "Native inner loops of turingmarkov.",
+    -1,
+    native_methods
+};
+
+PyMODINIT_FUNC
+PyInit__native(void)
+{
+    PyObject *module = PyModule_Create(&native_module);
+    if (module == NULL)
+        return NULL;
+    if (PyModule_AddIntConstant(module, "MARKOV_STOP", MARKOV_STOP) < 0 ||
+            PyModule_AddIntConstant(module, "MARKOV_TERMINAL", MARKOV_TERMINAL) < 0 ||
+            PyModule_AddIntConstant(module, "MARKOV_LIMIT", MARKOV_LIMIT) < 0 ||
+            PyModule_AddIntConstant(module, "TABLE_HALT", TABLE_HALT) < 0 ||
+            PyModule_AddIntConstant(module, "TABLE_ERROR", TABLE_ERROR) < 0 ||
+            PyModule_AddIntConstant(module, "TABLE_LIMIT", TABLE_LIMIT) < 0 ||
+            PyModule_AddIntConstant(module, "TABLE_GROW", TABLE_GROW) < 0) {
+        Py_DECREF(module);
+        return NULL;
+    }
+    return module;
+}
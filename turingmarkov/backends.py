@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+"""Backends of the inner loops: pure python or native extension.
+
+Native extension (turingmarkov._native, see _native.c) is optional: setup.py
+builds it, if there is a C compiler, otherwise python loops are used.
+Native loops are used for markov algorithms with scan matcher on ASCII
+words and for table engine of turing machine, results are the same.
+Default backend can be set by environment variable TURINGMARKOV_BACKEND
+(e.g. to run tests with both of them).
+"""
+
+import os
+
+try:
+    from . import _native
+except ImportError:
+    _native = None
+
+BACKENDS = ('python', 'native')
+DEFAULT = os.environ.get('TURINGMARKOV_BACKEND') or None
+
+def available_backends():
+    """Return names of backends, which can be used here."""
+    return [name for name in BACKENDS if name == 'python' or _native is not None]
+
+def get_native(backend=None):
+    """Return native module, if backend with given name uses it, otherwise None.
+
+    None is DEFAULT or the best available backend.
+    """
+    if backend is None:
+        backend = DEFAULT
+    if backend is None:
+        return _native
+    if backend not in BACKENDS:
+        raise ValueError('Unknown backend: ' + backend)
+    if backend == 'native' and _native is None:
+        raise ValueError('Native backend is not built')
+    return _native if backend == 'native' else None
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+"""Execution of one algorithm (or machine) on many input lines.
+
+Program is sent to every worker process once, after that lines are sent
+by chunks. Results are returned in the same order as input lines.
+"""
+
+from collections import deque
+from itertools import islice
+
+CHUNK_SIZE = 64
+
+_PROGRAM = None
+
+def _init_worker(program):
+    """Remember program in the worker process."""
+    global _PROGRAM
+    _PROGRAM = program
+
+def _execute_chunk(strings, options):
+    """Execute program on every string of the chunk (in the worker process).
+
+    Return list of pairs (result, None) or (None, exception).
+    """
+    results = []
+    for string in strings:
+        try:
+            results.append((_PROGRAM.execute(string, **options), None))
+        except Exception as err: # Will be raised in the main process
+            results.append((None, err))
+    return results
+
+def execute_many(program, strings, workers=None, catch=(), **options):
+    """Execute program on every string, yield results in input order.
+
+    If workers is None or 1, everything is done in this process.
+    Exception is raised on the line, which caused it; exceptions of types
+    from catch are yielded instead of results, so execution goes on.
+    Options (e.g. max_tacts) are passed to program.execute for every line.
+    """
+    if workers is None or workers <= 1:
+        for string in strings:
+            try:
+                yield program.execute(string, **options)
+            except catch as err:
+                yield err
+        return
+
+    from concurrent.futures import ProcessPoolExecutor # Slow import, only for workers
+    strings = iter(strings)
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(program,)) as pool:
+        pending = deque()
+        while True:
+            chunk = list(islice(strings, CHUNK_SIZE))
+            if chunk != []:
+                pending.append(pool.submit(_execute_chunk, chunk, options))
+            # Keep workers busy, but don't read the whole input at once
+            if pending and (chunk == [] or len(pending) > 2 * workers):
+                for result, err in pending.popleft().result():
+                    if err is None:
+                        yield result
+                    elif isinstance(err, catch):
+                        yield err
+                    else:
+                        raise err
+            elif chunk == []:
+                break
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark of emulators on the corpus of classic programs.
+
+Every program of the corpus is executed on random lines of growing size,
+results are checked, speed (tacts per second), latency of lines and peak
+memory are measured. Report is a dict, which can be saved as json and
+used as a baseline for the next run: compare() returns list of
+regressions.
+"""
+
+import random, time, tracemalloc
+from .markov import Algorithm
+from .turing import build_machine
+
+SIZES = (16, 64, 256)
+LINES = 10
+TOLERANCE = 0.2
+
+class Case:
+
+    """Program of the corpus with generator of inputs and expected outputs.
+
+    make_input(rnd, size) returns random input line of given size,
+    answer(line) returns expected output.
+    """
+
+    def __init__(self, name, kind, source, make_input, answer):
+        """See help(type(x))."""
+        self.name = name
+        self.kind = kind
+        self.source = source
+        self.make_input = make_input
+        self.answer = answer
+
+    def build(self, matcher='scan', word='str', engine=None):
+        """Return algorithm or machine."""
+        if self.kind == 'markov':
+            return Algorithm(self.source, matcher=matcher, word=word)
+        return build_machine(self.source, engine=engine)
+
+
+def _unary_sum(rnd, size):
+    """Return two unary numbers with total length size."""
+    first = rnd.randint(0, size)
+    return '1' * first + '+' + '1' * (size - first)
+
+def _binary(rnd, size):
+    """Return binary number with size digits."""
+    return '1' + ''.join(rnd.choice('01') for _ in range(size - 1))
+
+def _palindrome(rnd, size):
+    """Return palindrome or almost palindrome."""
+    half = ''.join(rnd.choice('ab') for _ in range(size // 2))
+    string = half + (rnd.choice('ab') if size % 2 else '') + half[::-1]
+    if rnd.random() < 0.5:
+        pos = rnd.randrange(size)
+        string = string[:pos] + ('a' if string[pos] == 'b' else 'b') + string[pos+1:]
+    return string
+
+def _word(rnd, size):
+    """Return random word over a, b."""
+    return ''.join(rnd.choice('ab') for _ in range(size))
+
+def _unary_answer(line):
+    """Sum of unary numbers."""
+    return line.replace('+', '')
+
+def _binary_answer(line):
+    """Increment of binary number."""
+    return bin(int(line, 2) + 1)[2:]
+
+def _palindrome_answer(line):
+    """1 for palindrome, 0 otherwise."""
+    return '1' if line == line[::-1] else '0'
+
+def _reverse_answer(line):
+    """Reversed word."""
+    return line[::-1]
+
+CORPUS = [
+    Case('unary_addition', 'markov', ['1+ -> +1', '+ => '],
+         _unary_sum, _unary_answer),
+    Case('binary_increment', 'markov',
+         ['0# => 1', '1# -> #0', '@0 -> 0@', '@1 -> 1@', '@ -> #', '# => 1', ' -> @'],
+         _binary, _binary_answer),
+    Case('palindrome', 'markov',
+         ['Ea -> E', 'Eb -> E', 'aE -> E', 'bE -> E', 'E => 0',
+          'Aa -> aA', 'Ab -> bA', 'Ba -> aB', 'Bb -> bB',
+          'aA -> C', 'bB -> C', 'bA -> E', 'aB -> E',
+          'A => 1', 'B => 1',
+          'aC -> Ca', 'bC -> Cb', 'C -> *',
+          '*a -> A', '*b -> B', '* => 1',
+          ' -> *'],
+         _palindrome, _palindrome_answer),
+    Case('reversal', 'markov',
+         ['aA -> Aa', 'bA -> Ab', 'aB -> Ba', 'bB -> Bb',
+          'A -> a', 'B -> b',
+          '|a -> A|', '|b -> B|',
+          '| => ', ' -> |'],
+         _word, _reverse_answer),
+    Case('unary_addition', 'turing', ['1 + _', '0 ,R, 1,R, ,L,1', '1 _,N,! - -'],
+         _unary_sum, _unary_answer),
+    Case('binary_increment', 'turing', ['0 1 _', '0 ,R, ,R, ,L,1', '1 1,N,! 0,L, 1,N,!'],
+         _binary, _binary_answer),
+    Case('palindrome', 'turing',
+         ['a b 0 1 _',
+          '0 _,R,1 _,R,2 - - 1,N,!',
+          '1 ,R, ,R, - - ,L,3',
+          '2 ,R, ,R, - - ,L,4',
+          '3 _,L,5 _,L,6 - - 1,N,!',
+          '4 _,L,6 _,L,5 - - 1,N,!',
+          '5 ,L, ,L, - - ,R,0',
+          '6 _,L, _,L, - - 0,N,!'],
+         _palindrome, _palindrome_answer),
+    Case('reversal', 'turing',
+         ['a b x # _',
+          '0 ,R, ,R, - - #,L,1',
+          '1 #,R,2 #,R,3 - - ,R,5',
+          '2 ,R, ,R, ,R, x,R, a,L,4',
+          '3 ,R, ,R, ,R, x,R, b,L,4',
+          '4 ,L, ,L, ,L, ,L,1 -',
+          '5 ,N,! ,N,! _,R, _,R, ,N,!'],
+         _word, _reverse_answer),
+]
+
+def percentile(values, part):
+    """Return value with given part (0..1) of values not greater than it."""
+    values = sorted(values)
+    return values[min(int(part * len(values)), len(values) - 1)]
+
+def measure(program, lines, answers):
+    """Execute program on lines, return report."""
+    latencies = []
+    tacts = 0
+    for line, answer in zip(lines, answers):
+        start = time.perf_counter()
+        result = program.execute(line)
+        latencies.append(time.perf_counter() - start)
+        tacts += program.tacts
+        if result != answer:
+            raise RuntimeError('Wrong answer on "{line}": "{result}"'
+                               .format(line=line, result=result))
+
+    tracemalloc.start()
+    try:
+        for line in lines:
+            program.execute(line)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    seconds = sum(latencies)
+    return {'lines': len(lines),
+            'tacts': tacts,
+            'seconds': round(seconds, 6),
+            'tacts_per_sec': round(tacts / seconds if seconds > 0 else 0.0, 1),
+            'p50': round(percentile(latencies, 0.5), 6),
+            'p90': round(percentile(latencies, 0.9), 6),
+            'p99': round(percentile(latencies, 0.99), 6),
+            'peak_memory': peak}
+
+def run_bench(scale=1, matcher='scan', word='str', engine=None, corpus=CORPUS, sizes=None):
+    """Run every program of corpus on LINES lines of every size, return report.
+
+    Keys of report are 'kind/name/size'.
+    """
+    report = {}
+    for case in corpus:
+        program = case.build(matcher=matcher, word=word, engine=engine)
+        for size in sizes or SIZES:
+            size *= scale
+            rnd = random.Random(size)
+            lines = [case.make_input(rnd, size) for _ in range(LINES)]
+            answers = [case.answer(line) for line in lines]
+            key = '{kind}/{name}/{size}'.format(kind=case.kind, name=case.name, size=size)
+            report[key] = measure(program, lines, answers)
+    return report
+
+def compare(report, baseline, tolerance=TOLERANCE):
+    """Return list of regressions of report against baseline.
+
+    Speed may be lower and memory may be higher only by tolerance part.
+    """
+    regressions = []
+    for key in sorted(report):
+        if key not in baseline:
+            continue
+        old, new = baseline[key], report[key]
+        if new['tacts_per_sec'] < old['tacts_per_sec'] * (1 - tolerance):
+            regressions.append('{key}: tacts_per_sec {old} -> {new}'
+                               .format(key=key, old=old['tacts_per_sec'],
+                                       new=new['tacts_per_sec']))
+        if new['peak_memory'] > old['peak_memory'] * (1 + tolerance):
+            regressions.append('{key}: peak_memory {old} -> {new}'
+                               .format(key=key, old=old['peak_memory'],
+                                       new=new['peak_memory']))
+    return regressions
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+"""On-disk cache of loaded programs.
+
+Program (algorithm or machine) is parsed, checked and prepared once
+(see prepare methods), after that it's pickled to the cache directory.
+Key is sha256 of the interpreter version, kind of program, options and
+source, so any change gives new key. Total size of the cache is bounded:
+files, which were not used for the longest time, are removed first.
+"""
+
+import hashlib, os, pickle, tempfile
+
+MAX_SIZE = 64 * 1024 * 1024
+SUFFIX = '.pickle'
+
+class ProgramCache:
+
+    """Directory with pickled programs.
+
+    >>> from turingmarkov.markov import Algorithm
+    >>> cache = ProgramCache(tempfile.mkdtemp(), version='test')
+    >>> lines = ['aa -> a']
+    >>> algo = cache.get('markov', lines, lambda: Algorithm(lines))
+    >>> cache.get('markov', lines, None).rules
+    [('aa', 'a', 0)]
+    """
+
+    def __init__(self, directory, version, max_size=MAX_SIZE):
+        """See help(type(x))."""
+        self.directory = directory
+        self.version = version
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, kind, source, **options):
+        """Return key of the program."""
+        digest = hashlib.sha256()
+        for part in [self.version, kind] + sorted('{0}={1}'.format(*item)
+                                                  for item in options.items()):
+            digest.update(part.encode('utf-8') + b'\0')
+        digest.update(source.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        """Return path of the file with program."""
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def load(self, key):
+        """Return program or None, if there is no such key."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as cache_file:
+                program = pickle.load(cache_file)
+        except FileNotFoundError:
+            return None
+        except Exception: # Broken file (e.g. interrupted write), build it again
+            self._remove(path)
+            return None
+        os.utime(path) # Recently used
+        return program
+
+    def save(self, key, program):
+        """Save program and remove old ones, if cache is too big."""
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as cache_file:
+                pickle.dump(program, cache_file, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            self._remove(temp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used programs until cache fits to max_size."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(SUFFIX):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError: # Removed by another process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_size:
+                break
+            self._remove(os.path.join(self.directory, name))
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        """Remove file, if it still exists."""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def get(self, kind, lines, build, **options):
+        """Return program from cache or build, prepare and save it.
+
+        Options are the options of build, which change the program.
+        """
+        key = self.key(kind, ''.join(lines), **options)
+        program = self.load(key)
+        if program is None:
+            program = build()
+            program.prepare()
+            self.save(key, program)
+        return program
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+"""Judging of many programs against the same tests.
+
+Programs are files *.markov and *.turing of one directory. Tests are
+json lines {"input": "xx", "output": "xxxx"} with optional "max_tacts"
+and "time_limit" of the test (limits of the command are upper bounds).
+Every pair (program, test) gets verdict: OK, WA (wrong answer), TL (limit
+exceeded) or RE (runtime error, or program can't be parsed) and count of
+used tacts (None for RE). Any error of one pair is RE of this pair only.
+
+Tests are sent to every worker process once, after that workers get
+pairs by chunks of tests of one program; parsed programs are kept in
+the pool of the worker (see turingmarkov.pool.ProgramPool).
+"""
+
+import csv, json, os
+from .limits import LimitExceeded, min_limit
+from .pool import ProgramPool
+from .streams import strip_spaces
+
+KINDS = {'.markov': 'markov', '.turing': 'turing'}
+CHUNK_SIZE = 64 # Tests of one program, which are sent to worker at once
+
+_TESTS = None
+_POOL = ProgramPool()
+
+def read_tests(lines):
+    """Parse json lines of tests, return list of dicts."""
+    tests = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            test = json.loads(line)
+        except ValueError as err:
+            raise ValueError('Wrong test on line {0}: {1}'.format(number, err))
+        if (not isinstance(test, dict) or not isinstance(test.get('input'), str) or
+                not isinstance(test.get('output'), str)):
+            raise ValueError('Wrong test on line {0}: input and output should be '
+                             'strings'.format(number))
+        tests.append(test)
+    return tests
+
+def find_programs(directory):
+    """Return sorted list of (name, kind, source) of programs in directory."""
+    programs = []
+    for name in sorted(os.listdir(directory)):
+        kind = KINDS.get(os.path.splitext(name)[1])
+        if kind is None:
+            continue
+        with open(os.path.join(directory, name)) as source_file:
+            programs.append((name, kind, source_file.read()))
+    return programs
+
+def _init_worker(tests):
+    """Remember tests in the worker process."""
+    global _TESTS
+    _TESTS = tests
+
+def judge_chunk(kind, source, options, start, stop, settings):
+    """Judge program on tests[start:stop] (in the worker), return list of verdicts.
+
+    Options are options of the program (e.g. matcher), settings are
+    limits of the command: max_tacts, max_time and detect_loops.
+    """
+    try:
+        program = _POOL.get(kind, source, options)
+    except Exception as err: # Wrong program is RE on every test, judging goes on
+        message = '{name}: {message}'.format(name=type(err).__name__, message=err)
+        return [{'verdict': 'RE', 'tacts': None, 'message': message}] * (stop - start)
+
+    verdicts = []
+    for test in _TESTS[start:stop]:
+        string = test['input']
+        if kind == 'markov':
+            string = strip_spaces(string)
+        try:
+            output = program.execute(
+                string, max_tacts=min_limit(test.get('max_tacts'), settings['max_tacts']),
+                max_time=min_limit(test.get('time_limit'), settings['max_time']),
+                detect_loops=settings['detect_loops'])
+        except LimitExceeded as err:
+            verdicts.append({'verdict': 'TL', 'tacts': err.tacts, 'reason': err.reason})
+        except RuntimeError as err:
+            verdicts.append({'verdict': 'RE', 'tacts': None, 'message': str(err)})
+        except Exception as err: # E.g. MemoryError, it's RE of this pair only
+            message = '{name}: {message}'.format(name=type(err).__name__, message=err)
+            verdicts.append({'verdict': 'RE', 'tacts': None, 'message': message})
+        else:
+            verdicts.append({'verdict': 'OK' if output == test['output'] else 'WA',
+                             'tacts': program.tacts})
+    return verdicts
+
+def judge(programs, tests, options=None, workers=None, max_tacts=None, max_time=None,
+          detect_loops=False):
+    """Judge every program on every test, return verdict matrix.
+
+    Programs are (name, kind, source), options are {kind: options of the
+    program}. Result is list of {"program", "kind", "passed", "verdicts"}
+    in order of programs, verdicts are in order of tests.
+    """
+    options = options or {}
+    settings = {'max_tacts': max_tacts, 'max_time': max_time, 'detect_loops': detect_loops}
+    tasks = [(number, (kind, source, options.get(kind, {}), start,
+                       min(start + CHUNK_SIZE, len(tests)), settings))
+             for number, (_, kind, source) in enumerate(programs)
+             for start in range(0, len(tests), CHUNK_SIZE)]
+    verdicts = [[] for _ in programs]
+
+    if workers is None or workers <= 1:
+        _init_worker(tests)
+        for number, args in tasks:
+            verdicts[number].extend(judge_chunk(*args))
+    else:
+        from concurrent.futures import ProcessPoolExecutor # Slow import, only for workers
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(tests,)) as pool:
+            futures = [(number, pool.submit(judge_chunk, *args)) for number, args in tasks]
+            for number, future in futures: # Chunks of one program go in order
+                verdicts[number].extend(future.result())
+
+    return [{'program': name, 'kind': kind, 'verdicts': row,
+             'passed': sum(verdict['verdict'] == 'OK' for verdict in row)}
+            for (name, kind, _), row in zip(programs, verdicts)]
+
+def write_json(matrix, stream):
+    """Write verdict matrix as json."""
+    json.dump(matrix, stream, indent=2, sort_keys=True)
+    stream.write('\n')
+
+def write_csv(matrix, stream):
+    """Write verdict matrix as csv: one row for every pair (program, test).
+
+    Tests are numbered from 1.
+    """
+    writer = csv.writer(stream, lineterminator='\n')
+    writer.writerow(['program', 'test', 'verdict', 'tacts'])
+    for row in matrix:
+        for number, verdict in enumerate(row['verdicts'], 1):
+            writer.writerow([row['program'], number, verdict['verdict'],
+                             '' if verdict['tacts'] is None else verdict['tacts']])
+
+FORMATS = {'json': write_json, 'csv': write_csv}
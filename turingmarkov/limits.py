@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+"""Limits of execution: count of tacts, wall-clock time and forever loops."""
+
+import time
+
+SNAPSHOT_SIZE = 1000
+
+def cut(text, size=SNAPSHOT_SIZE):
+    """Cut too long text for reports."""
+    return text if len(text) <= size else text[:size] + '...'
+
+def min_limit(first, second):
+    """Return the strongest of two limits (None is no limit)."""
+    if first is None:
+        return second
+    if second is None:
+        return first
+    return min(first, second)
+
+
+class LimitExceeded(TimeoutError):
+
+    """Algorithm hasn't been stopped within the limits.
+
+    Besides message it knows reason ('tacts', 'time' or 'loop'), count of
+    executed tacts, current state (state of machine or last rule of
+    algorithm), snapshot of tape or word (its beginning, see cut) and
+    elapsed time in seconds.
+    """
+
+    MESSAGES = {'tacts': "algorithm hasn't been stopped",
+                'time': 'time limit exceeded',
+                'loop': 'algorithm provably loops'}
+
+    def __init__(self, reason, tacts, state, snapshot, elapsed):
+        """See help(type(x))."""
+        super().__init__(self.MESSAGES[reason])
+        self.reason = reason
+        self.tacts = tacts
+        self.state = state
+        self.snapshot = snapshot
+        self.elapsed = elapsed
+
+    def __reduce__(self):
+        """Exception is passed between processes by pickle."""
+        return type(self), (self.reason, self.tacts, self.state, self.snapshot, self.elapsed)
+
+    def as_dict(self):
+        """Return report as dict (e.g. for json)."""
+        return {'reason': self.reason,
+                'tacts': self.tacts,
+                'state': self.state,
+                'snapshot': cut(self.snapshot),
+                'elapsed': round(self.elapsed, 6)}
+
+
+class LoopDetected(LimitExceeded):
+
+    """Configuration has been repeated, so algorithm will never stop.
+
+    Period is count of tacts between two equal configurations.
+    """
+
+    def __init__(self, tacts, state, snapshot, elapsed, period):
+        """See help(type(x))."""
+        super().__init__('loop', tacts, state, snapshot, elapsed)
+        self.period = period
+
+    def __reduce__(self):
+        """Exception is passed between processes by pickle."""
+        return type(self), (self.tacts, self.state, self.snapshot, self.elapsed, self.period)
+
+    def as_dict(self):
+        """Return report as dict (e.g. for json)."""
+        return dict(super().as_dict(), period=self.period)
+
+
+class Budget:
+
+    """Tact and time limits of one run.
+
+    Hot loop only compares counter with budget.limit; when it's reached,
+    budget.exceeded(counter) checks limits and moves budget.limit forward.
+    Clock is checked every CHECK_EVERY tacts.
+
+    >>> budget = Budget(max_tacts=10)
+    >>> budget.limit, budget.exceeded(10), budget.reason
+    (10, True, 'tacts')
+    """
+
+    CHECK_EVERY = 4096
+    NEVER = 1 << 62
+
+    def __init__(self, max_tacts=None, max_time=None):
+        """See help(type(x))."""
+        self.max_tacts = max_tacts
+        self.max_time = max_time
+        self.started = time.monotonic()
+        self.reason = None
+        self.limit = self._next_limit(0)
+
+    def _next_limit(self, counter):
+        """Return counter value, when limits should be checked again."""
+        limit = self.max_tacts if self.max_tacts is not None else self.NEVER
+        if self.max_time is not None:
+            limit = min(limit, counter + self.CHECK_EVERY)
+        return limit
+
+    def elapsed(self):
+        """Return seconds since start."""
+        return time.monotonic() - self.started
+
+    def exceeded(self, counter):
+        """Return True if limits are exceeded."""
+        if self.max_tacts is not None and counter >= self.max_tacts:
+            self.reason = 'tacts'
+            return True
+        if self.max_time is not None and self.elapsed() >= self.max_time:
+            self.reason = 'time'
+            return True
+        self.limit = self._next_limit(counter)
+        return False
+
+    def resume(self, counter):
+        """Continue the budget by other run, which has done counter tacts.
+
+        Return True if time is out. Tacts aren't checked, the run checks them
+        after its next tact.
+        """
+        if self.max_time is not None and self.elapsed() >= self.max_time:
+            self.reason = 'time'
+            return True
+        self.limit = self._next_limit(counter)
+        return False
+
+    def error(self, counter, state, snapshot, *args):
+        """Return exception for the exceeded limit.
+
+        Snapshot is snapshot(*args), it's built after the clock is read.
+        """
+        elapsed = self.elapsed()
+        return LimitExceeded(self.reason, counter, state, snapshot(*args), elapsed)
+
+
+class LoopDetector:
+
+    """Brent's cycle detection over configurations of the run.
+
+    Configuration is saved after 1, 2, 4, 8... tacts and every next one is
+    compared with the saved. If the run gets to the cycle of length L after
+    M tacts, it's found after at most 2 * max(M, L) + L tacts. Execution is
+    deterministic, so repeated configuration is a proof of forever loop.
+
+    Engine gives cheap key of configuration (e.g. state and cells near the
+    head) on every tact; full configuration is built only when keys are
+    equal, and when it's saved. Fingerprint (e.g. hash of the word) is
+    optional middle level: it's asked only when keys are equal, and when
+    configuration is saved, full configurations are compared only when
+    fingerprints are equal too.
+
+    >>> detector = LoopDetector()
+    >>> [detector.repeated(tact, tact % 3, str, tact % 3) for tact in range(1, 8)]
+    [False, False, False, False, False, False, True]
+    >>> detector.period
+    3
+    """
+
+    def __init__(self):
+        """See help(type(x))."""
+        self.saved_key = None
+        self.saved_fingerprint = None
+        self.saved = None
+        self.saved_at = 0
+        self.next_save = 1
+        self.period = None
+
+    def repeated(self, counter, key, configuration, *args, fingerprint=None):
+        """Check configuration after counter tacts.
+
+        Full configuration is configuration(*args), fingerprint (if it's
+        given) is fingerprint(), they are called only if needed.
+        """
+        if (key == self.saved_key and
+                (fingerprint is None or fingerprint() == self.saved_fingerprint) and
+                configuration(*args) == self.saved):
+            self.period = counter - self.saved_at
+            return True
+        if counter >= self.next_save:
+            self.saved_key, self.saved = key, configuration(*args)
+            self.saved_fingerprint = fingerprint() if fingerprint is not None else None
+            self.saved_at = counter
+            self.next_save = 2 * counter
+        return False
+
+    def error(self, counter, state, snapshot, elapsed):
+        """Return exception about the found loop."""
+        return LoopDetected(counter, state, snapshot, elapsed, self.period)
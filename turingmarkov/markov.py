@@ -2,13 +2,105 @@
 
 """Emulator of markov algothm."""
 
+from .backends import get_native
+from .batch import execute_many
+from .limits import SNAPSHOT_SIZE, Budget, LoopDetector, cut
+from .matching import build_matcher
+from .words import StrWord, RopeWord, BytesWord, get_word_kind
+
 TEMPLATE = """#!/bin/env python3
 # -*- coding: utf-8 -*-
-from turingmarkov.markov import Algorithm
 from sys import stdin
-algo = Algorithm()
+
+def execute(string):
+    \"\"\"Apply algorithm to the string.\"\"\"
+    while True:
 """
 
+MAIN = """
+if __name__ == '__main__':
+    for line in stdin:
+        print(execute(''.join(line.split())))
+"""
+
+def snapshot(kind, word):
+    """Return beginning of the word for reports (see turingmarkov.limits.cut)."""
+    return cut(kind.prefix(word, SNAPSHOT_SIZE + 1))
+
+def format_rule(rule):
+    """Return rule (lhs, rhs, terminal) as it's written in the source."""
+    if rule is None:
+        return None
+    return '{0} {1} {2}'.format(rule[0], '=>' if rule[2] else '->', rule[1])
+
+class Rule:
+
+    """Rule, prepared for execution on some word kind.
+
+    lhs and rhs are encoded to the alphabet of the word (e.g. to bytes),
+    source is the parsed rule (lhs, rhs, terminal).
+    """
+
+    __slots__ = ('source', 'lhs', 'rhs', 'length', 'terminal')
+
+    def __init__(self, source, kind):
+        """See help(type(x))."""
+        self.source = source
+        self.lhs = kind.encode(source[0])
+        self.rhs = kind.encode(source[1])
+        self.length = len(self.lhs)
+        self.terminal = source[2]
+
+
+class WordHash:
+
+    """Polynomial hash of the word, which follows substitutions (for loop detection).
+
+    Word is number in base 2 ** 32 (code points in utf-32) modulo MODULUS.
+    Substitution, which keeps the length, adds difference of the rule sides
+    at its position; other substitutions shift the tail, so the hash is
+    calculated again, when it's asked.
+
+    >>> word_hash = WordHash(StrWord, 'abc')
+    >>> word_hash.update('acb', 1, 'bc', 'cb')
+    >>> word_hash() == WordHash(StrWord, 'acb')()
+    True
+    """
+
+    MODULUS = (1 << 61) - 1
+
+    def __init__(self, kind, word):
+        """See help(type(x))."""
+        self.kind = kind
+        self.word = word
+        self.value = None
+        self.deltas = {}
+
+    def _number(self, string):
+        """Return hash of the string."""
+        return int.from_bytes(string.encode('utf-32-le', 'surrogatepass'),
+                              'little') % self.MODULUS
+
+    def update(self, word, pos, lhs, rhs):
+        """Follow substitution of lhs by rhs at pos (lhs and rhs are str)."""
+        self.word = word
+        if self.value is None:
+            return
+        if len(lhs) != len(rhs):
+            self.value = None
+            return
+        delta = self.deltas.get((lhs, rhs))
+        if delta is None:
+            delta = self.deltas[lhs, rhs] = self._number(rhs) - self._number(lhs)
+        self.value = (self.value + delta * pow(2, 32 * pos, self.MODULUS)) % self.MODULUS
+
+    def __call__(self):
+        """Return hash of the word."""
+        if self.value is None:
+            self.value = self._number(self.kind.render(self.word))
+        return self.value
+
+
 class Algorithm:
 
     """Now supports only execution of algorithm.
@@ -17,13 +109,35 @@ class Algorithm:
     >>> algo.execute('aabbbcb')
     abcb
 
+    Rule selection strategy can be changed by matcher argument:
+    'scan' (default) checks rules one by one, 'automaton' finds the rule
+    in one pass over the word, 'incremental' remembers occurrences between
+    steps and looks only around the last edit (see turingmarkov.matching).
+    Word representation during execution is chosen by word argument:
+    'str' (default), 'rope', which makes substitution in long words cheap,
+    or 'bytes', which keeps ASCII word in bytearray and changes it in place
+    (see turingmarkov.words); if the word or the rules aren't ASCII, 'str'
+    is used instead. If memo is given (turingmarkov.memo.Memo),
+    results of runs are remembered, so repeated and converging inputs
+    are executed faster. Backend is 'python' or 'native' (None is the
+    best available, see turingmarkov.backends).
+
     In future, there will be debug.
     """
 
-    def __init__(self, rules=tuple()):
+    def __init__(self, rules=tuple(), matcher='scan', word='str', memo=None, backend=None):
         """See help(type(a))."""
         self.rules = []
         self.last_rule = None
+        self.tacts = 0 # Count of tacts of the last run
+        self.matcher = matcher
+        self.word = word
+        self.memo = memo
+        get_native(backend) # Check the name
+        self.backend = backend
+        self._prepared = {} # Word kind -> (matcher, rules) or None
+        self._live = None # Indexes of rules, which can be applied (see prune)
+        self.pruned = []
 
         for rule in rules:
             rule = rule.strip()
@@ -43,6 +157,72 @@ class Algorithm:
             raise SyntaxError('Wrong format: ' + rule)
         else:
             self.rules.append(parsed_rule)
+            self._prepared = {}
+            self._live = None
+            if self.memo is not None:
+                self.memo.clear()
+
+    def prune(self):
+        """Find rules, which can never be applied, return report about them.
+
+        Rule is dead, if left part of some earlier rule is its substring
+        (e.g. it's empty): the earlier rule is applicable, when the dead one
+        is. Dead rules aren't given to matchers (numbers of rules don't
+        change). Report is list of messages, it's saved in self.pruned.
+        """
+        if self._live is not None:
+            return self.pruned
+        self._live, self.pruned = [], []
+        earlier = {} # Left part -> index of its first rule
+        for index, rule in enumerate(self.rules):
+            lhs = rule[0]
+            if len(lhs) * (len(lhs) + 1) // 2 < len(earlier):
+                parts = {lhs[start:stop] for start in range(len(lhs) + 1)
+                         for stop in range(start, len(lhs) + 1)}
+                shadow = min((earlier[part] for part in parts if part in earlier), default=None)
+            else:
+                shadow = min((other for part, other in earlier.items() if part in lhs),
+                             default=None)
+            if shadow is None:
+                self._live.append(index)
+                earlier.setdefault(lhs, index)
+            else:
+                self.pruned.append('Rule {index} "{rule}" is shadowed by rule {other} "{shadow}"'
+                                   .format(index=index + 1, rule=self.format_rule(rule),
+                                           other=shadow + 1,
+                                           shadow=self.format_rule(self.rules[shadow])))
+        return self.pruned
+
+    def _prepare_kind(self, kind):
+        """Return (matcher, rules) for the word kind (they're built once).
+
+        Return None, if rules can't be stored in such word.
+        """
+        if kind not in self._prepared:
+            if all(kind.accepts(rule[0] + rule[1]) for rule in self.rules):
+                self.prune()
+                rules = [Rule(rule, kind) for rule in self.rules]
+                patterns = [(index, rules[index].lhs) for index in self._live]
+                self._prepared[kind] = (build_matcher(self.matcher, patterns), rules)
+            else:
+                self._prepared[kind] = None
+        return self._prepared[kind]
+
+    def get_matcher(self, kind=StrWord):
+        """Return matcher for current rules and word kind (it's built once)."""
+        return self._prepare_kind(kind)[0]
+
+    def _kind_for(self, string):
+        """Return word kind for execution on the string."""
+        kind = get_word_kind(self.word)
+        if kind.accepts(string) and self._prepare_kind(kind) is not None:
+            return kind
+        return StrWord
+
+    def prepare(self):
+        """Build matchers before execution (e.g. for cache)."""
+        self.get_matcher()
+        self._prepare_kind(get_word_kind(self.word))
 
     def debug(self):
         """Now it do nothing."""
@@ -50,42 +230,244 @@ class Algorithm:
 
     def execute_once(self, string):
         """Execute only one rule."""
-        for rule in self.rules:
-            if rule[0] in string:
-                pos = string.find(rule[0])
-                self.last_rule = rule
-                return string[:pos] + rule[1] + string[pos+len(rule[0]):]
+        matcher = self.get_matcher()
+        matcher.reset(string)
+        found = matcher.find(string)
+        if found is None:
+            self.last_rule = None
+            return string
+
+        index, pos = found
+        rule = self.rules[index]
+        self.last_rule = rule
+        return string[:pos] + rule[1] + string[pos+len(rule[0]):]
+
+    def format_rule(self, rule):
+        """Return rule as it's written in the source (see format_rule)."""
+        return format_rule(rule)
+
+    def execute(self, string, max_tacts=None, max_time=None, detect_loops=False,
+                profile=None, trace=None):
+        """Execute algorithm (if max_times = None, there can be forever loop).
+
+        If max_tacts or max_time (in seconds) is exceeded, LimitExceeded
+        is raised (see turingmarkov.limits). Count of applied rules
+        is saved in self.tacts. If detect_loops is True, repeated word
+        raises LoopDetected (see turingmarkov.limits.LoopDetector).
+        Statistics of the run are added to the profile, if it's given
+        (see turingmarkov.profiling.MarkovProfile). Every applied rule
+        is written to the trace, if it's given (see turingmarkov.tracing.
+        MarkovTrace). Memo isn't used with loop detection, profile and
+        trace, they need every step. Memo of str words checks checkpoints
+        after every step, so these runs don't use the native backend.
+        """
+        if (self.memo is not None and not detect_loops and profile is None and
+                trace is None):
+            if self.word == 'str':
+                return self._execute_memo(string, max_tacts, max_time)
+            return self._execute_whole_memo(string, max_tacts, max_time)
+        return self._execute(string, max_tacts, max_time, detect_loops, profile, trace)
+
+    def _fits(self, entry, counter, max_tacts):
+        """Return True if memo entry can be used after counter tacts."""
+        return (max_tacts is None or counter + entry[2] < max_tacts or
+                entry[0] == 'final' and entry[2] == 0)
+
+    def _execute_whole_memo(self, string, max_tacts, max_time):
+        """Execute algorithm, remember only whole runs."""
+        entry = self.memo.get(string)
+        if entry is not None and entry[0] == 'final' and self._fits(entry, 0, max_tacts):
+            _, result, tacts, terminal, self.last_rule = entry
+            self.tacts = tacts + terminal
+            return result
+
+        result = self._execute(string, max_tacts, max_time)
+        terminal = int(self.last_rule is not None and self.last_rule[2])
+        self.memo.put(string, ('final', result, self.tacts - terminal, terminal, self.last_rule))
+        return result
+
+    def _execute_memo(self, string, max_tacts, max_time):
+        """Execute algorithm on str word, jump over known parts of trajectory.
+
+        Counter doesn't include terminal substitution here, it's added to
+        self.tacts at the end.
+        """
+        memo = self.memo
+        matcher = self.get_matcher()
+        budget = Budget(max_tacts, max_time)
+        limit = budget.limit
+        counter = 0
         self.last_rule = None
-        return string
+        self.tacts = 0
+
+        word = string
+        last, last_counter = word, 0 # Last remembered word of the trajectory
+        remembered = True
+        stale = True # Matcher doesn't know the word
+        terminal = 0
+
+        while True:
+            if remembered:
+                entry = memo.get(word)
+                if entry is not None and self._fits(entry, counter, max_tacts):
+                    if entry[0] == 'final':
+                        _, word, tacts, terminal, self.last_rule = entry
+                        counter += tacts
+                        break
+                    _, word, tacts, self.last_rule = entry
+                    counter += tacts
+                    last, last_counter = word, counter
+                    stale = True
+                    if counter >= limit:
+                        if budget.exceeded(counter):
+                            self.tacts = counter
+                            raise budget.error(counter, self.format_rule(self.last_rule), cut, word)
+                        limit = budget.limit
+                    continue
+                remembered = False
 
-    def execute(self, string, max_tacts=None):
-        """Execute algorithm (if max_times = None, there can be forever loop)."""
+            if stale:
+                matcher.reset(word)
+                stale = False
+            found = matcher.find(word)
+            if found is None:
+                self.last_rule = None
+                break
+            index, pos = found
+            rule = self.last_rule = self.rules[index]
+            word = word[:pos] + rule[1] + word[pos+len(rule[0]):]
+            if rule[2]:
+                terminal = 1
+                break
+            matcher.update(word, pos, len(rule[0]), len(rule[1]))
+            counter += 1
+            if counter >= limit:
+                if budget.exceeded(counter):
+                    self.tacts = counter
+                    raise budget.error(counter, self.format_rule(rule), cut, word)
+                limit = budget.limit
+            if memo.is_checkpoint(word):
+                memo.put(last, ('jump', word, counter - last_counter, rule))
+                last, last_counter = word, counter
+                remembered = True
+
+        # Result is known for the input and for the last remembered word
+        memo.put(string, ('final', word, counter, terminal, self.last_rule))
+        memo.put(last, ('final', word, counter - last_counter, terminal, self.last_rule))
+        self.tacts = counter + terminal
+        return word
+
+    def _execute(self, string, max_tacts=None, max_time=None, detect_loops=False,
+                 profile=None, trace=None):
+        """Execute algorithm step by step (see execute)."""
+        kind = self._kind_for(string)
+        native = get_native(self.backend)
+        if (native is not None and self.matcher == 'scan' and kind is not RopeWord and
+                not detect_loops and profile is None and trace is None and
+                string.isascii() and self._prepare_kind(BytesWord) is not None):
+            return self._execute_native(native, string, max_tacts, max_time)
+        matcher, rules = self._prepare_kind(kind)
+        if profile is not None:
+            matcher = profile.wrap(matcher)
+        if trace is not None:
+            matcher = trace.wrap(matcher, kind)
+        word = kind.make(string)
+        matcher.reset(word)
+        budget = Budget(max_tacts, max_time)
+        limit = budget.limit
+        detector = LoopDetector() if detect_loops else None
+        word_hash = WordHash(kind, word) if detect_loops else None
         counter = 0
         self.last_rule = None
+        self.tacts = 0
 
         while True:
-            string = self.execute_once(string)
-            if self.last_rule is None or self.last_rule[2]:
+            found = matcher.find(word)
+            if found is None:
+                self.last_rule = None
+                break
+            index, pos = found
+            rule = rules[index]
+            self.last_rule = rule.source
+            word = kind.substitute(word, pos, rule.length, rule.rhs)
+            if rule.terminal:
+                counter += 1
                 break
+            matcher.update(word, pos, rule.length, len(rule.rhs))
             counter += 1
-            if max_tacts is not None and counter >= max_tacts:
-                raise TimeoutError("algorithm hasn't been stopped")
+            if counter >= limit:
+                if budget.exceeded(counter):
+                    self.tacts = counter
+                    raise budget.error(counter, self.format_rule(rule.source),
+                                       snapshot, kind, word)
+                limit = budget.limit
+            if detector is not None:
+                word_hash.update(word, pos, rule.source[0], rule.source[1])
+                if detector.repeated(counter, len(word), kind.render, word,
+                                     fingerprint=word_hash):
+                    self.tacts = counter
+                    raise detector.error(counter, self.format_rule(rule.source),
+                                         snapshot(kind, word), budget.elapsed())
 
-        return string
+        self.tacts = counter
+        return kind.render(word)
+
+    def _execute_native(self, native, string, max_tacts, max_time):
+        """Execute algorithm on ASCII string by the loop of turingmarkov._native."""
+        rules = self._prepare_kind(BytesWord)[1]
+        rules = [rules[index] for index in self._live]
+        lhs = tuple(rule.lhs for rule in rules)
+        rhs = tuple(rule.rhs for rule in rules)
+        terminal = bytes(rule.terminal for rule in rules)
+        word = bytearray(string, 'ascii')
+        budget = Budget(max_tacts, max_time)
+        counter = 0
+        self.last_rule = None
+        self.tacts = 0
+
+        while True:
+            status, counter, index = native.markov_run(word, lhs, rhs, terminal, counter,
+                                                       budget.limit)
+            self.last_rule = rules[index].source if index != -1 else None
+            if status != native.MARKOV_LIMIT:
+                break
+            if budget.exceeded(counter):
+                self.tacts = counter
+                raise budget.error(counter, self.format_rule(self.last_rule),
+                                   snapshot, BytesWord, word)
+
+        self.tacts = counter
+        return word.decode('ascii')
+
+    def execute_many(self, strings, workers=None, catch=(), **options):
+        """Execute algorithm on every string (in parallel, if workers > 1).
+
+        Options are the same as for execute. Return iterator over results
+        in the same order (see turingmarkov.batch.execute_many).
+        """
+        return execute_many(self, strings, workers=workers, catch=catch, **options)
 
     def compile(self):
-        """Return python code for create and execute algo."""
+        """Return python code, which executes algo without turingmarkov.
+
+        Rules are unrolled to the cascade of str.find calls.
+        """
         result = TEMPLATE
 
         for rule in self.rules:
-            if rule[2]:
-                arrow = '=>'
-            else:
-                arrow = '->'
-            repr_rule = repr(rule[0] + arrow + rule[1])
+            if rule[0] == '':
+                # Always applicable, so next rules are never used
+                result += "        string = {rhs!r} + string\n".format(rhs=rule[1])
+                result += "        return string\n" if rule[2] else "        continue\n"
+                break
 
-            result += "algo.add_rule({repr_rule})\n".format(repr_rule=repr_rule)
+            result += "        pos = string.find({lhs!r})\n".format(lhs=rule[0])
+            result += "        if pos != -1:\n"
+            result += ("            string = string[:pos] + {rhs!r} + string[pos+{length}:]\n"
+                       .format(rhs=rule[1], length=len(rule[0])))
+            result += "            return string\n" if rule[2] else "            continue\n"
+        else:
+            result += "        return string\n"
 
-        result += "for line in stdin:\n"
-        result += "    print(algo.execute(''.join(line.split())))"
+        result += MAIN
         return result
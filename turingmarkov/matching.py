@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+"""Strategies for choosing the next rule of markov algorithm.
+
+Matcher gets list of pairs (index, left part) in priority order and answers
+which rule should be applied to the word: find(word) returns pair
+(index, position of leftmost occurrence) or None, if there is no such rule.
+
+Before the run reset(word) is called, after every substitution
+update(word, pos, removed, inserted) is called, so matcher can keep
+some knowledge about the word between steps.
+"""
+
+class ScanMatcher:
+
+    """Check rules one by one, as described in the doc.
+
+    >>> ScanMatcher([(0, 'bb'), (1, 'a')]).find('abab')
+    (1, 0)
+    """
+
+    def __init__(self, patterns):
+        """See help(type(x))."""
+        self.patterns = list(patterns)
+
+    def reset(self, word):
+        """Stateless matcher, nothing to do."""
+        pass
+
+    def update(self, word, pos, removed, inserted):
+        """Stateless matcher, nothing to do."""
+        pass
+
+    def find(self, word):
+        """Return (index, position) of the first applicable rule."""
+        for index, pattern in self.patterns:
+            pos = word.find(pattern)
+            if pos != -1:
+                return index, pos
+        return None
+
+
+class AutomatonMatcher:
+
+    """Aho-Corasick automaton over all left parts.
+
+    Automaton is built once, after that every search is one pass over the
+    word. Each node knows the best (upper) rule which ends in it, so we stop
+    as soon as the top rule is found.
+
+    >>> AutomatonMatcher([(0, 'bb'), (1, 'a')]).find('abab')
+    (1, 0)
+    """
+
+    def __init__(self, patterns):
+        """See help(type(x))."""
+        self.indexes = []
+        self.lengths = []
+
+        goto = [{}]
+        best = [None]
+        for index, pattern in patterns:
+            rank = len(self.indexes)
+            self.indexes.append(index)
+            self.lengths.append(len(pattern))
+
+            node = 0
+            for char in pattern:
+                if char not in goto[node]:
+                    goto[node][char] = len(goto)
+                    goto.append({})
+                    best.append(None)
+                node = goto[node][char]
+            if best[node] is None:
+                best[node] = rank
+
+        # Breadth-first search: build full transition function and
+        # propagate best ranks through suffix links
+        self.delta = [None] * len(goto)
+        self.delta[0] = dict(goto[0])
+        queue = []
+        for node in goto[0].values():
+            queue.append((node, 0))
+        for node, fail in queue:
+            if best[node] is None or (best[fail] is not None and best[fail] < best[node]):
+                best[node] = best[fail]
+            self.delta[node] = dict(self.delta[fail])
+            self.delta[node].update(goto[node])
+            for char, child in goto[node].items():
+                queue.append((child, self.delta[fail].get(char, 0)))
+
+        self.best = [len(self.indexes) if rank is None else rank for rank in best]
+
+    def reset(self, word):
+        """Stateless matcher, nothing to do."""
+        pass
+
+    def update(self, word, pos, removed, inserted):
+        """Stateless matcher, nothing to do."""
+        pass
+
+    def find(self, word):
+        """Return (index, position) of the first applicable rule."""
+        found = self.best[0]
+        pos = 0
+        if found == 0 and self.indexes:
+            return self.indexes[0], 0
+
+        delta, best, lengths = self.delta, self.best, self.lengths
+        node = 0
+        end = 1
+        for char in word:
+            node = delta[node].get(char, 0)
+            rank = best[node]
+            if rank < found:
+                found = rank
+                pos = end - lengths[rank]
+                if rank == 0:
+                    break
+            end += 1
+
+        if found == len(self.indexes):
+            return None
+        return self.indexes[found], pos
+
+
+class IncrementalMatcher:
+
+    """Remember leftmost occurrence of every rule between steps.
+
+    After substitution only occurrences near the edit can appear or
+    disappear, so in most cases it's enough to look into small window
+    around it. Full search is needed only for the rule, whose occurrence
+    was destroyed by the edit (and it starts from the edit too).
+
+    >>> matcher = IncrementalMatcher([(0, 'bb'), (1, 'a')])
+    >>> matcher.reset('abab')
+    >>> matcher.find('abab')
+    (1, 0)
+    """
+
+    def __init__(self, patterns):
+        """See help(type(x))."""
+        self.patterns = list(patterns)
+        self.positions = [-1] * len(self.patterns)
+
+    def reset(self, word):
+        """Find all occurrences from scratch."""
+        self.positions = [word.find(pattern) for _, pattern in self.patterns]
+
+    def update(self, word, pos, removed, inserted):
+        """Fix occurrences after replacing word[pos:pos+removed]."""
+        positions = self.positions
+        delta = inserted - removed
+        for rank, (_, pattern) in enumerate(self.patterns):
+            old = positions[rank]
+            length = len(pattern)
+            if old != -1 and old + length <= pos:
+                continue # Occurrence before the edit is still leftmost
+
+            start = pos - length + 1 if pos >= length else 0
+            found = word.find(pattern, start, pos + inserted + length - 1)
+            if found == -1 and old != -1:
+                if old >= pos + removed:
+                    found = old + delta # Occurrence after the edit is just moved
+                else:
+                    found = word.find(pattern, start)
+            positions[rank] = found
+
+    def find(self, word):
+        """Return (index, position) of the first applicable rule."""
+        for rank, pos in enumerate(self.positions):
+            if pos != -1:
+                return self.patterns[rank][0], pos
+        return None
+
+
+MATCHERS = {'scan': ScanMatcher,
+            'automaton': AutomatonMatcher,
+            'incremental': IncrementalMatcher}
+
+def build_matcher(name, patterns):
+    """Create matcher by its name."""
+    if name not in MATCHERS:
+        raise ValueError('Unknown matcher: ' + name)
+    return MATCHERS[name](patterns)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+"""Memoization of markov algorithm runs.
+
+Every run remembers some words of its trajectory: the input word and
+checkpoints, i.e. words, whose hash has CHECKPOINT_BITS low zero bits.
+Checkpoints depend only on the content, so different runs, which meet
+at the same word, meet at the same checkpoints too. For every such word
+memo knows either the final result or the next checkpoint, together with
+count of tacts between them, so the run can jump over known parts.
+"""
+
+from collections import OrderedDict
+import sys
+
+MAX_MEMORY = 16 * 1024 * 1024
+CHECKPOINT_BITS = 6
+ENTRY_OVERHEAD = 200 # Dict slot, tuple and counters, roughly
+
+class Memo:
+
+    """Bounded table of known results, least recently used entries are removed first.
+
+    Entry is ('final', result, tacts, terminal, last_rule) or
+    ('jump', word, tacts, last_rule), where tacts is count of non-terminal
+    substitutions, terminal tells if terminal rule was applied after them
+    and last_rule is the last applied rule (for reports after the jump).
+
+    >>> memo = Memo(max_memory=1000)
+    >>> memo.put('abc', ('jump', 'ab', 1, ('c', '', 0)))
+    >>> memo.get('abc'), memo.get('ab')
+    (('jump', 'ab', 1, ('c', '', 0)), None)
+    """
+
+    def __init__(self, max_memory=MAX_MEMORY, checkpoint_bits=CHECKPOINT_BITS):
+        """See help(type(x))."""
+        self.max_memory = max_memory
+        self.mask = (1 << checkpoint_bits) - 1
+        self.entries = OrderedDict()
+        self.memory = 0
+        self.hits = 0
+        self.misses = 0
+
+    def is_checkpoint(self, word):
+        """Return True if the word should be remembered."""
+        return hash(word) & self.mask == 0
+
+    def get(self, word):
+        """Return entry of the word or None."""
+        item = self.entries.get(word)
+        if item is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(word)
+        return item[0]
+
+    def put(self, word, entry):
+        """Remember entry of the word."""
+        size = sys.getsizeof(word) + sys.getsizeof(entry[1]) + ENTRY_OVERHEAD
+        if size > self.max_memory:
+            return
+        old = self.entries.pop(word, None)
+        if old is not None:
+            self.memory -= old[1]
+        self.entries[word] = (entry, size)
+        self.memory += size
+        while self.memory > self.max_memory:
+            _, (_, old_size) = self.entries.popitem(last=False)
+            self.memory -= old_size
+
+    def clear(self):
+        """Forget everything (e.g. when rules are changed)."""
+        self.entries.clear()
+        self.memory = 0
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+"""Pool of parsed programs.
+
+Judging server and judge command execute the same programs many times,
+so every worker process keeps recently used programs parsed, checked
+and prepared. Key is kind of program, source and options.
+"""
+
+from collections import OrderedDict
+from .markov import Algorithm
+from .turing import build_machine
+
+PROGRAMS = 64 # Parsed programs in every worker
+PROGRAM_OPTIONS = {'markov': ('matcher', 'word', 'backend'),
+                   'turing': ('engine', 'backend')}
+
+class ProgramPool:
+
+    """Parsed programs, least recently used programs are removed first.
+
+    >>> pool = ProgramPool()
+    >>> pool.get('markov', 'a -> b', {}) is pool.get('markov', 'a -> b', {})
+    True
+    """
+
+    def __init__(self, size=PROGRAMS):
+        """See help(type(x))."""
+        self.size = size
+        self.programs = OrderedDict()
+
+    @staticmethod
+    def build(kind, source, options):
+        """Parse, check and prepare program."""
+        if kind not in PROGRAM_OPTIONS:
+            raise ValueError('Unknown kind of program: {kind}'.format(kind=kind))
+        unknown = set(options).difference(PROGRAM_OPTIONS[kind])
+        if unknown:
+            raise ValueError('Unknown options: ' + ', '.join(sorted(unknown)))
+        lines = source.splitlines()
+        if kind == 'markov':
+            program = Algorithm(lines, **options)
+        else:
+            program = build_machine(lines, **options)
+        program.prepare()
+        return program
+
+    def get(self, kind, source, options):
+        """Return parsed program (it's parsed once)."""
+        key = kind, source, tuple(sorted(options.items()))
+        program = self.programs.pop(key, None)
+        if program is None:
+            program = self.build(kind, source, options)
+        self.programs[key] = program
+        while len(self.programs) > self.size:
+            self.programs.popitem(last=False)
+        return program
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+"""Profiling of markov algorithms and turing machines.
+
+Profile is an observer: engine wraps its matcher (or its step function)
+by profile.wrap only if profile is given, so without profile execution
+costs exactly the same. One profile collects statistics of many runs.
+"""
+
+from time import perf_counter
+
+class MarkovProfile:
+
+    """Per-rule statistics: how many times rule fired and how long it was searched.
+
+    Search time of the rule is the time of matcher.find, which has chosen
+    it, and of matcher.update after its substitution.
+
+    >>> from turingmarkov.markov import Algorithm
+    >>> algo = Algorithm(['aa -> a', 'b -> a'])
+    >>> profile = MarkovProfile(algo)
+    >>> algo.execute('aab', profile=profile)
+    'a'
+    >>> [rule['fires'] for rule in profile.as_dict()['rules']]
+    [2, 1]
+    """
+
+    def __init__(self, algorithm):
+        """See help(type(x))."""
+        self.rules = [algorithm.format_rule(rule) for rule in algorithm.rules]
+        self.fires = [0] * len(self.rules)
+        self.match_time = [0.0] * len(self.rules)
+        self.miss_time = 0.0
+        self.runs = 0
+        self.max_length = 0
+
+    def wrap(self, matcher):
+        """Start new run, return matcher which reports to the profile."""
+        self.runs += 1
+        return ProfilingMatcher(self, matcher)
+
+    def as_dict(self):
+        """Return statistics as dict (e.g. for json)."""
+        return {'runs': self.runs,
+                'tacts': sum(self.fires),
+                'max_length': self.max_length,
+                'miss_time': round(self.miss_time, 6),
+                'rules': [{'rule': rule, 'fires': fires, 'match_time': round(seconds, 6)}
+                          for rule, fires, seconds in zip(self.rules, self.fires,
+                                                          self.match_time)]}
+
+
+class ProfilingMatcher:
+
+    """Matcher, which measures another matcher (see MarkovProfile)."""
+
+    def __init__(self, profile, matcher):
+        """See help(type(x))."""
+        self.profile = profile
+        self.matcher = matcher
+        self.last = None
+
+    def reset(self, word):
+        """Same as matcher.reset."""
+        self.matcher.reset(word)
+        self.profile.max_length = max(self.profile.max_length, len(word))
+
+    def update(self, word, pos, removed, inserted):
+        """Same as matcher.update, time is added to the last found rule."""
+        start = perf_counter()
+        self.matcher.update(word, pos, removed, inserted)
+        self.profile.match_time[self.last] += perf_counter() - start
+        self.profile.max_length = max(self.profile.max_length, len(word))
+
+    def find(self, word):
+        """Same as matcher.find, count fire of the found rule."""
+        start = perf_counter()
+        found = self.matcher.find(word)
+        seconds = perf_counter() - start
+        if found is None:
+            self.profile.miss_time += seconds
+        else:
+            self.last = found[0]
+            self.profile.fires[self.last] += 1
+            self.profile.match_time[self.last] += seconds
+        return found
+
+
+class TuringProfile:
+
+    """Per-transition statistics and movement of the head.
+
+    Transition (state, symbol) is counted every time it's applied. Travel is
+    total count of head moves, growth is count of cells outside of the input
+    word, which were visited by the head.
+
+    >>> from turingmarkov.turing import Machine
+    >>> machine = Machine(['a', '_'])
+    >>> machine.add_state('0 ,R, a,N,!')
+    >>> profile = TuringProfile()
+    >>> machine.execute('aa', profile=profile)
+    'aaa'
+    >>> profile.as_dict()['travel'], profile.as_dict()['growth']
+    (2, 1)
+    """
+
+    def __init__(self):
+        """See help(type(x))."""
+        self.hits = {}
+        self.runs = 0
+        self.travel = 0
+        self.growth = 0
+
+    def wrap(self, machine, length):
+        """Start new run on word of given length, return step function of machine."""
+        self.runs += 1
+        hits = self.hits
+        visited = [machine.head, machine.head]
+        low, high = 0, length - 1
+
+        def step():
+            """Execute machine.execute_once and remember what happened."""
+            key = machine.state, machine._read()
+            head = machine.head
+            machine.execute_once()
+            hits[key] = hits.get(key, 0) + 1
+            self.travel += abs(machine.head - head)
+            if machine.head < visited[0]:
+                visited[0] = machine.head
+                if machine.head < low:
+                    self.growth += 1
+            elif machine.head > visited[1]:
+                visited[1] = machine.head
+                if machine.head > high:
+                    self.growth += 1
+
+        return step
+
+    def as_dict(self):
+        """Return statistics as dict (e.g. for json), hot transitions first."""
+        transitions = sorted(self.hits.items(), key=lambda item: (-item[1], item[0]))
+        return {'runs': self.runs,
+                'tacts': sum(self.hits.values()),
+                'travel': self.travel,
+                'growth': self.growth,
+                'transitions': [{'state': state, 'symbol': symbol, 'hits': hits}
+                                for (state, symbol), hits in transitions]}
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+"""Long-lived judging server.
+
+Client sends jobs as json lines to unix socket or local tcp port:
+{"id": 1, "kind": "markov", "program": "...", "inputs": ["..."],
+"max_tacts": 1000, "time_limit": 1.0, "detect_loops": false}
+(optional "matcher", "word", "engine" and "backend" are the same as
+command line options). For every job server answers with json line
+{"id": 1, "results": [...]}, where result is {"status": "ok", "output",
+"tacts"}, {"status": "limit", ...report of LimitExceeded} or
+{"status": "error", "message"}; wrong program or job gives {"id", "error"}.
+
+Parsed programs are kept in the pool of every worker, so the same
+program is parsed once. Jobs are executed by bounded pool of workers,
+server doesn't read new jobs while all slots are busy. Answers are sent
+as soon as they are ready, so they can go out of order.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import asyncio, json, os
+from .limits import LimitExceeded, min_limit
+from .pool import ProgramPool
+from .streams import strip_spaces
+
+QUEUE = 4 # Jobs per worker, which can wait for it
+LINE_LIMIT = 64 * 1024 * 1024 # Max size of one job
+
+_POOL = ProgramPool()
+
+def run_job(job, settings):
+    """Execute job (in the worker), return answer without id.
+
+    Settings are limits of the server: max_tacts and max_time.
+    """
+    kind, source, inputs = job.get('kind'), job.get('program'), job.get('inputs', [])
+    if (not isinstance(source, str) or not isinstance(inputs, list) or
+            not all(isinstance(string, str) for string in inputs)):
+        return {'error': 'Wrong job: program should be a string and inputs a list of strings'}
+    options = {name: job[name] for name in ('matcher', 'word', 'engine', 'backend')
+               if name in job}
+    try:
+        program = _POOL.get(kind, source, options)
+    except (SyntaxError, ValueError) as err:
+        return {'error': '{name}: {message}'.format(name=type(err).__name__, message=err)}
+
+    limits = {'max_tacts': min_limit(job.get('max_tacts'), settings.get('max_tacts')),
+              'max_time': min_limit(job.get('time_limit'), settings.get('max_time')),
+              'detect_loops': bool(job.get('detect_loops', False))}
+    results = []
+    for string in inputs:
+        if kind == 'markov':
+            string = strip_spaces(string)
+        try:
+            output = program.execute(string, **limits)
+            results.append({'status': 'ok', 'output': output, 'tacts': program.tacts})
+        except LimitExceeded as err:
+            results.append(dict(err.as_dict(), status='limit'))
+        except RuntimeError as err:
+            results.append({'status': 'error', 'message': str(err)})
+    return {'results': results}
+
+
+class JudgeServer:
+
+    """Asyncio server, which executes jobs by pool of workers.
+
+    With one worker jobs are executed by thread of this process,
+    otherwise by worker processes.
+    """
+
+    def __init__(self, workers=1, max_tacts=None, max_time=None):
+        """See help(type(x))."""
+        self.workers = max(workers, 1)
+        self.settings = {'max_tacts': max_tacts, 'max_time': max_time}
+        self.executor = None
+        self.slots = None
+        self.server = None
+
+    async def start(self, path=None, host='127.0.0.1', port=0):
+        """Listen unix socket (if path is given) or tcp port, return asyncio server."""
+        if self.workers == 1:
+            self.executor = ThreadPoolExecutor(1)
+        else:
+            self.executor = ProcessPoolExecutor(self.workers)
+        self.slots = asyncio.Semaphore(self.workers * QUEUE)
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle, path, limit=LINE_LIMIT)
+        else:
+            self.server = await asyncio.start_server(self.handle, host, port, limit=LINE_LIMIT)
+        return self.server
+
+    async def close(self):
+        """Stop listening and stop workers."""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    async def handle(self, reader, writer):
+        """Read jobs of one client, answer them."""
+        tasks = set()
+        try:
+            while True:
+                await self.slots.acquire()
+                line = await reader.readline()
+                if not line.strip():
+                    self.slots.release()
+                    if line:
+                        continue
+                    break
+                task = asyncio.ensure_future(self.answer(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            writer.close()
+
+    async def answer(self, line, writer):
+        """Execute one job and send answer."""
+        try:
+            try:
+                job = json.loads(line.decode('utf-8'))
+                if not isinstance(job, dict):
+                    raise ValueError('job should be an object')
+            except ValueError as err:
+                answer = {'id': None, 'error': 'Wrong job: {0}'.format(err)}
+            else:
+                loop = asyncio.get_running_loop()
+                try:
+                    answer = await loop.run_in_executor(self.executor, run_job, job,
+                                                        self.settings)
+                except Exception as err: # Server should go on
+                    answer = {'error': '{name}: {message}'.format(name=type(err).__name__,
+                                                                  message=err)}
+                answer['id'] = job.get('id')
+            writer.write(json.dumps(answer, sort_keys=True).encode('utf-8') + b'\n')
+            await writer.drain()
+        finally:
+            self.slots.release()
+
+
+def serve(path=None, host='127.0.0.1', port=0, workers=1, max_tacts=None, max_time=None,
+          stderr=None):
+    """Run server until it's interrupted."""
+    async def main():
+        """Start server and wait forever."""
+        server = JudgeServer(workers, max_tacts, max_time)
+        listener = await server.start(path, host, port)
+        if stderr is not None:
+            address = path if path is not None else '{0}:{1}'.format(
+                *listener.sockets[0].getsockname()[:2])
+            print('Listening on', address, file=stderr, flush=True)
+        try:
+            await listener.serve_forever()
+        finally:
+            await server.close()
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
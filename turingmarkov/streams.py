@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+"""Input and output of run commands.
+
+Lines are read lazily (from memory-mapped file, if it's possible and
+asked), results are collected to big blocks and written at once, so
+throughput doesn't depend on count of syscalls.
+"""
+
+import mmap, os, stat
+
+BUFFER_SIZE = 64 * 1024
+
+# All whitespace characters (the last one is U+3000)
+SPACES = dict.fromkeys(code for code in range(0x3001) if chr(code).isspace())
+
+def strip_spaces(line):
+    """Remove all whitespace characters, same as ''.join(line.split())."""
+    return line.translate(SPACES)
+
+def _map_file(stream):
+    """Return mmap of the stream or None, if stream isn't unread regular file."""
+    try:
+        fileno = stream.fileno()
+        if not stat.S_ISREG(os.fstat(fileno).st_mode) or stream.tell() != 0:
+            return None
+        if os.fstat(fileno).st_size == 0:
+            return None
+        return mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError):
+        return None
+
+def _mapped_lines(mapped, encoding):
+    """Iterate over lines of memory-mapped file."""
+    try:
+        start = 0
+        while start < len(mapped):
+            end = mapped.find(b'\n', start)
+            end = len(mapped) if end == -1 else end + 1
+            yield mapped[start:end].decode(encoding)
+            start = end
+    finally:
+        mapped.close()
+
+def read_lines(stream, use_mmap=False):
+    """Return iterator over lines of stream.
+
+    If use_mmap is True and stream is a regular file, it's memory-mapped,
+    so only the current line is in memory as str.
+    """
+    if use_mmap:
+        mapped = _map_file(stream)
+        if mapped is not None:
+            return _mapped_lines(mapped, getattr(stream, 'encoding', None) or 'utf-8')
+    return iter(stream)
+
+
+class OutputBuffer:
+
+    """Collect lines and write them by blocks of size characters.
+
+    With size 0 every line is written and flushed at once (interactive mode).
+
+    >>> import io
+    >>> stream = io.StringIO()
+    >>> output = OutputBuffer(stream, size=10)
+    >>> output.write_line('abc')
+    >>> stream.getvalue()
+    ''
+    >>> output.flush()
+    >>> stream.getvalue()
+    'abc\\n'
+    """
+
+    def __init__(self, stream, size=BUFFER_SIZE):
+        """See help(type(x))."""
+        self.stream = stream
+        self.size = size
+        self.parts = []
+        self.length = 0
+
+    def write_line(self, line):
+        """Add line to the buffer, write the buffer if it's full."""
+        self.parts.append(line)
+        self.parts.append('\n')
+        self.length += len(line) + 1
+        if self.length >= self.size:
+            self.flush()
+
+    def flush(self):
+        """Write everything from the buffer."""
+        if self.parts:
+            self.stream.write(''.join(self.parts))
+            self.parts = []
+            self.length = 0
+        if hasattr(self.stream, 'flush'):
+            self.stream.flush()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for python and native backends."""
+
+from turingmarkov import backends
+from turingmarkov.backends import available_backends, get_native
+from turingmarkov.markov import Algorithm
+from turingmarkov.turing import build_machine
+from turingmarkov.limits import LimitExceeded
+from turingmarkov.bench import CORPUS
+from pytest import raises, mark
+import random
+
+BACKENDS = available_backends()
+
+def outcome(program, string, max_tacts=None):
+    """Return everything, what is known after execution."""
+    try:
+        result = program.execute(string, max_tacts=max_tacts)
+    except (LimitExceeded, RuntimeError) as err:
+        result = type(err).__name__, str(err), getattr(err, 'snapshot', None)
+    return (result, program.tacts,
+            getattr(program, 'last_rule', None), getattr(program, 'head', None))
+
+def test_get_native(monkeypatch):
+    """Backend is chosen by name."""
+    assert 'python' in BACKENDS
+    assert get_native('python') is None
+    with raises(ValueError):
+        get_native('unknown')
+    with raises(ValueError):
+        Algorithm(['a -> b'], backend='unknown')
+
+    monkeypatch.setattr(backends, '_native', None)
+    assert available_backends() == ['python']
+    with raises(ValueError):
+        get_native('native')
+    monkeypatch.setattr(backends, 'DEFAULT', None)
+    assert get_native() is None
+
+@mark.parametrize('backend', BACKENDS)
+def test_corpus(backend):
+    """Programs of the benchmark give right answers."""
+    for case in CORPUS:
+        if case.kind == 'markov':
+            program = Algorithm(case.source, backend=backend)
+        else:
+            program = build_machine(case.source, engine='table', backend=backend)
+        rnd = random.Random(1)
+        for size in (1, 2, 7, 30):
+            line = case.make_input(rnd, size)
+            assert program.execute(line) == case.answer(line)
+
+def random_rule(rnd):
+    """Return random rule over a, b, c."""
+    lhs = ''.join(rnd.choice('ab') for _ in range(rnd.randint(0, 2)))
+    rhs = ''.join(rnd.choice('abc') for _ in range(rnd.randint(0, 3)))
+    return '{lhs} {arrow} {rhs}'.format(lhs=lhs, arrow=rnd.choice(['->', '=>']), rhs=rhs)
+
+@mark.parametrize('backend', BACKENDS)
+def test_same_outcome(backend):
+    """Result, tacts, last rule and position of head are the same as in python."""
+    rnd = random.Random(42)
+    for _ in range(300):
+        rules = [random_rule(rnd) for _ in range(rnd.randint(1, 4))]
+        expected, program = Algorithm(rules, backend='python'), Algorithm(rules, backend=backend)
+        for _ in range(3):
+            string = ''.join(rnd.choice('abc') for _ in range(rnd.randint(0, 8)))
+            assert outcome(program, string, 100) == outcome(expected, string, 100)
+
+    # Long patterns with repeated symbols, first and last symbols are common
+    for _ in range(100):
+        rules = ['{lhs} -> {rhs}'.format(lhs=''.join(rnd.choice('aab') for _ in range(size)),
+                                         rhs=''.join(rnd.choice('ab') for _ in range(size)))
+                 for size in rnd.sample(range(1, 7), 3)]
+        expected, program = Algorithm(rules, backend='python'), Algorithm(rules, backend=backend)
+        string = ''.join(rnd.choice('aaab') for _ in range(rnd.randint(0, 60)))
+        assert outcome(program, string, 100) == outcome(expected, string, 100)
+
+    lines = ['a b _', '0 b,R, ,L,1 a,R,', '1 ,L, a,L,0 _,R,!']
+    expected = build_machine(lines, engine='table', backend='python')
+    program = build_machine(lines, engine='table', backend=backend)
+    for string in ['', 'a', 'ab', 'bba', 'a' * 100, 'c']:
+        for max_tacts in (1, 10, 1000):
+            assert outcome(program, string, max_tacts) == outcome(expected, string, max_tacts)
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for batch execution."""
+
+from turingmarkov.batch import execute_many
+from turingmarkov.markov import Algorithm
+from turingmarkov.turing import build_machine
+from turingmarkov.limits import LimitExceeded
+from pytest import raises
+
+def test_execute_many_markov():
+    """Results are in the input order."""
+    algo = Algorithm(['#x -> xx#', '#  => ', '   -> #'])
+    strings = ['x' * i for i in range(300)]
+    expected = ['x' * (2 * i) for i in range(300)]
+    assert list(algo.execute_many(strings)) == expected
+    assert list(algo.execute_many(strings, workers=2)) == expected
+    assert list(algo.execute_many(iter(strings), workers=3, max_tacts=1000)) == expected
+
+def test_execute_many_turing():
+    """Same for turing machine."""
+    machine = build_machine(['0 1 _', '0 ,R, ,R, ,L,1', '1 1,N,! 0,L, 1,N,!'])
+    strings = [bin(i)[2:] for i in range(200)]
+    expected = [bin(i + 1)[2:] for i in range(200)]
+    assert list(machine.execute_many(strings, workers=2)) == expected
+    assert list(execute_many(machine, [], workers=2)) == []
+
+def test_execute_many_errors():
+    """Exception is raised after results of previous lines."""
+    algo = Algorithm(['a -> aa'])
+    results = algo.execute_many(['b', 'c', 'a', 'd'], workers=2, max_tacts=100)
+    assert next(results) == 'b'
+    assert next(results) == 'c'
+    with raises(TimeoutError):
+        next(results)
+
+def test_execute_many_catch():
+    """Caught exceptions are yielded instead of results."""
+    algo = Algorithm(['a -> aa'])
+    results = list(algo.execute_many(['b', 'a', 'c'], max_tacts=100, catch=LimitExceeded))
+    assert results[0] == 'b' and results[2] == 'c'
+    assert isinstance(results[1], LimitExceeded) and results[1].tacts == 100
+
+    results = list(algo.execute_many(['b', 'a', 'c'], workers=2, max_tacts=100,
+                                     catch=LimitExceeded))
+    assert results[0] == 'b' and results[2] == 'c'
+    assert results[1].snapshot == 'a' * 101
+
+    algo = Algorithm(['a -> b', 'b -> a'])
+    results = list(algo.execute_many(['c', 'a'], workers=2, detect_loops=True,
+                                     catch=LimitExceeded))
+    assert results[0] == 'c'
+    assert results[1].reason == 'loop' and results[1].period == 2
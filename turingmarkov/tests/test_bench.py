@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for benchmark."""
+
+from turingmarkov.bench import CORPUS, run_bench, compare, percentile
+from turingmarkov.matching import MATCHERS
+from turingmarkov.turing import ENGINES
+
+def test_corpus():
+    """Every program of corpus gives right answers with every engine."""
+    for matcher in MATCHERS:
+        report = run_bench(matcher=matcher, word='rope', sizes=(1, 7))
+        assert len(report) == 2 * len(CORPUS)
+    for engine in ENGINES:
+        report = run_bench(engine=engine, sizes=(8,))
+        assert report['turing/reversal/8']['tacts'] > 0
+        assert report['turing/reversal/8']['peak_memory'] > 0
+
+def test_report():
+    """Report has speed, latency and memory."""
+    report = run_bench(scale=2, sizes=(4,))
+    assert set(report['markov/palindrome/8']) == {'lines', 'tacts', 'seconds', 'tacts_per_sec',
+                                                  'p50', 'p90', 'p99', 'peak_memory'}
+    assert percentile([3, 1, 2, 5, 4], 0.5) == 3
+    assert percentile([3, 1, 2, 5, 4], 0.99) == 5
+
+def test_compare():
+    """Only big slowdown and memory growth are regressions."""
+    baseline = {'a': {'tacts_per_sec': 1000.0, 'peak_memory': 1000},
+                'b': {'tacts_per_sec': 1000.0, 'peak_memory': 1000}}
+    report = {'a': {'tacts_per_sec': 900.0, 'peak_memory': 1100},
+              'b': {'tacts_per_sec': 700.0, 'peak_memory': 1300},
+              'c': {'tacts_per_sec': 1.0, 'peak_memory': 1}}
+    assert compare(report, baseline) == ['b: tacts_per_sec 1000.0 -> 700.0',
+                                         'b: peak_memory 1000 -> 1300']
+    assert compare(report, baseline, tolerance=0.5) == []
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for program cache."""
+
+from turingmarkov.cache import ProgramCache
+from turingmarkov.markov import Algorithm
+from turingmarkov.turing import build_machine
+from pytest import raises
+import os
+
+LINES = ['0 1 _', '0 ,R, ,R, ,L,1', '1 1,N,! 0,L, 1,N,!']
+
+def test_cache_hit(tmpdir):
+    """Program is built once, then it's loaded prepared."""
+    cache = ProgramCache(str(tmpdir), version='1')
+    built = []
+    def build():
+        built.append(True)
+        return build_machine(LINES, engine='table')
+
+    machine = cache.get('turing', LINES, build, engine='table')
+    assert machine.table is not None
+    machine = cache.get('turing', LINES, build, engine='table')
+    assert len(built) == 1
+    assert machine.checked and machine.table is not None
+    assert machine.execute('1011') == '1100'
+
+    # Other version, options or source give other key
+    cache.get('turing', LINES, build, engine='macro')
+    ProgramCache(str(tmpdir), version='2').get('turing', LINES, build, engine='table')
+    cache.get('turing', LINES[:2] + ['1 1,N,! 0,L, 1,N,1'], build, engine='table')
+    assert len(built) == 4
+
+def test_cache_errors(tmpdir):
+    """Broken programs are not saved, broken files are rebuilt."""
+    cache = ProgramCache(str(tmpdir), version='1')
+    with raises(SyntaxError):
+        cache.get('turing', ['a _', '0 ,R, ,R,'], lambda: build_machine(['a _', '0 ,R, ,R,']))
+    assert os.listdir(str(tmpdir)) == []
+
+    lines = ['aa -> a']
+    cache.get('markov', lines, lambda: Algorithm(lines))
+    path, = tmpdir.listdir()
+    path.write('broken')
+    algo = cache.get('markov', lines, lambda: Algorithm(lines), matcher='scan')
+    algo = cache.get('markov', lines, lambda: Algorithm(lines))
+    assert algo.execute('aaa') == 'a'
+    assert path.read_binary() != b'broken'
+
+def test_cache_eviction(tmpdir):
+    """Least recently used programs are removed first."""
+    cache = ProgramCache(str(tmpdir), version='1')
+    keys = []
+    for i in range(3):
+        lines = ['a' * i + ' -> b']
+        cache.get('markov', lines, lambda: Algorithm(lines))
+        keys.append(cache.key('markov', ''.join(lines)))
+        path = os.path.join(str(tmpdir), keys[-1] + '.pickle')
+        os.utime(path, (1000 + i, 1000 + i))
+    size = os.path.getsize(path)
+
+    assert cache.load(keys[0]) is not None # Now it's the last used
+    cache.max_size = 2 * size + size // 2
+    cache.evict()
+    assert cache.load(keys[1]) is None
+    assert cache.load(keys[0]) is not None
+    assert cache.load(keys[2]) is not None
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for judging of many programs."""
+
+from turingmarkov.judge import find_programs, judge, read_tests, write_csv
+from turingmarkov.__main__ import main
+from turingmarkov.markov import Algorithm
+from pytest import raises
+import io, json
+
+DOUBLE = '#x -> xx#\n# =>\n-> #\n'
+TRIPLE = '#x -> xxx#\n# =>\n-> #\n'
+APPEND = 'x _\n0 ,R, x,N,!\n'
+TESTS = ['{"input": "x", "output": "xx"}',
+         '{"input": "x x", "output": "xxxx", "max_tacts": 100}',
+         '',
+         '{"input": "xxxxxx", "output": "xxxxxxxxxxxx", "max_tacts": 4}',
+         '{"input": "y", "output": "y"}']
+
+def write_programs(tmpdir):
+    """Write programs to directory, return its path."""
+    tmpdir.join('double.markov').write(DOUBLE)
+    tmpdir.join('triple.markov').write(TRIPLE)
+    tmpdir.join('broken.markov').write('x - y\n')
+    tmpdir.join('append.turing').write(APPEND)
+    tmpdir.join('notes.txt').write('not a program')
+    return str(tmpdir)
+
+def verdicts(matrix):
+    """Return {program: [(verdict, tacts)]}."""
+    return {row['program']: [(verdict['verdict'], verdict['tacts'])
+                             for verdict in row['verdicts']]
+            for row in matrix}
+
+def test_read_tests():
+    """Empty lines are skipped, wrong tests are reported with line."""
+    tests = read_tests(TESTS)
+    assert len(tests) == 4
+    assert tests[1] == {'input': 'x x', 'output': 'xxxx', 'max_tacts': 100}
+    with raises(ValueError, match='line 2'):
+        read_tests(['{"input": "", "output": ""}', '{"input": 1, "output": ""}'])
+    with raises(ValueError, match='line 1'):
+        read_tests(['{'])
+
+def test_judge(tmpdir):
+    """Every program gets verdict on every test, workers don't change them."""
+    programs = find_programs(write_programs(tmpdir))
+    assert [name for name, _, _ in programs] == ['append.turing', 'broken.markov',
+                                                 'double.markov', 'triple.markov']
+    tests = read_tests(TESTS)
+    matrix = judge(programs, tests)
+    assert verdicts(matrix) == {
+        'append.turing': [('OK', 2), ('WA', 2), ('TL', 4), ('RE', None)],
+        'broken.markov': [('RE', None)] * 4,
+        'double.markov': [('OK', 3), ('OK', 4), ('TL', 4), ('OK', 2)],
+        'triple.markov': [('WA', 3), ('WA', 4), ('TL', 4), ('OK', 2)]}
+    assert [row['passed'] for row in matrix] == [1, 0, 3, 1]
+    assert matrix[1]['verdicts'][0]['message'].startswith('SyntaxError')
+
+    assert verdicts(judge(programs, tests, max_tacts=3)) == {
+        'append.turing': [('OK', 2), ('WA', 2), ('TL', 3), ('RE', None)],
+        'broken.markov': [('RE', None)] * 4,
+        'double.markov': [('OK', 3), ('TL', 3), ('TL', 3), ('OK', 2)],
+        'triple.markov': [('WA', 3), ('TL', 3), ('TL', 3), ('OK', 2)]}
+
+    tests = [{'input': 'x' * (number % 7), 'output': 'x' * (number % 7 * 2)}
+             for number in range(200)]
+    assert judge(programs, tests, workers=2) == judge(programs, tests)
+
+def test_unexpected_errors(tmpdir, monkeypatch):
+    """Any error of one pair is RE of this pair, judging goes on."""
+    programs = find_programs(write_programs(tmpdir))
+    execute = Algorithm.execute
+    def failing(self, string, **limits):
+        """Fail on the long input."""
+        if len(string) > 3:
+            raise MemoryError('tape is too long')
+        return execute(self, string, **limits)
+    monkeypatch.setattr(Algorithm, 'execute', failing)
+    matrix = judge(programs, read_tests(TESTS))
+    assert verdicts(matrix)['double.markov'] == [('OK', 3), ('OK', 4), ('RE', None),
+                                                 ('OK', 2)]
+    assert matrix[2]['verdicts'][2]['message'] == 'MemoryError: tape is too long'
+    assert verdicts(matrix)['append.turing'] == [('OK', 2), ('WA', 2), ('TL', 4), ('RE', None)]
+
+def test_main(tmpdir):
+    """Matrix is printed as json or csv."""
+    directory = write_programs(tmpdir.mkdir('programs'))
+    tests_path = tmpdir.join('tests.jsonl')
+    tests_path.write('\n'.join(TESTS) + '\n')
+
+    stdout = io.StringIO()
+    main(['turingmarkov', 'judge', directory, str(tests_path), '--max-tacts', '3',
+          '--engine', 'table'], None, stdout)
+    matrix = json.loads(stdout.getvalue())
+    assert [row['passed'] for row in matrix] == [1, 0, 2, 1]
+
+    stdout = io.StringIO()
+    main(['turingmarkov', 'judge', directory, str(tests_path), '--format', 'csv',
+          '--jobs', '2'], None, stdout)
+    lines = stdout.getvalue().splitlines()
+    assert lines[0] == 'program,test,verdict,tacts'
+    assert lines[1:5] == ['append.turing,1,OK,2', 'append.turing,2,WA,2',
+                          'append.turing,3,TL,4', 'append.turing,4,RE,']
+    assert len(lines) == 17
+
+    with raises(SystemExit):
+        main(['turingmarkov', 'judge', directory, str(tests_path), '--format', 'xml'],
+             None, io.StringIO())
+
+def test_write_csv():
+    """Program names are quoted, if it's needed."""
+    stream = io.StringIO()
+    write_csv([{'program': 'a,b.markov', 'kind': 'markov', 'passed': 1,
+                'verdicts': [{'verdict': 'OK', 'tacts': 1}]}], stream)
+    assert stream.getvalue() == 'program,test,verdict,tacts\n"a,b.markov",1,OK,1\n'
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for execution limits."""
+
+from turingmarkov.limits import (Budget, LimitExceeded, LoopDetected, LoopDetector, cut,
+                                 min_limit)
+from turingmarkov.markov import Algorithm, WordHash
+from turingmarkov.turing import build_machine
+from turingmarkov.words import StrWord, RopeWord, BytesWord
+from pytest import raises
+import random, time
+
+def test_budget():
+    """Tacts are checked exactly, time is checked every CHECK_EVERY tacts."""
+    budget = Budget()
+    assert budget.limit == Budget.NEVER
+
+    budget = Budget(max_tacts=10)
+    assert budget.limit == 10
+    assert budget.exceeded(10)
+    assert budget.reason == 'tacts'
+
+    budget = Budget(max_tacts=10 ** 6, max_time=3600)
+    assert budget.limit == Budget.CHECK_EVERY
+    assert not budget.exceeded(budget.limit)
+    assert budget.limit == 2 * Budget.CHECK_EVERY
+
+    budget = Budget(max_time=0)
+    assert budget.exceeded(budget.limit)
+    assert budget.reason == 'time'
+
+    # Snapshot is built after the clock is read
+    err = budget.error(1, '0', lambda text: time.sleep(0.1) or text, 'ab')
+    assert err.snapshot == 'ab'
+    assert err.elapsed < 0.1
+
+    # Other run continues the budget, only time is checked
+    budget = Budget(max_tacts=0)
+    assert not budget.resume(0)
+    assert budget.limit == 0
+    assert Budget(max_time=0).resume(10)
+
+def test_min_limit():
+    """None is no limit."""
+    assert min_limit(None, None) is None
+    assert min_limit(3, None) == min_limit(None, 3) == min_limit(5, 3) == 3
+
+def test_limit_exceeded():
+    """Report is json-friendly and snapshot is short."""
+    err = LimitExceeded('tacts', 10, '0', 'a' * 5000, 0.5)
+    assert isinstance(err, TimeoutError)
+    assert str(err) == "algorithm hasn't been stopped"
+    assert err.as_dict() == {'reason': 'tacts', 'tacts': 10, 'state': '0',
+                             'snapshot': cut('a' * 5000), 'elapsed': 0.5}
+    assert len(err.as_dict()['snapshot']) < 5000
+    assert str(LimitExceeded('time', 10, None, '', 0.5)) == 'time limit exceeded'
+
+def test_time_limit():
+    """Forever loops are stopped by the clock."""
+    algo = Algorithm(['a -> b', 'b -> a'])
+    with raises(LimitExceeded) as info:
+        algo.execute('a', max_time=0.05)
+    assert info.value.reason == 'time'
+    assert info.value.tacts == algo.tacts > 0
+    assert info.value.elapsed >= 0.05
+
+    for engine in ['dict', 'table', 'macro']:
+        machine = build_machine(['a b _', '0 b,N, a,N, ,N,!'], engine=engine)
+        with raises(LimitExceeded) as info:
+            machine.execute('a', max_time=0.05)
+        assert info.value.reason == 'time'
+        assert info.value.snapshot in ['a', 'b']
+
+def test_loop_detector():
+    """Configuration is saved after 1, 2, 4... tacts."""
+    detector = LoopDetector()
+    configurations = [5, 4, 3, 2, 1, 7, 8, 9, 7, 8, 9, 7, 8, 9, 7, 8, 9]
+    calls = []
+    def configuration(value):
+        calls.append(value)
+        return value
+    for tact, value in enumerate(configurations, 1):
+        if detector.repeated(tact, value % 2, configuration, value):
+            break
+    assert (tact, detector.period) == (11, 3)
+    assert len(calls) < len(configurations)
+
+    # Configurations are compared only when fingerprints are equal
+    detector = LoopDetector()
+    calls = []
+    for tact, value in enumerate(configurations, 1):
+        if detector.repeated(tact, 0, configuration, value, fingerprint=lambda: value):
+            break
+    assert (tact, detector.period) == (11, 3)
+    assert len(calls) == 5 # Saved configurations and the repeated one
+
+    err = detector.error(tact, '0', 'ab', 0.5)
+    assert isinstance(err, LimitExceeded)
+    assert str(err) == 'algorithm provably loops'
+    assert err.as_dict()['period'] == 3
+    assert err.as_dict()['reason'] == 'loop'
+
+def test_detect_loops_markov(monkeypatch):
+    """Repeated word means forever loop."""
+    for word in ['str', 'rope']:
+        algo = Algorithm(['ab -> ba', 'ba -> ab'], word=word)
+        with raises(LoopDetected) as info:
+            algo.execute('xaby', max_tacts=10 ** 9, detect_loops=True)
+        assert info.value.period == 2
+        assert info.value.tacts < 10
+
+    algo = Algorithm(['x -> xx'])
+    with raises(LimitExceeded) as info:
+        algo.execute('x', max_tacts=100, detect_loops=True)
+    assert info.value.reason == 'tacts'
+
+    algo = Algorithm(['#x -> xx#', '#  => ', '   -> #'])
+    assert algo.execute('xxx', detect_loops=True) == 'xxxxxx'
+
+    # Walk of the marker keeps length of the word, words are rendered only on save
+    for word, kind in [('str', StrWord), ('rope', RopeWord), ('bytes', BytesWord)]:
+        renders = []
+        render = kind.render
+        monkeypatch.setattr(kind, 'render',
+                            staticmethod(lambda word: renders.append(1) or render(word)))
+        algo = Algorithm(['ab -> ba'], word=word)
+        assert algo.execute('b' + 'a' * 1000 + 'b', detect_loops=True) == 'bb' + 'a' * 1000
+        assert len(renders) < 30
+
+def test_word_hash():
+    """Hash follows substitutions and doesn't depend on the history."""
+    rnd = random.Random(5)
+    for kind in [StrWord, RopeWord, BytesWord]:
+        string = ''.join(rnd.choice('abc') for _ in range(50))
+        word = kind.make(string)
+        word_hash = WordHash(kind, word)
+        for _ in range(200):
+            pos = rnd.randrange(len(string))
+            lhs = string[pos:pos + rnd.randint(0, 3)]
+            rhs = ''.join(rnd.choice('abc') for _ in range(rnd.choice([len(lhs), 2])))
+            string = string[:pos] + rhs + string[pos + len(lhs):]
+            word = kind.substitute(word, pos, len(lhs), kind.encode(rhs))
+            word_hash.update(word, pos, lhs, rhs)
+            if rnd.random() < 0.5:
+                assert word_hash() == WordHash(kind, kind.make(string))()
@@ -4,6 +4,61 @@
 
 from turingmarkov.__main__ import main, load_markov, load_turing, VERSION, USAGE
 from pytest import raises
+import turingmarkov, os, re, subprocess, sys, json
+
+IMPORT_BUDGET = 0.1 # Seconds for import of the entry point and the engine
+SLOW_MODULES = {'pytest', 'asyncio', 'concurrent.futures.process', 'tracemalloc'}
+
+def run_script(path, stdin):
+    """Run compiled script and return its output."""
+    return subprocess.run([sys.executable, str(path)], input=stdin, stdout=subprocess.PIPE,
+                          universal_newlines=True, check=True).stdout
+
+def imported_modules(argv, stdin=''):
+    """Run command in new interpreter, return imported modules and import times."""
+    script = ('import io, sys\n'
+              'from turingmarkov.__main__ import main\n'
+              'main(sys.argv, sys.stdin, io.StringIO())\n')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(turingmarkov.__file__)))
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', script] + argv[1:],
+                             input=stdin, stderr=subprocess.PIPE, universal_newlines=True,
+                             cwd=root, check=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        found = re.match(r'import time:\s*\d+ \|\s*(\d+) \|\s*(\S+)', line)
+        if found:
+            times[found.group(2)] = int(found.group(1)) / 1e6
+    return times
+
+def test_import_budget(tmpdir):
+    """Commands import only what they need, entry point is imported quickly."""
+    algo_path = tmpdir.join('double.markov')
+    algo_path.write('#x -> xx#\n# =>\n-> #\n')
+    machine_path = tmpdir.join('add.turing')
+    machine_path.write('1 + _\n0 ,R, ,R, ,L,1\n1 _,N,! - -\n')
+
+    times = imported_modules(['turingmarkov', 'version'])
+    assert 'turingmarkov.markov' not in times and 'turingmarkov.turing' not in times
+    assert SLOW_MODULES.isdisjoint(times)
+    assert times['turingmarkov.__main__'] < IMPORT_BUDGET
+
+    for argv in (['turingmarkov', 'run', 'markov', str(algo_path)],
+                 ['turingmarkov', 'compile', 'markov', str(algo_path)]):
+        times = imported_modules(argv, 'xx\n')
+        assert 'turingmarkov.turing' not in times
+        assert SLOW_MODULES.isdisjoint(times)
+        assert times['turingmarkov.__main__'] + times['turingmarkov.markov'] < IMPORT_BUDGET
+
+    times = imported_modules(['turingmarkov', 'run', 'turing', str(machine_path)], '1+1\n')
+    assert 'turingmarkov.markov' not in times
+    assert SLOW_MODULES.isdisjoint(times)
+    assert times['turingmarkov.__main__'] + times['turingmarkov.turing'] < IMPORT_BUDGET
+
+    tests_path = tmpdir.join('tests.jsonl')
+    tests_path.write('{"input": "1+1", "output": "11"}\n')
+    times = imported_modules(['turingmarkov', 'judge', str(tmpdir), str(tests_path)])
+    assert 'turingmarkov.server' not in times
+    assert SLOW_MODULES.isdisjoint(times)
 
 def test_load_markov(tmpdir):
     """Result should be Markov Algorithm."""
@@ -39,9 +94,8 @@ def test_compile_turing(tmpdir):
 
     machine = output_path.read()
     assert "# -*- coding: utf-8 -*-" in machine
-    assert "from turingmarkov.turing import Machine\n" in machine
-    assert "machine = Machine(['a', 'b', 'c', '_'])\n" in machine
-    assert "machine.add_state('0 a,R,0 b,R,0 c,R,0 a,N,!')\n" in machine
+    assert "turingmarkov" not in machine
+    assert run_script(output_path, 'abacab\nc\n') == 'abacaba\nca\n'
 
     with open(str(input_path)) as stdin:
         with open(str(output_path), 'w') as stdout:
@@ -49,9 +103,8 @@ def test_compile_turing(tmpdir):
 
     machine = output_path.read()
     assert "# -*- coding: utf-8 -*-" in machine
-    assert "from turingmarkov.turing import Machine\n" in machine
-    assert "machine = Machine(['a', 'b', 'c', '_'])\n" in machine
-    assert "machine.add_state('0 a,R,0 b,R,0 c,R,0 a,N,!')\n" in machine
+    assert "turingmarkov" not in machine
+    assert run_script(output_path, 'abacab\nc\n') == 'abacaba\nca\n'
 
 def test_run_turing(tmpdir):
     """Easy double word test."""
@@ -67,6 +120,13 @@ def test_run_turing(tmpdir):
 
     assert output_path.read() == 'abacaba\n'
 
+    with open(str(input_path)) as stdin:
+        with open(str(output_path), 'w') as stdout:
+            main(['turingmarkov', 'run', 'turing', str(machine_path), '--engine', 'table'],
+                 stdin, stdout)
+
+    assert output_path.read() == 'abacaba\n'
+
 def test_compile_markov(tmpdir):
     """Result should be python code."""
     input_path = tmpdir.join('double.markov')
@@ -78,10 +138,8 @@ def test_compile_markov(tmpdir):
 
     algo = output_path.read()
     assert "# -*- coding: utf-8 -*-" in algo
-    assert "from turingmarkov.markov import Algorithm" in algo
-    assert "'#x->xx#'" in algo
-    assert "'#=>'" in algo
-    assert "'->#'" in algo
+    assert "turingmarkov" not in algo
+    assert run_script(output_path, 'xxx\nx x\n') == 'xxxxxx\nxxxx\n'
 
     with open(str(input_path)) as stdin:
         with open(str(output_path), 'w') as stdout:
@@ -89,10 +147,8 @@ def test_compile_markov(tmpdir):
 
     algo = output_path.read()
     assert "# -*- coding: utf-8 -*-" in algo
-    assert "from turingmarkov.markov import Algorithm" in algo
-    assert "'#x->xx#'" in algo
-    assert "'#=>'" in algo
-    assert "'->#'" in algo
+    assert "turingmarkov" not in algo
+    assert run_script(output_path, 'xxx\nx x\n') == 'xxxxxx\nxxxx\n'
 
 def test_run_markov(tmpdir):
     """Easy double word test."""
@@ -108,6 +164,178 @@ def test_run_markov(tmpdir):
 
     assert output_path.read() == 'xxxxxx\n'
 
+def test_run_markov_matcher(tmpdir):
+    """Matcher can be chosen from command line."""
+    algo_path = tmpdir.join('double.markov')
+    algo_path.write('#x -> xx#\n# =>\n-> #\n')
+    input_path = tmpdir.join('input.txt')
+    input_path.write('xxx\nx\n')
+    output_path = tmpdir.join('output.txt')
+
+    with open(str(input_path)) as stdin:
+        with open(str(output_path), 'w') as stdout:
+            main(['turingmarkov', 'run', 'markov', '--matcher', 'automaton', str(algo_path)],
+                 stdin, stdout)
+
+    assert output_path.read() == 'xxxxxx\nxx\n'
+
+    with open(str(output_path), 'w') as stdout:
+        with raises(SystemExit):
+            main(['turingmarkov', 'run', 'markov', str(algo_path), '--matcher'], None, stdout)
+    assert output_path.read() == USAGE + '\n'
+
+def test_run_streams(tmpdir):
+    """Input can be memory-mapped, output buffer can be set."""
+    algo_path = tmpdir.join('double.markov')
+    algo_path.write('#x -> xx#\n# =>\n-> #\n')
+    input_path = tmpdir.join('input.txt')
+    input_path.write(''.join('x x' * i + '\n' for i in range(50)))
+    output_path = tmpdir.join('output.txt')
+
+    for buffer_size in ['0', '7', '65536']:
+        with open(str(input_path)) as stdin:
+            with open(str(output_path), 'w') as stdout:
+                main(['turingmarkov', 'run', 'markov', str(algo_path), '--mmap',
+                      '--buffer', buffer_size], stdin, stdout)
+        assert output_path.read() == ''.join('x' * (4 * i) + '\n' for i in range(50))
+
+def test_run_memo(tmpdir):
+    """Repeated lines are the same with memo."""
+    algo_path = tmpdir.join('double.markov')
+    algo_path.write('#x -> xx#\n# =>\n-> #\n')
+    output_path = tmpdir.join('output.txt')
+
+    with open(str(output_path), 'w') as stdout:
+        main(['turingmarkov', 'run', 'markov', str(algo_path), '--memo', '1'],
+             ['xxx\n', 'x\n', 'xxx\n'], stdout)
+    assert output_path.read() == 'xxxxxx\nxx\nxxxxxx\n'
+
+def test_run_jobs(tmpdir):
+    """Lines can be executed in parallel."""
+    algo_path = tmpdir.join('double.markov')
+    algo_path.write('#x -> xx#\n# =>\n-> #\n')
+    input_path = tmpdir.join('input.txt')
+    input_path.write(''.join('x' * i + '\n' for i in range(100)))
+    output_path = tmpdir.join('output.txt')
+
+    with open(str(input_path)) as stdin:
+        with open(str(output_path), 'w') as stdout:
+            main(['turingmarkov', 'run', 'markov', str(algo_path), '--jobs', '2'], stdin, stdout)
+
+    assert output_path.read() == ''.join('x' * (2 * i) + '\n' for i in range(100))
+
+def test_run_limits(tmpdir):
+    """Stopped lines are reported to stderr, other lines are executed."""
+    algo_path = tmpdir.join('loop.markov')
+    algo_path.write('a -> aa\nb => c\n')
+    input_path = tmpdir.join('input.txt')
+    input_path.write('b\na\nb\n')
+    output_path = tmpdir.join('output.txt')
+    errors_path = tmpdir.join('errors.txt')
+
+    with open(str(input_path)) as stdin:
+        with open(str(output_path), 'w') as stdout:
+            with open(str(errors_path), 'w') as stderr:
+                with raises(SystemExit):
+                    main(['turingmarkov', 'run', 'markov', str(algo_path),
+                          '--max-tacts', '10', '--time-limit', '5'], stdin, stdout, stderr)
+
+    assert output_path.read() == 'c\n\nc\n'
+    report = json.loads(errors_path.read())
+    assert report['line'] == 2
+    assert report['reason'] == 'tacts'
+    assert report['tacts'] == 10
+    assert report['state'] == 'a -> aa'
+    assert report['snapshot'] == 'a' * 11
+
+    algo_path.write('ab -> ba\nba -> ab\n')
+    with open(str(input_path)) as stdin:
+        with open(str(output_path), 'w') as stdout:
+            with open(str(errors_path), 'w') as stderr:
+                with raises(SystemExit):
+                    main(['turingmarkov', 'run', 'markov', '--detect-loops', str(algo_path)],
+                         ['a', 'ab', 'b'], stdout, stderr)
+    assert output_path.read() == 'a\n\nb\n'
+    report = json.loads(errors_path.read())
+    assert report['line'] == 2
+    assert report['reason'] == 'loop'
+    assert report['period'] == 2
+
+def test_run_profile(tmpdir):
+    """Profile is printed to stderr after all lines."""
+    machine_path = tmpdir.join('inc.turing')
+    machine_path.write('0 1 _\n0 ,R, ,R, ,L,1\n1 1,N,! 0,L, 1,N,!\n')
+    output_path = tmpdir.join('output.txt')
+    errors_path = tmpdir.join('errors.txt')
+
+    with open(str(output_path), 'w') as stdout:
+        with open(str(errors_path), 'w') as stderr:
+            main(['turingmarkov', 'run', 'turing', str(machine_path), '--profile',
+                  '--engine', 'table', '--jobs', '2'], ['1011\n', '11\n'], stdout, stderr)
+
+    assert output_path.read() == '1100\n100\n'
+    report = json.loads(errors_path.read())['profile']
+    assert report['runs'] == 2
+    assert report['tacts'] == 14
+
+def test_run_trace(tmpdir):
+    """Trace of every line is written to the file."""
+    algo_path = tmpdir.join('algo.markov')
+    algo_path.write('a -> b\n')
+    trace_path = tmpdir.join('algo.trace')
+    output_path = tmpdir.join('output.txt')
+
+    with open(str(output_path), 'w') as stdout:
+        main(['turingmarkov', 'run', 'markov', str(algo_path), '--trace', str(trace_path),
+              '--jobs', '2'], ['aa\n', 'ba\n'], stdout)
+    assert output_path.read() == 'bb\nbb\n'
+    from turingmarkov.tracing import TraceReader
+    with TraceReader(str(trace_path)) as reader:
+        assert [run.tacts for run in reader.runs] == [2, 1]
+        assert reader.seek(0, 1)['word'] == 'ba'
+
+def test_bench(tmpdir, monkeypatch):
+    """Report is json, regressions are found by baseline."""
+    monkeypatch.setattr('turingmarkov.bench.SIZES', (4,))
+    output_path = tmpdir.join('output.txt')
+    errors_path = tmpdir.join('errors.txt')
+
+    with open(str(output_path), 'w') as stdout:
+        main(['turingmarkov', 'bench', '--engine', 'table'], None, stdout)
+    report = json.loads(output_path.read())
+    assert report['turing/palindrome/4']['lines'] == 10
+
+    for value in report.values():
+        value['tacts_per_sec'] *= 100
+    baseline_path = tmpdir.join('baseline.json')
+    baseline_path.write(json.dumps(report))
+    with open(str(output_path), 'w') as stdout:
+        with open(str(errors_path), 'w') as stderr:
+            with raises(SystemExit):
+                main(['turingmarkov', 'bench', '--baseline', str(baseline_path)],
+                     None, stdout, stderr)
+    assert 'turing/palindrome/4: tacts_per_sec' in errors_path.read()
+
+def test_run_cache(tmpdir, monkeypatch):
+    """Second run takes program from cache."""
+    algo_path = tmpdir.join('double.markov')
+    algo_path.write('#x -> xx#\n# =>\n-> #\n')
+    cache_dir = tmpdir.join('cache')
+    output_path = tmpdir.join('output.txt')
+
+    for _ in range(2):
+        with open(str(output_path), 'w') as stdout:
+            main(['turingmarkov', 'run', 'markov', str(algo_path), '--cache', str(cache_dir)],
+                 ['xx\n'], stdout)
+        assert output_path.read() == 'xxxx\n'
+    assert len(cache_dir.listdir()) == 1
+
+    monkeypatch.setenv('TURINGMARKOV_CACHE', str(cache_dir))
+    with open(str(output_path), 'w') as stdout:
+        main(['turingmarkov', 'compile', 'markov', str(algo_path)], None, stdout)
+    assert run_script(output_path, 'xxx\n') == 'xxxxxx\n'
+    assert len(cache_dir.listdir()) == 1 # Same program and options
+
 def test_version(tmpdir):
     """Test that it's print current version."""
     output_path = tmpdir.join('output.txt')
@@ -2,16 +2,25 @@
 
 """Test case for markov algorithm emulator."""
 
-from turingmarkov.markov import Algorithm
+from turingmarkov.markov import Algorithm, format_rule
+from turingmarkov.limits import LimitExceeded, LoopDetected
 from pytest import raises
 
 def test_algorithm_init():
     """Test if we can create empty algorithm and algorithm with rules."""
     algo = Algorithm()
     assert algo.rules == []
+    assert algo.tacts == 0
     algo = Algorithm(['aa -> a', 'bb -> b', 'cc -> c'])
     assert algo.rules == [('aa', 'a', 0), ('bb', 'b', 0), ('cc', 'c', 0)]
 
+def test_format_rule():
+    """Rules are formatted as in the source, the method is the same function."""
+    algo = Algorithm(['a b -> c', '=> d'])
+    assert [format_rule(rule) for rule in algo.rules] == ['ab -> c', ' => d']
+    assert algo.format_rule(algo.rules[1]) == ' => d'
+    assert format_rule(None) is None
+
 class TestAlgorithm:
 
     """Test case for methods: add_rule, execute, execute_once."""
@@ -76,6 +85,19 @@ class TestAlgorithm:
         with raises(TimeoutError):
             self.algo.execute('xxx', max_tacts=500)
 
+    def test_algorithm_limits(self):
+        """Report about stopped algorithm."""
+        self.algo = Algorithm(['x -> xx'])
+        with raises(LimitExceeded) as info:
+            self.algo.execute('x', max_tacts=10)
+        assert info.value.tacts == self.algo.tacts == 10
+        assert info.value.state == 'x -> xx'
+        assert info.value.snapshot == 'x' * 11
+
+        self.algo = Algorithm(['#x -> xx#', '#  => ', '   -> #'])
+        assert self.algo.execute('xxx') == 'xxxxxx'
+        assert self.algo.tacts == 5
+
 
     def test_algorithm_execute_once(self):
         """Test `alpha -> alpha alpha` and remove double letters."""
@@ -119,12 +141,99 @@ class TestAlgorithm:
         assert string == 'abac'
         assert self.algo.last_rule is None
 
+    def test_algorithm_matcher(self):
+        """Automaton gives the same result as default matcher."""
+        rules = ['#x -> xx#', '#  => ', '   -> #']
+        self.algo = Algorithm(rules, matcher='automaton')
+        assert self.algo.execute('xxx', max_tacts=500) == 'xxxxxx'
+        assert self.algo.last_rule == ('#', '', 1)
+
+        self.algo = Algorithm(['aa -> a', 'bb -> b', 'cc -> c'], matcher='automaton')
+        assert self.algo.execute('abbbaacc', max_tacts=500) == 'abac'
+        self.algo.add_rule('ac -> ca')
+        assert self.algo.execute('abbbaacc', max_tacts=500) == 'abca'
+
+        for word in ('str', 'rope', 'bytes'):
+            self.algo = Algorithm(['ba -> ab', 'ca -> ac', 'cb -> bc'], matcher='incremental',
+                                  word=word)
+            assert self.algo.execute('cbacbacba', max_tacts=500) == 'aaabbbccc'
+            self.algo = Algorithm(rules, matcher='incremental', word=word)
+            assert self.algo.execute('x' * 1000) == 'x' * 2000
+            assert self.algo.execute_once('xx#x') == 'xxxx#'
+
+        self.algo = Algorithm(['a -> b'], matcher='unknown')
+        with raises(ValueError):
+            self.algo.execute('a')
+
+    def test_algorithm_word(self):
+        """Rope gives the same result as python string."""
+        rules = ['#x -> xx#', '#  => ', '   -> #']
+        self.algo = Algorithm(rules, word='rope')
+        assert self.algo.execute('xxx', max_tacts=500) == 'xxxxxx'
+        assert self.algo.last_rule == ('#', '', 1)
+        assert self.algo.execute('x' * 3000, max_tacts=5000) == 'x' * 6000
+
+        self.algo = Algorithm(['ba -> ab', 'ca -> ac', 'cb -> bc'], word='rope',
+                              matcher='automaton')
+        assert self.algo.execute('cbacba' * 20) == 'a' * 40 + 'b' * 40 + 'c' * 40
+        assert self.algo.last_rule is None
+
+        self.algo = Algorithm(['x -> xx'], word='rope')
+        with raises(TimeoutError):
+            self.algo.execute('xxx', max_tacts=500)
+
+        self.algo = Algorithm(['a -> b'], word='unknown')
+        with raises(ValueError):
+            self.algo.execute('a')
+
+    def test_algorithm_bytes(self):
+        """Bytes word gives the same result, non-ASCII words use str."""
+        rules = ['#x -> xx#', '#  => ', '   -> #']
+        for matcher in ('scan', 'automaton', 'incremental'):
+            self.algo = Algorithm(rules, word='bytes', matcher=matcher)
+            assert self.algo.execute('xxx', max_tacts=500) == 'xxxxxx'
+            assert self.algo.last_rule == ('#', '', 1)
+            assert self.algo.tacts == 5
+            assert self.algo.execute('x' * 300) == 'x' * 600
+
+        self.algo = Algorithm(['ba -> ab', 'ab -> ba'], word='bytes')
+        with raises(LoopDetected):
+            self.algo.execute('ab', detect_loops=True)
+        with raises(TimeoutError):
+            self.algo.execute('ab', max_tacts=10)
+
+        self.algo = Algorithm(['a -> б', 'б => в'], word='bytes')
+        assert self.algo.execute('aa') == 'вб'
+        self.algo = Algorithm(['a -> b', 'b => c'], word='bytes')
+        assert self.algo.execute('яa') == 'яc'
+        assert self.algo.execute('aa') == 'cb'
+        self.algo.add_rule('щ -> ш')
+        assert self.algo.execute('aa') == 'cb'
+
+    def test_algorithm_prune(self):
+        """Shadowed rules aren't given to matchers, numbers of rules are kept."""
+        for rule in ['ab -> c', 'xaby -> d', 'b -> e', 'bb -> f', 'c => g', ' => h', 'q -> i']:
+            self.algo.add_rule(rule)
+        assert self.algo.prune() == ['Rule 2 "xaby -> d" is shadowed by rule 1 "ab -> c"',
+                                     'Rule 4 "bb -> f" is shadowed by rule 3 "b -> e"',
+                                     'Rule 7 "q -> i" is shadowed by rule 6 " => h"']
+        for matcher in ['scan', 'automaton', 'incremental']:
+            algo = Algorithm([self.algo.format_rule(rule) for rule in self.algo.rules],
+                             matcher=matcher)
+            assert algo.execute('xabyq') == 'xgyq'
+            assert algo.last_rule == ('c', 'g', 1)
+            assert algo.execute('bbq') == 'heeq'
+            assert algo.pruned == self.algo.pruned
+
+        self.algo.add_rule('d -> ')
+        assert self.algo.prune()[-1] == 'Rule 8 "d -> " is shadowed by rule 6 " => h"'
+
     def test_algorithm_debug(self):
         """Not implemented."""
         self.algo.debug()
 
     def test_algorithm_compile(self):
-        """Return string with code."""
+        """Return string with code, which works without turingmarkov."""
         self.algo.add_rule('#x -> xx#')
         self.algo.add_rule('#  => ')
         self.algo.add_rule('   -> #')
@@ -132,17 +241,26 @@ class TestAlgorithm:
         algo = self.algo.compile()
         assert isinstance(algo, str)
         assert "# -*- coding: utf-8 -*-" in algo
-        assert "from turingmarkov.markov import Algorithm" in algo
+        assert "turingmarkov" not in algo
+        assert "string.find('#x')" in algo
+
+        compiled = {'__name__': 'compiled'}
+        exec(algo, compiled)
+        assert compiled['execute']('xxx') == 'xxxxxx'
+
+        self.algo = Algorithm(['aa -> a', 'bb -> b', 'cc -> c', 'c => d', '=> e', 'a -> b'])
+        exec(self.algo.compile(), compiled)
+        for word in ['abbbaacc', 'ab', '']:
+            assert compiled['execute'](word) == self.algo.execute(word)
 
-        assert "'#x->xx#'" in algo
-        assert "'#=>'" in algo
-        assert "'->#'" in algo
+        self.algo = Algorithm()
+        exec(self.algo.compile(), compiled)
+        assert compiled['execute']('abc') == 'abc'
 
     def test_algorithm_quoting(self):
-        r"""' should transform to \' in compiled code."""
-        self.algo = Algorithm(["'x->xx'", "'=>", "->'"])
-        algo = self.algo.compile()
-        assert isinstance(algo, str)
-        assert "\"'x->xx'\"" in algo
-        assert "\"'=>\"" in algo
-        assert "\"->'\"" in algo
+        """Quotes and backslashes should be escaped in compiled code."""
+        self.algo = Algorithm(["'x->xx'", "'=>", "->'", "\\ -> \""])
+        compiled = {'__name__': 'compiled'}
+        exec(self.algo.compile(), compiled)
+        for word in ["'x'", "\\", "x"]:
+            assert compiled['execute'](word) == self.algo.execute(word)
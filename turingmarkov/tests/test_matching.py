@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for rule matchers of markov algorithm."""
+
+from turingmarkov.matching import (ScanMatcher, AutomatonMatcher, IncrementalMatcher,
+                                   build_matcher)
+from pytest import raises
+import random
+
+def test_scan_matcher():
+    """First rule wins, leftmost occurrence is used."""
+    matcher = ScanMatcher([(0, 'bb'), (1, 'a'), (2, '')])
+    assert matcher.find('abbab') == (0, 1)
+    assert matcher.find('cab') == (1, 1)
+    assert matcher.find('ccc') == (2, 0)
+    assert ScanMatcher([(0, 'x')]).find('abc') is None
+
+def test_automaton_matcher():
+    """Same results as ScanMatcher."""
+    matcher = AutomatonMatcher([(0, 'bb'), (1, 'a'), (2, '')])
+    assert matcher.find('abbab') == (0, 1)
+    assert matcher.find('cab') == (1, 1)
+    assert matcher.find('ccc') == (2, 0)
+    assert matcher.find('') == (2, 0)
+    assert AutomatonMatcher([(0, 'x')]).find('abc') is None
+    assert AutomatonMatcher([]).find('abc') is None
+    assert AutomatonMatcher([(0, '')]).find('abc') == (0, 0)
+
+    # Suffix links: 'bc' is found inside of 'abd' branch
+    matcher = AutomatonMatcher([(0, 'abd'), (1, 'bc'), (2, 'c')])
+    assert matcher.find('abcabd') == (0, 3)
+    assert matcher.find('abcab') == (1, 1)
+
+    # Duplicate left parts: upper rule is used
+    matcher = AutomatonMatcher([(3, 'ab'), (5, 'ab')])
+    assert matcher.find('aab') == (3, 1)
+
+def test_automaton_random():
+    """Compare with ScanMatcher on random rules and words."""
+    rnd = random.Random(42)
+    for _ in range(300):
+        patterns = [(index, ''.join(rnd.choice('abc') for _ in range(rnd.randint(0, 3))))
+                    for index in range(rnd.randint(1, 6))]
+        scan, automaton = ScanMatcher(patterns), AutomatonMatcher(patterns)
+        for _ in range(10):
+            word = ''.join(rnd.choice('abc') for _ in range(rnd.randint(0, 12)))
+            assert scan.find(word) == automaton.find(word)
+
+def test_incremental_matcher():
+    """Occurrences are updated after edits."""
+    matcher = IncrementalMatcher([(0, '#x'), (1, '#'), (2, '')])
+    matcher.reset('xx')
+    assert matcher.find('xx') == (2, 0)
+    matcher.update('#xx', 0, 0, 1)
+    assert matcher.find('#xx') == (0, 0)
+    matcher.update('x#x', 0, 2, 2)
+    assert matcher.find('x#x') == (0, 1)
+    matcher.update('xx#', 1, 2, 2)
+    assert matcher.find('xx#') == (1, 2)
+
+def test_incremental_random():
+    """Compare with ScanMatcher on random edits."""
+    rnd = random.Random(42)
+    for _ in range(300):
+        patterns = [(index, ''.join(rnd.choice('ab') for _ in range(rnd.randint(0, 3))))
+                    for index in range(rnd.randint(1, 5))]
+        word = ''.join(rnd.choice('ab') for _ in range(rnd.randint(0, 12)))
+        scan, incremental = ScanMatcher(patterns), IncrementalMatcher(patterns)
+        incremental.reset(word)
+        for _ in range(10):
+            pos = rnd.randint(0, len(word))
+            removed = rnd.randint(0, min(3, len(word) - pos))
+            text = ''.join(rnd.choice('ab') for _ in range(rnd.randint(0, 4)))
+            word = word[:pos] + text + word[pos+removed:]
+            incremental.update(word, pos, removed, len(text))
+            assert scan.find(word) == incremental.find(word)
+
+def test_build_matcher():
+    """Matcher is chosen by name."""
+    assert isinstance(build_matcher('scan', []), ScanMatcher)
+    assert isinstance(build_matcher('automaton', []), AutomatonMatcher)
+    assert isinstance(build_matcher('incremental', []), IncrementalMatcher)
+    with raises(ValueError):
+        build_matcher('unknown', [])
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for memoization of markov algorithm."""
+
+from turingmarkov.memo import Memo
+from turingmarkov.markov import Algorithm
+from turingmarkov.limits import LimitExceeded
+import random
+
+def outcome(algo, string, max_tacts):
+    """Return everything, what is known after execution."""
+    try:
+        result = algo.execute(string, max_tacts=max_tacts)
+    except LimitExceeded as err:
+        return 'limit', err.tacts, err.snapshot
+    return result, algo.tacts, algo.last_rule
+
+def test_memo():
+    """Repeated and converging inputs use remembered results."""
+    memo = Memo(checkpoint_bits=0) # Every word is a checkpoint
+    algo = Algorithm(['#x -> xx#', '#  => ', '   -> #'], memo=memo)
+    assert algo.execute('xxx') == 'xxxxxx'
+    misses = memo.misses
+    assert algo.execute('xxx') == 'xxxxxx'
+    assert algo.tacts == 5
+    assert algo.last_rule == ('#', '', 1)
+    assert memo.misses == misses
+
+    assert algo.execute('xx#xx') == 'xxxxxx' # It was on the way of 'xxx'
+    assert algo.tacts == 3
+    assert memo.misses == misses
+
+    algo.add_rule('a -> b')
+    assert memo.entries == {}
+
+def test_memo_memory():
+    """Memory is bounded, least recently used entries are removed."""
+    memo = Memo(max_memory=2000)
+    for i in range(100):
+        memo.put('x' * i, ('final', 'y' * i, 0, 0, None))
+        assert memo.memory <= 2000
+    assert memo.get('x' * 99) is not None
+    assert memo.get('x') is None
+    memo.put('x' * 10 ** 4, ('final', '', 0, 0, None)) # Too big
+    assert memo.get('x' * 10 ** 4) is None
+
+def test_memo_same_results():
+    """Results, tacts and limits are exactly the same as without memo."""
+    rnd = random.Random(0)
+    for _ in range(200):
+        rules = []
+        for _ in range(rnd.randint(1, 4)):
+            lhs = ''.join(rnd.choice('ab') for _ in range(rnd.randint(0, 2)))
+            rhs = ''.join(rnd.choice('ab') for _ in range(rnd.randint(0, 3)))
+            rules.append(lhs + (' => ' if rnd.random() < 0.2 else ' -> ') + rhs)
+        plain = Algorithm(rules)
+        memoized = Algorithm(rules, memo=Memo(checkpoint_bits=rnd.randint(0, 2)))
+        rope = Algorithm(rules, word='rope', memo=Memo())
+        for _ in range(10):
+            string = ''.join(rnd.choice('ab') for _ in range(rnd.randint(0, 6)))
+            max_tacts = rnd.randint(1, 30)
+            expected = outcome(plain, string, max_tacts)
+            assert outcome(memoized, string, max_tacts) == expected
+            assert outcome(rope, string, max_tacts) == expected
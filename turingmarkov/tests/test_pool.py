@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for pool of parsed programs."""
+
+from turingmarkov.pool import ProgramPool
+from pytest import raises
+
+DOUBLE = '#x -> xx#\n# =>\n-> #\n'
+INCREMENT = '0 1 _\n0 ,R, ,R, ,L,1\n1 1,N,! 0,L, 1,N,!\n'
+
+def test_program_pool():
+    """Programs are parsed once, old ones are removed."""
+    pool = ProgramPool(size=2)
+    algo = pool.get('markov', DOUBLE, {})
+    assert pool.get('markov', DOUBLE, {}) is algo
+    assert pool.get('markov', DOUBLE, {'matcher': 'automaton'}) is not algo
+    pool.get('turing', INCREMENT, {})
+    assert len(pool.programs) == 2
+    assert pool.get('markov', DOUBLE, {}) is not algo
+
+    with raises(ValueError):
+        pool.get('pascal', '', {})
+    with raises(ValueError):
+        pool.get('turing', INCREMENT, {'word': 'rope'})
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for profiling."""
+
+from turingmarkov.profiling import MarkovProfile, TuringProfile
+from turingmarkov.markov import Algorithm
+from turingmarkov.turing import build_machine
+from turingmarkov.matching import MATCHERS
+
+def test_markov_profile():
+    """Fires are counted for every rule, for every matcher."""
+    for matcher in MATCHERS:
+        algo = Algorithm(['#x -> xx#', '#  => ', '   -> #'], matcher=matcher)
+        profile = MarkovProfile(algo)
+        assert algo.execute('xxx', profile=profile) == 'xxxxxx'
+        assert algo.execute('x', profile=profile) == 'xx'
+        assert algo.execute('xxx') == 'xxxxxx'
+
+        report = profile.as_dict()
+        assert report['runs'] == 2
+        assert report['tacts'] == 8
+        assert report['max_length'] == 7
+        assert [rule['rule'] for rule in report['rules']] == ['#x -> xx#', '# => ', ' -> #']
+        assert [rule['fires'] for rule in report['rules']] == [4, 2, 2]
+        assert all(rule['match_time'] >= 0 for rule in report['rules'])
+
+    algo = Algorithm(['a -> b'])
+    profile = MarkovProfile(algo)
+    assert algo.execute('aa', profile=profile) == 'bb'
+    assert profile.as_dict()['rules'][0]['fires'] == 2
+    assert profile.as_dict()['miss_time'] >= 0
+
+def test_turing_profile():
+    """Transitions, travel and growth are the same for every engine."""
+    lines = ['0 1 _', '0 ,R, ,R, ,L,1', '1 1,N,! 0,L, 1,N,!']
+    reports = []
+    for engine in ['dict', 'table', 'macro']:
+        machine = build_machine(lines, engine=engine)
+        profile = TuringProfile()
+        assert machine.execute('1011', profile=profile) == '1100'
+        assert machine.execute('11', profile=profile) == '100'
+        reports.append(profile.as_dict())
+
+    assert reports[0] == reports[1] == reports[2]
+    assert reports[0]['runs'] == 2
+    assert reports[0]['tacts'] == 14
+    assert reports[0]['transitions'][0] == {'state': '0', 'symbol': '1', 'hits': 5}
+    assert reports[0]['travel'] == 12
+    assert reports[0]['growth'] == 3
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for judging server."""
+
+from turingmarkov.server import JudgeServer, run_job
+import asyncio, json
+
+DOUBLE = '#x -> xx#\n# =>\n-> #\n'
+INCREMENT = '0 1 _\n0 ,R, ,R, ,L,1\n1 1,N,! 0,L, 1,N,!\n'
+
+def test_run_job():
+    """Results, limits and errors of one job."""
+    answer = run_job({'kind': 'markov', 'program': DOUBLE, 'inputs': ['x x', ''],
+                      'max_tacts': 100}, {})
+    assert answer == {'results': [{'status': 'ok', 'output': 'xxxx', 'tacts': 4},
+                                  {'status': 'ok', 'output': '', 'tacts': 2}]}
+
+    answer = run_job({'kind': 'turing', 'program': INCREMENT, 'inputs': ['1011', '2']},
+                     {'max_tacts': 5})
+    assert answer['results'][0]['status'] == 'limit'
+    assert answer['results'][0]['tacts'] == 5
+    assert answer['results'][1] == {'status': 'error', 'message': 'Invalid symbol: "2"'}
+
+    assert 'SyntaxError' in run_job({'kind': 'markov', 'program': 'a - b'}, {})['error']
+    assert 'Unknown' in run_job({'kind': 'pascal', 'program': ''}, {})['error']
+    assert 'Unknown' in run_job({'kind': 'turing', 'program': INCREMENT, 'word': 'rope'},
+                                {})['error']
+    assert 'Wrong job' in run_job({'kind': 'markov', 'program': DOUBLE, 'inputs': 'x'},
+                                  {})['error']
+
+async def talk(reader, writer, jobs):
+    """Send jobs, return answers by id."""
+    for job in jobs:
+        writer.write(job.encode('utf-8') + b'\n')
+    await writer.drain()
+    answers = {}
+    for _ in jobs:
+        answer = json.loads((await reader.readline()).decode('utf-8'))
+        answers[answer['id']] = answer
+    writer.close()
+    return answers
+
+def test_server(tmpdir):
+    """Jobs are answered through unix socket and tcp."""
+    jobs = [json.dumps({'id': number, 'kind': 'markov', 'program': DOUBLE,
+                        'inputs': ['x' * number]})
+            for number in range(20)]
+    jobs.append(json.dumps({'id': 'loop', 'kind': 'markov', 'program': 'a -> aa',
+                            'inputs': ['a'], 'time_limit': 10}))
+    jobs.append('{"id": ')
+
+    async def scenario():
+        """Start server, talk with it, stop it."""
+        server = JudgeServer(max_tacts=1000)
+        path = str(tmpdir.join('judge.sock'))
+        await server.start(path=path)
+        answers = await talk(*await asyncio.open_unix_connection(path), jobs)
+        await server.close()
+
+        server = JudgeServer()
+        listener = await server.start(port=0)
+        port = listener.sockets[0].getsockname()[1]
+        tcp_answers = await talk(*await asyncio.open_connection('127.0.0.1', port), jobs[:1])
+        await server.close()
+        return answers, tcp_answers
+
+    answers, tcp_answers = asyncio.run(scenario())
+    for number in range(20):
+        assert answers[number]['results'][0]['output'] == 'x' * (2 * number)
+    assert answers['loop']['results'][0]['reason'] == 'tacts'
+    assert answers['loop']['results'][0]['tacts'] == 1000
+    assert 'Wrong job' in answers[None]['error']
+    assert tcp_answers == {0: {'id': 0, 'results': [{'status': 'ok', 'output': '',
+                                                       'tacts': 2}]}}
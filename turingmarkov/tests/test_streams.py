@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for input and output of run commands."""
+
+from turingmarkov.streams import OutputBuffer, read_lines, strip_spaces
+import io
+
+def test_strip_spaces():
+    """Same as split and join."""
+    for line in ['', 'a b\n', ' \t a b　c \r\n', 'abc']:
+        assert strip_spaces(line) == ''.join(line.split())
+
+def test_read_lines(tmpdir):
+    """Memory-mapped file gives the same lines."""
+    path = tmpdir.join('input.txt')
+    path.write_text('ab\n\nпривет\nlast', encoding='utf-8')
+    with open(str(path), encoding='utf-8') as stream:
+        assert list(read_lines(stream, use_mmap=True)) == ['ab\n', '\n', 'привет\n', 'last']
+
+    with open(str(path), encoding='utf-8') as stream:
+        stream.readline() # Partially read file is not mapped
+        assert list(read_lines(stream, use_mmap=True)) == ['\n', 'привет\n', 'last']
+
+    path.write('')
+    with open(str(path)) as stream:
+        assert list(read_lines(stream, use_mmap=True)) == []
+    assert list(read_lines(['a\n', 'b\n'], use_mmap=True)) == ['a\n', 'b\n']
+
+def test_output_buffer():
+    """Lines are written by blocks."""
+    stream = io.StringIO()
+    output = OutputBuffer(stream, size=6)
+    output.write_line('ab')
+    assert stream.getvalue() == ''
+    output.write_line('cd')
+    assert stream.getvalue() == 'ab\ncd\n'
+    output.write_line('e')
+    output.flush()
+    assert stream.getvalue() == 'ab\ncd\ne\n'
+
+    output = OutputBuffer(stream, size=0)
+    output.write_line('f')
+    assert stream.getvalue() == 'ab\ncd\ne\nf\n'
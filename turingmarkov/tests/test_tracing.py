@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for traces."""
+
+from turingmarkov.tracing import MarkovTrace, TuringTrace, TraceReader
+from turingmarkov.markov import Algorithm
+from turingmarkov.turing import build_machine, ENGINES
+from turingmarkov.limits import LimitExceeded
+from turingmarkov.words import WORDS
+from pytest import raises
+import io
+
+def test_markov_trace(tmpdir):
+    """Every word of the run can be restored, for every word kind."""
+    for word in WORDS:
+        algo = Algorithm(['#x -> xx#', '#  => ', '   -> #'], word=word)
+        path = tmpdir.join(word + '.trace')
+        with open(str(path), 'wb') as stream:
+            trace = MarkovTrace(stream, algo, every=3)
+            assert algo.execute('xxx', trace=trace) == 'xxxxxx'
+            with raises(LimitExceeded):
+                algo.execute('xx', max_tacts=2, trace=trace)
+            trace.close()
+
+        with TraceReader(str(path)) as reader:
+            assert [run.tacts for run in reader.runs] == [5, 2]
+            assert list(reader.records(0, 3)) == [('#x -> xx#', 4), ('# => ', 6)]
+            string = 'xxx'
+            for tact in range(6):
+                assert reader.seek(0, tact)['word'] == string
+                string = algo.execute_once(string)
+            assert reader.seek(0, 5) == {'tact': 5, 'word': 'xxxxxx', 'rule': '# => '}
+            assert reader.seek(1, 2)['word'] == 'xx#x'
+            with raises(ValueError):
+                reader.seek(1, 3)
+
+def test_turing_trace():
+    """Every configuration of the run can be restored, for every engine."""
+    lines = ['0 1 _', '0 ,R, ,R, ,L,1', '1 1,N,! 0,L, 1,N,!'] # Increment
+    expected = build_machine(lines)
+    for engine in ENGINES:
+        machine = build_machine(lines, engine=engine)
+        stream = io.BytesIO()
+        trace = TuringTrace(stream, machine, every=2)
+        assert machine.execute('1011', trace=trace) == '1100'
+        assert machine.execute('111', trace=trace) == '1000'
+        trace.close()
+
+        reader = TraceReader(stream.getvalue())
+        assert [run.tacts for run in reader.runs] == [8, 8]
+        assert list(reader.records(0, 4, 6)) == [('1', '_', -1), ('1', '0', -1)]
+        expected.init_tape('111')
+        for tact in range(9):
+            config = reader.seek(1, tact)
+            assert (config['state'], config['head']) == (expected.state, expected.head)
+            assert config['cells'] == expected.tape_cells(config['first'], config['first'] +
+                                                          len(config['cells']))
+            if tact < 8:
+                expected.execute_once()
+
+    with raises(ValueError):
+        TraceReader(b'not a trace')
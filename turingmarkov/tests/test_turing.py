@@ -2,7 +2,10 @@
 
 """Test case for turing machine emulator."""
 
-from turingmarkov.turing import Machine, build_machine, TEMPLATE
+from turingmarkov.turing import (Machine, TableMachine, MacroMachine, BlockMachine,
+                                 TransitionTable, build_machine, TEMPLATE)
+from turingmarkov.limits import LimitExceeded, LoopDetected, cut
+from turingmarkov.backends import available_backends
 from pytest import raises
 
 def test_init():
@@ -12,6 +15,7 @@ def test_init():
     assert machine.head is None
     assert machine.state is None
     assert machine.tape is None
+    assert machine.tacts == 0
 
 class TestMachine:
 
@@ -99,6 +103,47 @@ class TestMachine:
         assert self.machine.state == self.machine.START_STATE
         assert [self.machine.tape[i] for i in range(len(self.machine.tape))] == list('abacab')
 
+    def test_machine_prune(self):
+        """Unreachable states are removed."""
+        self.machine.add_state('0  ,R,  ,R,  ,R,  a,N,2')
+        self.machine.add_state('1  ,L,  ,L,  ,L,  a,R,3')
+        self.machine.add_state('2  ,L,  ,L,  ,L,  a,R,!')
+        self.machine.add_state('3  ,L,  ,L,  ,L,  a,R,1')
+        assert self.machine.prune() == ['State 1 is unreachable from 0',
+                                        'State 3 is unreachable from 0']
+        assert list(self.machine.states) == ['0', '2']
+        assert self.machine.execute('ab') == 'aaba'
+        assert self.machine.prune() == []
+
+        # Left states are checked again: terminate state is unreachable here
+        self.machine = type(self.machine)(['a', 'b', 'c', '_'])
+        self.machine.add_state('0  ,R,  ,R,  ,R,  a,R,')
+        self.machine.add_state('1  ,N,!  ,N,!  ,N,!  ,N,!')
+        self.machine.check()
+        assert self.machine.prune() == ['State 1 is unreachable from 0']
+        with raises(SyntaxError):
+            self.machine.check()
+
+    def test_machine_wide_alphabet(self):
+        """Input is checked and encoded at once, symbols are found by index."""
+        alphabet = [chr(0x400 + i) for i in range(200)] + ['_']
+        self.machine = type(self.machine)(alphabet)
+        self.machine.add_state('0 ' + ' '.join([',R,'] * 200) + ' a,L,1')
+        self.machine.add_state('1 ' + ' '.join([',L,'] * 200) + ' ,N,!')
+        with raises(RuntimeError) as err:
+            self.machine.init_tape('ЖЖ\tЖ' + chr(2000) + 'Ж' + chr(1000))
+        assert str(err.value) == 'Invalid symbol: "' + chr(2000) + '"'
+        string = ''.join(alphabet[i % 200] for i in range(1000))
+        assert self.machine.execute(string) == string + 'a'
+        assert self.machine.execute('\t' + string) == 'a' + string
+
+        self.machine = type(self.machine)(alphabet)
+        self.machine.add_state('0 ' + ' '.join([',R,'] * 200) + ' a,N,1')
+        self.machine.add_state('1 ' + ' '.join([',N,!'] * 201))
+        with raises(RuntimeError) as err:
+            self.machine.execute('ЖЖ') # a is written, but it isn't in alphabet
+        assert str(err.value) == 'Unexpected symbol: a'
+
     def test_machine_get_tape(self):
         """Get value of tape (_ and ' ' is empty symbols)."""
         self.machine.add_state('0  ,R,  ,R,  ,R,  a,N,!')
@@ -160,18 +205,307 @@ class TestMachine:
         self.machine.add_state('4    ,R,    ,R,   ,R,   c,L,1   ,R,')
         assert self.machine.execute('aabaaabacabc', max_tacts=500) == 'bbcbc'
 
+    def test_machine_limits(self):
+        """Report about stopped machine (for every engine)."""
+        self.machine = type(self.machine)(['a', 'b', '_'])
+        self.machine.add_state('0 ,R, ,N,! ,R,')
+        with raises(LimitExceeded) as info:
+            self.machine.execute('aaa', max_tacts=500)
+        assert info.value.tacts == self.machine.tacts == 500
+        assert info.value.state == '0'
+        assert info.value.snapshot == 'aaa'
+
+        assert self.machine.execute('aba') == 'aba'
+        assert self.machine.tacts == 2
+
+        # Only beginning of long tape is rendered for the report
+        self.machine = type(self.machine)(['a', 'b', '_'])
+        self.machine.add_state('0 b,R, ,N,! a,L,')
+        for string, tacts in [(' ' * 50 + 'ba', 3000), ('a' * 1500, 800), ('', 1001)]:
+            with raises(LimitExceeded) as info:
+                self.machine.execute(string, max_tacts=tacts)
+            assert info.value.snapshot == self.machine.snapshot() == cut(self.machine.get_tape())
+
+    def test_machine_tape_window(self):
+        """Window around the head during the run (for every engine)."""
+        self.machine = type(self.machine)(['a', 'b', '_'])
+        self.machine.add_state('0 b,R, ,R, a,L,1')
+        self.machine.add_state('1 ,L, ,L, ,N,!')
+        self.machine.init_tape('aab')
+        assert self.machine.tape_window(radius=2) == '__aab'
+        for _ in range(3):
+            self.machine.execute_once()
+        assert self.machine.tape_window() == '_' * 5 + 'bbb' + '_' * 9
+        assert self.machine.tape_window(4, 1) == '___'
+        assert self.machine.tape_window(-1, 1) == '__b'
+        assert self.machine.tape_window(3, 3) == 'bbb____'
+        self.machine.execute_once()
+        assert self.machine.tape_window(0, 3) == '___bbba'
+        assert self.machine.tape_window(-10, 3) == '_' * 7
+
+        assert self.machine.execute('aa') == 'bba'
+        assert self.machine.tape_window(1, 1) == 'bba'
+        assert self.machine.execute(' ') == 'a'
+        assert self.machine.get_tape() == 'a'
+
+    def test_machine_loops(self):
+        """Repeated configuration is found (for every engine)."""
+        self.machine = type(self.machine)(['a', 'b', '_'])
+        self.machine.add_state('0 ,R,1 ,N,! ,N,!')
+        self.machine.add_state('1 ,L,0 ,L,0 ,L,0')
+        with raises(LoopDetected) as info:
+            self.machine.execute('aa', max_tacts=10 ** 9, detect_loops=True)
+        assert info.value.period == 2
+        assert info.value.state in ['0', '1']
+        assert info.value.snapshot == 'aa'
+        assert self.machine.execute('ba', detect_loops=True) == 'ba'
+
+        # Empty tape looks the same from every cell
+        self.machine = type(self.machine)(['a', '_'])
+        self.machine.add_state('0 ,N,! ,R,')
+        with raises(LoopDetected) as info:
+            self.machine.execute('', max_tacts=10 ** 9, detect_loops=True)
+        assert info.value.period == 1
+
+        # Walk away from the word is not a cycle
+        self.machine = type(self.machine)(['a', 'b', '_'])
+        self.machine.add_state('0 ,L, ,N,! ,L,')
+        with raises(LimitExceeded) as info:
+            self.machine.execute('aaa', max_tacts=1000, detect_loops=True)
+        assert info.value.reason == 'tacts'
+
+        self.machine = type(self.machine)(['0', '1', '_'])
+        self.machine.add_state('0 ,R, ,R, ,L,1')
+        self.machine.add_state('1 1,N,! 0,L, 1,N,!')
+        assert self.machine.execute('1011', detect_loops=True) == '1100'
+
+        # Sweeps over uniform cells don't build full configuration on every tact
+        self.machine = type(self.machine)(['a', 'b', '_'])
+        self.machine.add_state('0 ,R, ,R, b,L,1')
+        self.machine.add_state('1 ,L, ,L, ,R,!')
+        calls = []
+        configuration = self.machine._configuration
+        self.machine._configuration = lambda: calls.append(1) or configuration()
+        for string in ['a' * 2000, 'ab' * 1000]:
+            del calls[:]
+            assert self.machine.execute(string, detect_loops=True) == string + 'b'
+            assert len(calls) < 30
+
     def test_machine_compile(self):
-        """White box testing."""
+        """Compiled code works without turingmarkov."""
         self.machine.add_state('0 ,R,   ,R,  ,L,1 -')
         self.machine.add_state('1 1,N,!  -  1,N,! -')
 
         code = self.machine.compile()
         assert isinstance(code, str)
         assert code.startswith(TEMPLATE)
+        assert "turingmarkov" not in code
+        assert "VALID = {'_', 'a', 'b', 'c'}\n" in code
 
-        assert "machine = Machine(['a', 'b', 'c', '_'])\n" in code
-        assert "machine.add_state('0 a,R,0 b,R,0 c,L,1 -')\n" in code
-        assert "machine.add_state('1 1,N,! - 1,N,! -')\n" in code
+        compiled = {'__name__': 'compiled'}
+        exec(code, compiled)
+        assert compiled['execute']('aac\n') == 'a1c'
+        assert compiled['execute']('ac') == '1c'
+        with raises(RuntimeError):
+            compiled['execute']('ad') # Invalid symbol
+        with raises(RuntimeError):
+            compiled['execute']('aab') # Unexpected symbol
+
+        self.machine = Machine(['a', 'b', 'c', '_', '#'])
+        self.machine.add_state('0    ,R,    ,R,   ,R,   #,L,1    -')
+        self.machine.add_state('1    ,L,    ,L,   ,L,    ,R,2   ,L,')
+        self.machine.add_state('2   _,R,   _,R,3 _,R,4   ,R,!  _,R,!')
+        self.machine.add_state('3    ,R,    ,R,   ,R,   b,L,1   ,R,')
+        self.machine.add_state('4    ,R,    ,R,   ,R,   c,L,1   ,R,')
+        exec(self.machine.compile(), compiled)
+        for word in ['aabaaabacabc', 'a', ' ', 'cbcb']:
+            assert compiled['execute'](word) == self.machine.execute(word)
+
+        self.machine = Machine(['a', '_'])
+        self.machine.add_state('0 ,L, ,N,1')
+        with raises(SyntaxError):
+            self.machine.compile()
+
+class TestTableMachine(TestMachine):
+
+    """Same tests for machine with transition table."""
+
+    def setup(self):
+        """Setup machine (can be overloaded in tests."""
+        self.machine = TableMachine(['a', 'b', 'c', '_'])
+
+    def test_machine_init_tape(self):
+        """Tape is bytearray of symbol codes."""
+        with raises(RuntimeError):
+            self.machine.init_tape('addd') # Invalid symbol
+        with raises(SyntaxError):
+            self.machine.init_tape('abacab')
+        assert self.machine.tape is None
+
+        self.machine.add_state('0  ,R,  ,R,  ,R,  a,N,!')
+        self.machine.init_tape('ab\tc_ ')
+        assert self.machine.head == 0
+        assert self.machine.state == self.machine.START_STATE
+        assert self.machine.tape == bytearray([0, 1, 3, 2, 3, 3])
+
+    def test_machine_execute_once(self):
+        """Test step-by-step execution."""
+        self.machine.add_state('0  ,R,  ,R,  -  c,L,!')
+        self.machine.init_tape('ab')
+        self.machine.execute_once()
+        assert self.machine.head == 1
+        assert self.machine.state == '0'
+        self.machine.execute_once()
+        self.machine.execute_once()
+        assert self.machine.head == 1
+        assert self.machine.state == self.machine.TERM_STATE
+        assert self.machine.get_tape() == 'abc'
+
+        self.machine.init_tape('c')
+        with raises(RuntimeError):
+            self.machine.execute_once()
+
+    def test_machine_grow(self):
+        """Tape grows in both directions."""
+        self.machine.add_state('0  ,L,  ,L,  ,L,  b,R,1')
+        self.machine.add_state('1  ,R,  ,R,  ,R,  c,N,!')
+        assert self.machine.execute('a' * 100) == 'b' + 'a' * 100 + 'c'
+        assert self.machine.head == 100
+        assert self.machine.state == '!'
+
+        self.machine = TableMachine(['a', '_'])
+        self.machine.add_state('0 b,R, ,L,1')
+        self.machine.add_state('1 ,N,! ,N,!')
+        with raises(RuntimeError):
+            self.machine.execute('aaa') # b is not in alphabet
+        assert self.machine.state == '1'
+        assert self.machine.head == 2
+
+class TestMacroMachine(TestTableMachine):
+
+    """Same tests for machine with run-length encoded tape."""
+
+    def setup(self):
+        """Setup machine (can be overloaded in tests."""
+        self.machine = MacroMachine(['a', 'b', 'c', '_'])
+
+    def test_machine_init_tape(self):
+        """Tape is list of runs."""
+        with raises(RuntimeError):
+            self.machine.init_tape('addd') # Invalid symbol
+        self.machine.add_state('0  ,R,  ,R,  ,R,  a,N,!')
+        self.machine.init_tape('aab\tc_ ')
+        assert self.machine.head == 0
+        assert self.machine.state == self.machine.START_STATE
+        assert self.machine.tape == [[0, 2], [1, 1], [3, 1], [2, 1], [3, 2]]
+        self.machine.init_tape('')
+        assert self.machine.tape == [[3, 1]]
+
+    def test_machine_macro(self):
+        """Copy of unary number needs 2 * n ** 2 tacts."""
+        self.machine = build_machine(['1 x # _',
+                                      '0  ,R,   -    -    #,L,1',
+                                      '1  ,L,   -   ,L,   ,R,2',
+                                      '2  x,R,3  -  ,L,5  -',
+                                      '3  ,R,   -   ,R,4  -',
+                                      '4  ,R,   -    -    1,L,6',
+                                      '6  ,L,   -   ,L,7  -',
+                                      '7  ,L,  ,R,2  -    -',
+                                      '5  -    1,L,  -    ,N,!'], engine='macro')
+        assert self.machine.execute('1' * 3000) == '1' * 3000 + '#' + '1' * 3000
+        assert self.machine.head == -1
+
+        dict_machine = build_machine(['a _', '0 ,R, ,L,1', '1 _,L, ,N,!'], engine='dict')
+        macro_machine = build_machine(['a _', '0 ,R, ,L,1', '1 _,L, ,N,!'], engine='macro')
+        assert macro_machine.execute('a' * 100, max_tacts=202) == ''
+        for tacts in [100, 101, 200, 201]:
+            with raises(TimeoutError):
+                dict_machine.execute('a' * 100, max_tacts=tacts)
+            with raises(TimeoutError):
+                macro_machine.execute('a' * 100, max_tacts=tacts)
+
+        # Infinite sweep to the right
+        self.machine = build_machine(['a b _', '0 ,R, ,N,! b,R,'], engine='macro')
+        with raises(TimeoutError):
+            self.machine.execute('aaa', max_tacts=10 ** 12)
+
+        # Sweeps are cut to the rest of max_tacts
+        for lines, string, snapshot, head in [
+                (['a b _', '0 b,R, ,R, ,N,!'], 'a' * 30, 'b' * 10 + 'a' * 20, 10),
+                (['a x _', '0 ,R, ,N,! x,R,'], 'a', 'axxxxxxxxx', 10),
+                (['a x _', '0 ,L, ,N,! x,L,'], 'a', 'xxxxxxxxxa', -10),
+                (['a x _', '0 x,L, ,N,! ,L,'], 'aaa', 'xaa', -10)]:
+            windows = []
+            for engine in ['dict', 'macro']:
+                self.machine = build_machine(lines, engine=engine)
+                with raises(LimitExceeded) as info:
+                    self.machine.execute(string, max_tacts=10)
+                assert info.value.snapshot == self.machine.get_tape() == snapshot
+                assert self.machine.head == head
+                assert self.machine.tacts == info.value.tacts == 10
+                windows.append(self.machine.tape_window(0, 12))
+            assert windows[0] == windows[1]
+
+class TestBlockMachine(TestTableMachine):
+
+    """Same tests for machine with memoized traversals of blocks."""
+
+    def setup(self):
+        """Setup machine (can be overloaded in tests."""
+        self.machine = BlockMachine(['a', 'b', 'c', '_'])
+
+    def test_machine_init_tape(self):
+        """Tape is bytearray of whole blocks."""
+        with raises(RuntimeError):
+            self.machine.init_tape('addd') # Invalid symbol
+        self.machine.add_state('0  ,R,  ,R,  ,R,  a,N,!')
+        self.machine.init_tape('ab\tc_ ')
+        assert self.machine.head == 0
+        assert len(self.machine.tape) % (self.machine.BLOCK << (self.machine.LEVELS - 1)) == 0
+        assert self.machine.tape[:8] == bytearray([0, 1, 3, 2, 3, 3, 3, 3])
+
+    def test_machine_blocks(self):
+        """Long runs are exact and fast."""
+        lines = ['a b _', '0 ,R, b,R,! ,L,1', '1 ,L, ,L, ,R,0'] # Forever bounce
+        table_machine = build_machine(lines, engine='table')
+        self.machine = build_machine(lines, engine='block')
+        for tacts in [1, 7, 8, 9, 100, 1000, 12345]:
+            with raises(LimitExceeded) as expected:
+                table_machine.execute('a' * 100, max_tacts=tacts)
+            with raises(LimitExceeded) as result:
+                self.machine.execute('a' * 100, max_tacts=tacts)
+            assert result.value.as_dict()['state'] == expected.value.as_dict()['state']
+            assert self.machine.tacts == tacts
+            assert self.machine.tape_window() == table_machine.tape_window()
+
+        with raises(LimitExceeded):
+            self.machine.execute('a' * 1000, max_tacts=10 ** 8)
+        assert self.machine.tacts == 10 ** 8
+        assert self.machine.get_tape() == 'a' * 1000
+        assert 0 <= self.machine.head <= 1000
+
+def test_transition_table():
+    """Symbols and states are coded by numbers."""
+    machine = build_machine(['a b _', '0 ,R, c,L,1 -', '1 ,N,! - -'])
+    table = TransitionTable(machine)
+    assert table.symbols == ['a', 'b', '_', 'c']
+    assert table.blank == 2
+    assert table.rows == {'0': 0, '1': 4, '!': table.HALT}
+    assert list(table.write[:4]) == [0, 3, 0, 0]
+    assert table.move[:4] == [1, -1, 0, 0]
+    assert table.target[:4] == [0, 4, table.ERROR, table.ERROR]
+    assert table.decode(bytearray([2, 0, 3, 2])) == 'ac'
+
+    machine = Machine([chr(i) for i in range(256)] + ['_'])
+    with raises(SyntaxError):
+        TransitionTable(machine)
+
+    # Repeated symbol is coded by its first place, as in alphabet.index
+    machine = build_machine(['a a _', '0 b,R, ,R, ,N,!'], engine='table')
+    assert machine.get_table().codes['a'] == 0
+    for engine in ['dict', 'table', 'macro', 'block']:
+        assert build_machine(['a a _', '0 b,R, ,R, ,N,!'], engine=engine).execute('aa') == 'bb'
+    assert build_machine(['a a _', '0 b,R, ,R, ,N,!'], engine='dict').index['a'] == 0
 
 def test_build_machine():
     """Input is array of strings."""
@@ -184,3 +518,23 @@ def test_build_machine():
 
     with raises(SyntaxError):
         build_machine([])
+
+    machine = build_machine(['a b c _', '0 ,R, ,R, ,R, a,N,!'], engine='table')
+    assert isinstance(machine, TableMachine)
+    assert machine.execute('abc') == 'abca'
+    with raises(ValueError):
+        build_machine(['a b c _', '0 ,R, ,R, ,R, a,N,!'], engine='unknown')
+
+    # Default engine has native loop, if it's built
+    machine = build_machine(['a b c _', '0 ,R, ,R, ,R, a,N,!'], backend='python')
+    assert type(machine) is Machine
+    if 'native' in available_backends():
+        machine = build_machine(['a b c _', '0 ,R, ,R, ,R, a,N,!'], backend='native')
+        assert isinstance(machine, TableMachine)
+        alphabet = ' '.join(chr(0x400 + i) for i in range(300)) + ' _'
+        machine = build_machine([alphabet, '0 ' + ' '.join([',R,'] * 300) + ' a,N,!'],
+                                backend='native')
+        assert type(machine) is Machine
+        assert machine.execute(chr(0x400)) == chr(0x400) + 'a'
+        with raises(SyntaxError):
+            build_machine(['a _', '0 ,R, ,R,'], backend='native')
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for numpy engine of turing machine."""
+
+from turingmarkov.turing import TableMachine, build_machine
+from turingmarkov.limits import LimitExceeded
+from pytest import importorskip, raises
+import random, time
+
+importorskip('numpy')
+from turingmarkov.vectorized import NumpyMachine
+from turingmarkov import vectorized
+
+def random_machine(rnd, machine_class):
+    """Return random machine over a, b."""
+    alphabet = ['a', 'b', '_']
+    states = [str(number) for number in range(rnd.randint(1, 4))]
+    machine = machine_class(alphabet)
+    for state in states:
+        rules = []
+        for _ in alphabet:
+            if rnd.random() < 0.1:
+                rules.append('-')
+            else:
+                rules.append(','.join([rnd.choice(alphabet + ['', '']), rnd.choice('LNRRL'),
+                                       rnd.choice(states + ['!', '', ''])]))
+        machine.add_state(state + ' ' + ' '.join(rules))
+    return machine
+
+def outcome(result):
+    """Return everything, what is known about result of one line."""
+    if isinstance(result, LimitExceeded):
+        return type(result).__name__, str(result), result.tacts, result.state, result.snapshot
+    if isinstance(result, Exception):
+        return type(result).__name__, str(result)
+    return result
+
+def test_build_machine():
+    """Engine is chosen by name."""
+    machine = build_machine(['a b c _', '0 ,R, ,R, ,R, a,N,!'], engine='numpy')
+    assert isinstance(machine, NumpyMachine)
+    assert machine.execute('abc') == 'abca'
+    assert list(machine.execute_many(['ab', 'c'] * 10)) == ['aba', 'ca'] * 10
+
+def test_execute_many():
+    """Results, errors and limits are the same as in table machine."""
+    rnd = random.Random(3)
+    for _ in range(100):
+        seed = rnd.random()
+        expected = random_machine(random.Random(seed), TableMachine)
+        machine = random_machine(random.Random(seed), NumpyMachine)
+        try:
+            expected.check()
+        except SyntaxError:
+            continue
+        strings = [''.join(rnd.choice('ab _c') for _ in range(rnd.randint(0, 12)))
+                   for _ in range(rnd.randint(1, 40))]
+        max_tacts = rnd.randint(1, 80)
+        assert ([outcome(result) for result in machine.execute_many(
+            strings, catch=Exception, max_tacts=max_tacts)] ==
+                [outcome(result) for result in expected.execute_many(
+                    strings, catch=Exception, max_tacts=max_tacts)])
+
+def test_long_lines():
+    """Tapes grow, few long lines are continued by table loop."""
+    machine = NumpyMachine(['a', 'b', '_'])
+    machine.add_state('0 ,R, ,R, ,L,1')
+    machine.add_state('1 b,L, a,L, ,R,!')
+    strings = ['a' * size for size in range(50)] + ['ab' * 100]
+    assert list(machine.execute_many(strings)) == (['b' * size for size in range(50)] +
+                                                   ['ba' * 100])
+
+    machine = NumpyMachine(['a', 'b', '_'])
+    machine.add_state('0 ,L, ,N,! a,L,')
+    with raises(LimitExceeded):
+        list(machine.execute_many(['a'] * 20, max_tacts=100))
+    results = list(machine.execute_many(['a'] * 20, max_tacts=100, catch=LimitExceeded))
+    assert all(result.tacts == 100 for result in results)
+
+def test_continue_lines(monkeypatch):
+    """Last lines are continued from their state with the rest of tacts and time."""
+    machine = NumpyMachine(['a', 'b', '_'])
+    machine.add_state('0 ,R, ,N,! a,R,')
+    inits = []
+    init_tape = NumpyMachine.init_tape
+    monkeypatch.setattr(NumpyMachine, 'init_tape',
+                        lambda self, string: inits.append(string) or init_tape(self, string))
+    strings = ['b' * size for size in range(1, 20)] + ['a' * size for size in range(1, 4)]
+    results = list(machine.execute_many(strings, max_tacts=100, catch=LimitExceeded))
+    assert len(inits) == len(strings)
+    assert results[:19] == ['b' * size for size in range(1, 20)]
+    for result in results[19:]:
+        assert result.tacts == 100
+        assert result.snapshot == 'a' * 100
+        assert result.state == '0'
+
+    start = time.monotonic()
+    results = list(machine.execute_many(strings, max_time=0.2, catch=LimitExceeded))
+    assert time.monotonic() - start < 0.5
+    assert all(result.elapsed < 0.5 for result in results[19:])
+
+def test_zero_tacts():
+    """Lines, which halt or break on the first tact, aren't reported as limit."""
+    machine = NumpyMachine(['a', 'b', '_'])
+    machine.add_state('0 ,N,! - a,R,')
+    expected = TableMachine(['a', 'b', '_'])
+    expected.add_state('0 ,N,! - a,R,')
+    for strings in (['a', 'b', ''], ['a', 'b', ''] * 10):
+        assert ([outcome(result) for result in machine.execute_many(
+            strings, catch=Exception, max_tacts=0)] ==
+                [outcome(result) for result in expected.execute_many(
+                    strings, catch=Exception, max_tacts=0)])
+
+def test_bounded_width(monkeypatch):
+    """Lines, which go far from the input, leave the batch, tapes don't grow."""
+    monkeypatch.setattr(NumpyMachine, 'WIDTH', 0)
+    machine = NumpyMachine(['a', 'b', '_'])
+    machine.add_state('0 ,R, ,N,! a,R,')
+    pads = []
+    pad = vectorized.np.pad
+    monkeypatch.setattr(vectorized.np, 'pad', lambda *args, **kwargs:
+                        pads.append(args) or pad(*args, **kwargs))
+    strings = ['b' * size for size in range(1, 21)] + ['a'] * 20
+    results = list(machine.execute_many(strings, max_tacts=1000, catch=LimitExceeded))
+    assert results[:20] == ['b' * size for size in range(1, 21)]
+    assert all(result.tacts == 1000 and result.snapshot == 'a' * 1000
+               for result in results[20:])
+    assert len(pads) <= 2
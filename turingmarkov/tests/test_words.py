@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+"""Test case for word representations of markov algorithm."""
+
+from turingmarkov.words import StrWord, Rope, RopeWord, BytesWord, get_word_kind
+from pytest import raises
+import random
+
+def test_str_word():
+    """Substitution makes new string."""
+    word = StrWord.make('abacaba')
+    assert StrWord.substitute(word, 3, 1, 'xyz') == 'abaxyzaba'
+    assert StrWord.render(word) == 'abacaba'
+
+def test_rope():
+    """Rope behaves like python string."""
+    rope = Rope('abacaba')
+    assert len(rope) == 7
+    assert rope.find('ca') == 3
+    assert rope.find('ab', 1) == 4
+    assert rope.find('ab', 1, 5) == -1
+    assert rope.find('') == 0
+    rope.substitute(3, 1, 'xyz')
+    assert str(rope) == 'abaxyzaba'
+    assert ''.join(rope) == 'abaxyzaba'
+    rope.substitute(0, 9, '')
+    assert str(rope) == '' and len(rope) == 0
+    assert rope.find('a') == -1
+    assert rope.find('') == 0
+
+    word = RopeWord.make('aa')
+    assert RopeWord.render(RopeWord.substitute(word, 1, 0, 'b')) == 'aba'
+
+def test_bytes_word():
+    """Only ASCII is accepted, substitution is in place."""
+    assert BytesWord.accepts('abc') and not BytesWord.accepts('абв')
+    assert BytesWord.encode('ab') == b'ab'
+    word = BytesWord.make('abacaba')
+    assert BytesWord.substitute(word, 3, 1, b'xyz') is word
+    assert BytesWord.render(word) == 'abaxyzaba'
+    assert word.find(b'ab', 1) == 6
+
+def test_rope_random(monkeypatch):
+    """Compare with python string on random edits (with tiny chunks)."""
+    rnd = random.Random(42)
+    for chunk in (1, 3, 8):
+        monkeypatch.setattr(Rope, 'CHUNK', chunk)
+        for _ in range(200):
+            string = ''.join(rnd.choice('ab') for _ in range(rnd.randint(0, 30)))
+            rope = Rope(string)
+            for _ in range(20):
+                if rnd.random() < 0.5:
+                    pos = rnd.randint(0, len(string))
+                    length = rnd.randint(0, min(5, len(string) - pos))
+                    text = ''.join(rnd.choice('ab') for _ in range(rnd.randint(0, 10)))
+                    string = string[:pos] + text + string[pos+length:]
+                    rope.substitute(pos, length, text)
+                else:
+                    sub = ''.join(rnd.choice('ab') for _ in range(rnd.randint(0, 5)))
+                    start = rnd.randint(0, len(string) + 1)
+                    end = rnd.randint(0, len(string) + 1)
+                    assert rope.find(sub, start) == string.find(sub, start)
+                    assert rope.find(sub, start, end) == string.find(sub, start, end)
+                assert str(rope) == string
+                assert len(rope) == len(string)
+
+def test_get_word_kind():
+    """Word kind is chosen by name."""
+    assert get_word_kind('str') is StrWord
+    assert get_word_kind('rope') is RopeWord
+    assert get_word_kind('bytes') is BytesWord
+    with raises(ValueError):
+        get_word_kind('unknown')
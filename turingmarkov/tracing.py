@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+
+"""Recording of runs to compact binary traces and their replay.
+
+Trace is an observer, like profile: engine wraps its matcher (or its step
+function) by trace.wrap only if trace is given. Every tact is written as
+a small record: index of the rule and position of substitution for markov
+algorithm, id of the next state, written symbol and move of the head for
+turing machine. From time to time full word (or tape) is written as a
+checkpoint, so TraceReader can restore configuration after any tact by
+replay of a few records from the nearest checkpoint. Reader maps file to
+memory, so traces of many gigabytes are cheap to open.
+
+File is MAGIC, json header (kind of program, its rules or states and
+symbols, format of records) and blocks: tag, size of payload and payload.
+RUN block starts next run (one run per input line), CHECKPOINT is
+tact and configuration, STEPS is tact of the first record and records.
+"""
+
+from array import array
+from bisect import bisect_right
+import json, mmap, struct, sys
+from .markov import format_rule
+
+MAGIC = b'TMTRACE\x01'
+CHECKPOINT_EVERY = 65536 # Tacts between checkpoints (or more, if they are big)
+BUFFER_SIZE = 64 * 1024
+
+RUN, CHECKPOINT, STEPS = b'R', b'C', b'S'
+BLOCK = struct.Struct('<cQ') # Tag and size of payload
+TACT = struct.Struct('<Q')
+HEADER_SIZE = struct.Struct('<I')
+MARKOV_RECORD = '<HI' # Rule, position
+TURING_RECORD = '<HHb' # Next state, written symbol, move
+TURING_CHECKPOINT = struct.Struct('<Hqq') # State, head, first cell
+MOVES = {'L': -1, 'N': 0, 'R': 1}
+INFINITY = float('inf')
+
+class Trace:
+
+    """Writer of trace file, one run after another (see MarkovTrace and TuringTrace).
+
+    Words longer than 4 GiB and programs with more than 65535 rules,
+    states or symbols can't be traced.
+    """
+
+    def __init__(self, stream, header, every=CHECKPOINT_EVERY):
+        """Write header to binary stream."""
+        self.stream = stream
+        self.record = struct.Struct(header['record'])
+        self.every = every
+        self.runs = 0
+        self.steps = bytearray()
+        self.first = 0 # Tact of the first record in steps
+        self.tacts = 0
+        self.next_checkpoint = 0
+        data = json.dumps(header, sort_keys=True).encode('utf-8')
+        stream.write(MAGIC + HEADER_SIZE.pack(len(data)) + data)
+
+    def _block(self, tag, payload):
+        """Write block to the stream."""
+        self.stream.write(BLOCK.pack(tag, len(payload)))
+        self.stream.write(payload)
+
+    def _flush_steps(self):
+        """Write collected records."""
+        if self.steps:
+            self._block(STEPS, TACT.pack(self.first) + self.steps)
+            self.steps = bytearray()
+        self.first = self.tacts
+
+    def start_run(self):
+        """Finish previous run and start the next one."""
+        self._flush_steps()
+        self._block(RUN, b'')
+        self.runs += 1
+        self.tacts = self.first = self.next_checkpoint = 0
+
+    def checkpoint(self, payload):
+        """Write configuration after self.tacts tacts."""
+        self._flush_steps()
+        self._block(CHECKPOINT, TACT.pack(self.tacts) + payload)
+        # Checkpoints shouldn't take more place than records
+        self.next_checkpoint = self.tacts + max(self.every, len(payload) // self.record.size)
+
+    def step(self, *fields):
+        """Write record of one tact."""
+        self.steps += self.record.pack(*fields)
+        self.tacts += 1
+        if len(self.steps) >= BUFFER_SIZE:
+            self._flush_steps()
+
+    def close(self):
+        """Write the rest of records and flush the stream."""
+        self._flush_steps()
+        self.stream.flush()
+
+
+class MarkovTrace(Trace):
+
+    """Trace of markov algorithm runs.
+
+    >>> import io
+    >>> from turingmarkov.markov import Algorithm
+    >>> algo, stream = Algorithm(['ab -> ba']), io.BytesIO()
+    >>> trace = MarkovTrace(stream, algo)
+    >>> algo.execute('aab', trace=trace)
+    'baa'
+    >>> trace.close()
+    >>> TraceReader(stream.getvalue()).seek(0, 1)['word']
+    'aba'
+    """
+
+    def __init__(self, stream, algorithm, every=CHECKPOINT_EVERY):
+        """See help(type(x))."""
+        if len(algorithm.rules) > 0xFFFF:
+            raise ValueError('Too many rules for trace')
+        super().__init__(stream, {'kind': 'markov', 'record': MARKOV_RECORD,
+                                  'rules': [list(rule) for rule in algorithm.rules]}, every)
+
+    def wrap(self, matcher, kind):
+        """Start new run, return matcher which writes to the trace."""
+        self.start_run()
+        return TracingMatcher(self, matcher, kind)
+
+
+class TracingMatcher:
+
+    """Matcher, which writes found rules to the trace (see MarkovTrace)."""
+
+    def __init__(self, trace, matcher, kind):
+        """See help(type(x))."""
+        self.trace = trace
+        self.matcher = matcher
+        self.kind = kind
+
+    def reset(self, word):
+        """Same as matcher.reset."""
+        self.matcher.reset(word)
+
+    def update(self, word, pos, removed, inserted):
+        """Same as matcher.update."""
+        self.matcher.update(word, pos, removed, inserted)
+
+    def find(self, word):
+        """Same as matcher.find, write checkpoint (if it's time) and found rule."""
+        trace = self.trace
+        if trace.tacts >= trace.next_checkpoint:
+            trace.checkpoint(self.kind.render(word).encode('utf-8'))
+        found = self.matcher.find(word)
+        if found is not None:
+            trace.step(*found)
+        return found
+
+
+class TuringTrace(Trace):
+
+    """Trace of turing machine runs.
+
+    >>> import io
+    >>> from turingmarkov.turing import Machine
+    >>> machine, stream = Machine(['a', '_']), io.BytesIO()
+    >>> machine.add_state('0 ,R, a,N,!')
+    >>> trace = TuringTrace(stream, machine)
+    >>> machine.execute('aa', trace=trace)
+    'aaa'
+    >>> trace.close()
+    >>> TraceReader(stream.getvalue()).seek(0, 2)['head']
+    2
+    """
+
+    def __init__(self, stream, machine, every=CHECKPOINT_EVERY):
+        """See help(type(x))."""
+        machine.check()
+        symbols = list(machine.alphabet)
+        for rules in machine.states.values():
+            for rule in rules:
+                if rule is not None and rule[0] not in symbols:
+                    symbols.append(rule[0])
+        states = list(machine.states) + [machine.TERM_STATE]
+        if max(len(symbols), len(states)) > 0xFFFF:
+            raise ValueError('Too many states or symbols for trace')
+        super().__init__(stream, {'kind': 'turing', 'record': TURING_RECORD,
+                                  'states': states, 'symbols': symbols,
+                                  'empty': machine.EMPTY_SYMBOL}, every)
+        self.codes = {symbol: code for code, symbol in enumerate(symbols)}
+        self.ids = {state: number for number, state in enumerate(states)}
+
+    def _checkpoint(self, machine, low, high):
+        """Write state, head and cells [low, high] of the tape."""
+        cells = array('H', map(self.codes.__getitem__, machine.tape_cells(low, high + 1)))
+        if sys.byteorder != 'little':
+            cells.byteswap()
+        self.checkpoint(TURING_CHECKPOINT.pack(self.ids[machine.state], machine.head, low) +
+                        cells.tobytes())
+
+    def wrap(self, machine, step, length):
+        """Start new run on word of given length, return step function, which writes to trace."""
+        self.start_run()
+        states, codes, ids, index = machine.states, self.codes, self.ids, machine.index
+        bounds = [min(machine.head, 0), max(machine.head, length - 1)] # Written part of tape
+
+        def traced_step():
+            """Execute step and write record of it."""
+            if self.tacts >= self.next_checkpoint:
+                self._checkpoint(machine, *bounds)
+            head = machine.head
+            symbol = machine._read()
+            rule = states[machine.state][index[symbol]] if symbol in index else None
+            step() # Raises error, if there is no rule
+            self.step(ids[rule[2]], codes[rule[0]], MOVES[rule[1]])
+            if head < bounds[0]:
+                bounds[0] = head
+            elif head > bounds[1]:
+                bounds[1] = head
+
+        return traced_step
+
+
+class TraceReader:
+
+    """Memory-mapped trace: runs, records and configurations after any tact.
+
+    Source is file name or bytes. Runs are numbered from 0 in the order of
+    input lines, run.tacts is count of recorded tacts.
+    """
+
+    def __init__(self, source):
+        """See help(type(x))."""
+        self.file = self.map = None
+        if isinstance(source, (bytes, bytearray)):
+            self.data = memoryview(source)
+        else:
+            self.file = open(source, 'rb')
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.data = memoryview(self.map)
+        if bytes(self.data[:len(MAGIC)]) != MAGIC:
+            raise ValueError('Not a trace file')
+        size, = HEADER_SIZE.unpack_from(self.data, len(MAGIC))
+        offset = len(MAGIC) + HEADER_SIZE.size
+        self.header = json.loads(bytes(self.data[offset:offset + size]).decode('utf-8'))
+        self.record = struct.Struct(self.header['record'])
+        self.runs = self._scan(offset + size)
+
+    def _scan(self, offset):
+        """Return runs: for every run (tact, begin, end) of checkpoints and steps."""
+        runs = []
+        data = self.data
+        while offset < len(data):
+            tag, size = BLOCK.unpack_from(data, offset)
+            offset += BLOCK.size
+            if tag == RUN:
+                runs.append(TraceRun())
+            elif tag in (CHECKPOINT, STEPS):
+                tact, = TACT.unpack_from(data, offset)
+                run = runs[-1]
+                if tag == CHECKPOINT:
+                    run.checkpoints.append((tact, offset + TACT.size, offset + size))
+                else:
+                    run.steps.append((tact, offset + TACT.size, offset + size))
+                    run.tacts = tact + (size - TACT.size) // self.record.size
+            offset += size
+        return runs
+
+    def close(self):
+        """Release the file."""
+        self.data.release()
+        if self.file is not None:
+            self.map.close()
+            self.file.close()
+
+    def __enter__(self):
+        """Use reader in with statement."""
+        return self
+
+    def __exit__(self, *args):
+        """Close reader at the end of with statement."""
+        self.close()
+
+    def _raw_records(self, run, start, stop):
+        """Yield records of tacts [start, stop) of the run as they are stored."""
+        run = self.runs[run]
+        stop = run.tacts if stop is None else min(stop, run.tacts)
+        size = self.record.size
+        first = max(bisect_right(run.steps, (start, INFINITY)) - 1, 0)
+        for tact, begin, end in run.steps[first:]:
+            if tact >= stop:
+                break
+            begin += max(start - tact, 0) * size
+            end = min(end, begin + (stop - max(start, tact)) * size)
+            yield from self.record.iter_unpack(self.data[begin:end])
+
+    def records(self, run, start=0, stop=None):
+        """Yield records of tacts [start, stop) of the run.
+
+        Record is (rule, position) for markov algorithm and (state, symbol,
+        move) for turing machine: next state, written symbol and move of the head.
+        """
+        if self.header['kind'] == 'markov':
+            rules = [format_rule(rule) for rule in self.header['rules']]
+            for index, pos in self._raw_records(run, start, stop):
+                yield rules[index], pos
+        else:
+            states, symbols = self.header['states'], self.header['symbols']
+            for state, symbol, move in self._raw_records(run, start, stop):
+                yield states[state], symbols[symbol], move
+
+    def seek(self, run, tact):
+        """Return configuration of the run after given count of tacts as dict.
+
+        It's {'tact', 'word', 'rule'} for markov algorithm (rule is the last
+        applied one) and {'tact', 'state', 'head', 'first', 'cells'} for
+        turing machine, where cells is list of symbols from position first.
+        """
+        trace = self.runs[run]
+        if not 0 <= tact <= trace.tacts:
+            raise ValueError('Run {run} has {tacts} tacts'.format(run=run, tacts=trace.tacts))
+        checkpoint, begin, end = trace.checkpoints[
+            bisect_right(trace.checkpoints, (tact, INFINITY)) - 1]
+        records = self._raw_records(run, checkpoint, tact)
+        if self.header['kind'] == 'markov':
+            return self._replay_markov(bytes(self.data[begin:end]).decode('utf-8'), records, tact)
+        return self._replay_turing(self.data[begin:end], records, tact)
+
+    def _replay_markov(self, word, records, tact):
+        """Apply records to the word."""
+        rules = self.header['rules']
+        rule = None
+        for index, pos in records:
+            rule = rules[index]
+            word = word[:pos] + rule[1] + word[pos + len(rule[0]):]
+        return {'tact': tact, 'word': word, 'rule': format_rule(rule)}
+
+    def _replay_turing(self, checkpoint, records, tact):
+        """Apply records to the tape from checkpoint."""
+        symbols = self.header['symbols']
+        blank = symbols.index(self.header['empty'])
+        state, head, first = TURING_CHECKPOINT.unpack_from(checkpoint)
+        cells = array('H')
+        cells.frombytes(checkpoint[TURING_CHECKPOINT.size:])
+        if sys.byteorder != 'little':
+            cells.byteswap()
+        for state, symbol, move in records:
+            if head < first:
+                cells[0:0] = array('H', [blank]) * (first - head)
+                first = head
+            elif head >= first + len(cells):
+                cells.extend(array('H', [blank]) * (head - first - len(cells) + 1))
+            cells[head - first] = symbol
+            head += move
+        return {'tact': tact, 'state': self.header['states'][state], 'head': head,
+                'first': first, 'cells': [symbols[code] for code in cells]}
+
+
+class TraceRun:
+
+    """Places of checkpoints and records of one run in the trace file."""
+
+    def __init__(self):
+        """See help(type(x))."""
+        self.tacts = 0
+        self.checkpoints = [] # (tact, begin, end) of payloads
+        self.steps = []
@@ -2,12 +2,52 @@
 
 """Emulator of turing machine."""
 
+from array import array
+from collections import OrderedDict
+from itertools import groupby, repeat
+import re
+from .backends import get_native
+from .batch import execute_many
+from .limits import SNAPSHOT_SIZE, Budget, LoopDetector, cut
+
 TEMPLATE = """#!/bin/env python3
 # -*- coding: utf-8 -*-
-from turingmarkov.turing import Machine
 from sys import stdin
 """
 
+FUNCTIONS = """
+VALID = {valid}
+
+def grow(tape, head):
+    \"\"\"Extend tape to make head position valid, return new head.\"\"\"
+    extra = [{empty!r}] * (len(tape) + 16)
+    if head < 0:
+        tape[0:0] = extra
+        return head + len(extra)
+    tape.extend(extra)
+    return head
+
+def render(tape):
+    \"\"\"Get content of tape.\"\"\"
+    return ''.join(' ' if symbol == {empty!r} else symbol for symbol in tape).strip()
+
+def execute(string):
+    \"\"\"Execute machine on the string.\"\"\"
+    invalid = [char for char in set(string).difference(VALID) if not char.isspace()]
+    if invalid:
+        raise RuntimeError('Invalid symbol: "' + min(invalid, key=string.index) + '"')
+    tape = [{empty!r} if char.isspace() else char for char in string]
+    head = 0
+    state = {start}
+    while True:
+"""
+
+MAIN = """
+if __name__ == '__main__':
+    for line in stdin:
+        print(execute(line))
+"""
+
 
 class Machine:
 
@@ -25,18 +65,37 @@ class Machine:
     START_STATE = '0'
     TERM_STATE = '!'
     EMPTY_SYMBOL = '_'
+    WINDOW = 8 # Cells on each side of the head in the key of configuration
 
-    def __init__(self, alphabet):
-        """See help(type(x))."""
+    def __init__(self, alphabet, backend=None):
+        """See help(type(x)).
+
+        Backend is 'python' or 'native' (None is the best available, see
+        turingmarkov.backends), only table engine has native loop now
+        (build_machine chooses it by default, when native loop is built).
+        """
+        get_native(backend) # Check the name
+        self.backend = backend
         self.states = dict()
         self.state = None
         self.tape = None
         self.head = None
+        self.tacts = 0 # Count of tacts of the last run
+        self.left = None # Bounds of written part of the tape
+        self.right = None
+        self.checked = False
+        self.pruned = []
+        self.word_bounds = None # First and last non-empty cells and the head, see _loop_key
 
         if self.EMPTY_SYMBOL in alphabet:
             self.alphabet = alphabet
         else:
             raise SyntaxError('Missed "_" symbol in alphabet')
+        # Symbol -> index of its rule, lookups don't depend on size of alphabet;
+        # repeated symbol keeps its first place, as alphabet.index does
+        self.index = {}
+        for index, symbol in enumerate(alphabet):
+            self.index.setdefault(symbol, index)
 
     def _add_rule(self, state, rule):
         """Parse rule and add it to machine (for internal use)."""
@@ -72,6 +131,7 @@ class Machine:
                 raise SyntaxError('Double definition of state: ' + state)
             else:
                 self.states[state] = []
+                self.checked = False
 
             for rule in rules:
                 try:
@@ -81,7 +141,9 @@ class Machine:
                     raise err
 
     def check(self):
-        """Check semantic rules."""
+        """Check semantic rules (only once, until next add_state)."""
+        if self.checked:
+            return
         has_term = False
 
         if self.START_STATE not in self.states:
@@ -97,42 +159,111 @@ class Machine:
 
         if not has_term:
             raise SyntaxError('Missed terminate state')
+        self.checked = True
+
+    def prune(self):
+        """Remove states, which are unreachable from the start state.
+
+        Return report (list of messages), it's saved in self.pruned. Left
+        states are checked again by the next check.
+        """
+        self.check()
+        reachable, queue = {self.START_STATE}, [self.START_STATE]
+        while queue:
+            for rule in self.states[queue.pop()]:
+                if (rule is not None and rule[2] != self.TERM_STATE and
+                        rule[2] not in reachable):
+                    reachable.add(rule[2])
+                    queue.append(rule[2])
+        self.pruned = ['State {state} is unreachable from {start}'
+                       .format(state=state, start=self.START_STATE)
+                       for state in self.states if state not in reachable]
+        self.states = {state: rules for state, rules in self.states.items()
+                       if state in reachable}
+        self.checked = False
+        return self.pruned
+
+    def prepare(self):
+        """Do all checks and preprocessing before execution (e.g. for cache)."""
+        self.check()
+
+    def _check_input(self, string):
+        """Raise error, if string has invalid symbol, return set of spaces in it.
+
+        Only distinct chars of the string are checked, spaces are empty cells.
+        """
+        extra = set(string).difference(self.index)
+        invalid = [char for char in extra if not char.isspace()]
+        if invalid:
+            first = min(string.index(char) for char in invalid)
+            raise RuntimeError('Invalid symbol: "' + string[first] + '"')
+        return extra
 
     def init_tape(self, string):
         """Init system values."""
-        for char in string:
-            if char not in self.alphabet and not char.isspace() and char != self.EMPTY_SYMBOL:
-                raise RuntimeError('Invalid symbol: "' + char + '"')
-
+        spaces = self._check_input(string)
         self.check()
         self.state = self.START_STATE
         self.head = 0
 
-        self.tape = {}
-        for i in range(len(string)):
-            symbol = string[i] if not string[i].isspace() else self.EMPTY_SYMBOL
-            self.tape[i] = symbol
+        if spaces:
+            string = string.translate(dict.fromkeys(map(ord, spaces), self.EMPTY_SYMBOL))
+        self.tape = dict(enumerate(string))
+        self.left, self.right = 0, len(string) - 1
 
     def get_tape(self):
         """Get content of tape."""
-        result = ''
-        for i in range(min(self.tape), max(self.tape) + 1):
-            symbol = self.tape[i] if self.tape[i] != self.EMPTY_SYMBOL else ' '
-            result += symbol
+        tape, empty = self.tape, self.EMPTY_SYMBOL
+        cells = map(tape.get, range(self.left, self.right + 1), repeat(empty))
         # Remove unnecessary empty symbols on tape
-        return result.strip()
+        return ''.join([' ' if symbol == empty else symbol for symbol in cells]).strip()
+
+    def snapshot(self):
+        """Return beginning of the content of tape for reports: cut(self.get_tape()).
+
+        Only SNAPSHOT_SIZE cells after the first non-empty one are rendered.
+        """
+        empty = self.EMPTY_SYMBOL
+        first, last = self.left, self.right
+        while first <= last and self._symbol(first) == empty:
+            first += 1
+        while last >= first and self._symbol(last) == empty:
+            last -= 1
+        cells = self.tape_cells(first, min(first + SNAPSHOT_SIZE, last + 1))
+        text = ''.join([' ' if symbol == empty else symbol for symbol in cells])
+        if last >= first + SNAPSHOT_SIZE:
+            return text[:SNAPSHOT_SIZE] + '...'
+        return cut(text)
+
+    def tape_cells(self, start, stop):
+        """Return list of symbols in cells [start, stop), empty cells are EMPTY_SYMBOL."""
+        return list(map(self.tape.get, range(start, stop), repeat(self.EMPTY_SYMBOL)))
+
+    def tape_window(self, center=None, radius=WINDOW):
+        """Return cells [center - radius, center + radius] (center is head by default).
+
+        Empty cells are shown as EMPTY_SYMBOL, it's cheap even in the middle of run.
+        """
+        if center is None:
+            center = self.head
+        return ''.join(self.tape_cells(center - radius, center + radius + 1))
 
     def execute_once(self):
         """One step of execution."""
         symbol = self.tape.get(self.head, self.EMPTY_SYMBOL)
 
-        index = self.alphabet.index(symbol)
-        rule = self.states[self.state][index]
+        index = self.index.get(symbol)
+        rule = self.states[self.state][index] if index is not None else None
 
         if rule is None:
             raise RuntimeError('Unexpected symbol: ' + symbol)
 
-        self.tape[self.head] = rule[0]
+        head = self.head
+        self.tape[head] = rule[0]
+        if head < self.left:
+            self.left = head
+        elif head > self.right:
+            self.right = head
 
         if rule[1] == 'L':
             self.head -= 1
@@ -141,45 +272,939 @@ class Machine:
 
         self.state = rule[2]
 
-    def execute(self, string, max_tacts=None):
-        """Execute algorithm (if max_times = None, there can be forever loop)."""
+    def _read(self):
+        """Return symbol under the head."""
+        return self.tape.get(self.head, self.EMPTY_SYMBOL)
+
+    def _symbol(self, position):
+        """Return symbol in the cell."""
+        return self.tape.get(position, self.EMPTY_SYMBOL)
+
+    def _word_key(self):
+        """Return position of the head in the word and length of the word.
+
+        Word is non-empty part of the tape. Key is taken after every tact,
+        so bounds of the word can be changed only by the cell under the
+        previous position of the head; they are found once and then updated.
+        """
+        empty = self.EMPTY_SYMBOL
+        if self.word_bounds is None:
+            _, position, content = self._configuration()
+            first = self.head - position if len(content) > 0 else None
+            last = first + len(content) - 1 if first is not None else None
+        else:
+            first, last, written = self.word_bounds
+            if self._symbol(written) != empty:
+                if first is None:
+                    first = last = written
+                else:
+                    first, last = min(first, written), max(last, written)
+            elif written == first or written == last:
+                while first <= last and self._symbol(first) == empty:
+                    first += 1
+                while last >= first and self._symbol(last) == empty:
+                    last -= 1
+                if first > last:
+                    first = last = None
+        self.word_bounds = first, last, self.head
+        if first is None:
+            return 0, 0
+        return self.head - first, last - first + 1
+
+    def _loop_key(self):
+        """Return cheap key of configuration: state, head in the word and cells near it."""
+        tape, head = self.tape, self.head
+        return self.state, self._word_key(), tuple(
+            tape.get(i, self.EMPTY_SYMBOL) for i in range(head - self.WINDOW,
+                                                          head + self.WINDOW + 1))
+
+    def _configuration(self):
+        """Return state, position of the head and content of tape without empty ends."""
+        cells = [i for i, symbol in self.tape.items() if symbol != self.EMPTY_SYMBOL]
+        if cells == []:
+            return self.state, 0, ''
+        first, last = min(cells), max(cells)
+        content = ''.join(self.tape.get(i, self.EMPTY_SYMBOL) for i in range(first, last + 1))
+        return self.state, self.head - first, content
+
+    def execute(self, string, max_tacts=None, max_time=None, detect_loops=False,
+                profile=None, trace=None):
+        """Execute algorithm (if max_times = None, there can be forever loop).
+
+        If max_tacts or max_time (in seconds) is exceeded, LimitExceeded
+        is raised (see turingmarkov.limits). Count of executed tacts
+        is saved in self.tacts. If detect_loops is True, repeated
+        configuration (state and tape relative to the head) raises
+        LoopDetected (see turingmarkov.limits.LoopDetector).
+        Statistics of the run are added to the profile, if it's given
+        (see turingmarkov.profiling.TuringProfile). Every tact is written
+        to the trace, if it's given (see turingmarkov.tracing.TuringTrace).
+        """
         self.init_tape(string)
+        step = self.execute_once
+        if profile is not None:
+            step = profile.wrap(self, len(string.rstrip()))
+        if trace is not None:
+            step = trace.wrap(self, step, len(string))
+        budget = Budget(max_tacts, max_time)
+        limit = budget.limit
+        detector = LoopDetector() if detect_loops else None
+        self.word_bounds = None
         counter = 0
+        self.tacts = 0
 
         while True:
-            self.execute_once()
+            step()
+            counter += 1
             if self.state == self.TERM_STATE:
                 break
-            counter += 1
-            if max_tacts is not None and counter >= max_tacts:
-                raise TimeoutError("algorithm hasn't been stopped")
+            if counter >= limit:
+                if budget.exceeded(counter):
+                    self.tacts = counter
+                    raise budget.error(counter, self.state, self.snapshot)
+                limit = budget.limit
+            if detector is not None and detector.repeated(counter, self._loop_key(),
+                                                          self._configuration):
+                self.tacts = counter
+                raise detector.error(counter, self.state, self.snapshot(), budget.elapsed())
 
+        self.tacts = counter
         return self.get_tape()
 
+    def execute_many(self, strings, workers=None, catch=(), **options):
+        """Execute machine on every string (in parallel, if workers > 1).
+
+        Options are the same as for execute. Return iterator over results
+        in the same order (see turingmarkov.batch.execute_many).
+        """
+        return execute_many(self, strings, workers=workers, catch=catch, **options)
+
     def compile(self):
-        """Return python code for create and execute machine."""
+        """Return python code, which executes machine without turingmarkov.
+
+        Every state becomes a branch with inner loop, so transitions to
+        the same state don't leave it.
+        """
+        self.check()
+        codes = {state: code for code, state in enumerate(self.states)}
+        valid = sorted(symbol for symbol in self.alphabet if len(symbol) == 1)
+
         result = TEMPLATE
-        result += 'machine = Machine(' + repr(self.alphabet) + ')\n'
+        result += FUNCTIONS.format(valid='{' + ', '.join(repr(char) for char in valid) + '}',
+                                   empty=self.EMPTY_SYMBOL, start=codes[self.START_STATE])
 
         for state in self.states:
-            repr_state = state[0]
-            for rule in self.states[state]:
-                repr_state += ' ' + (','.join(rule) if rule is not None else '-')
+            result += "        {if_} state == {code}:\n".format(
+                if_='if' if codes[state] == 0 else 'elif', code=codes[state])
+            result += "            while True:\n"
+            result += "                if not 0 <= head < len(tape):\n"
+            result += "                    head = grow(tape, head)\n"
+            result += "                symbol = tape[head]\n"
+
+            if_ = 'if'
+            for index, rule in enumerate(self.states[state]):
+                if rule is None:
+                    continue
+                result += "                {if_} symbol == {symbol!r}:\n".format(
+                    if_=if_, symbol=self.alphabet[index])
+                if_ = 'elif'
 
-            result += ("machine.add_state({repr_state})\n".format(repr_state=repr(repr_state)))
+                body = []
+                if rule[0] != self.alphabet[index]:
+                    body.append("tape[head] = {symbol!r}".format(symbol=rule[0]))
+                if rule[1] == 'L':
+                    body.append("head -= 1")
+                elif rule[1] == 'R':
+                    body.append("head += 1")
+                if rule[2] == self.TERM_STATE:
+                    body.append("return render(tape)")
+                elif rule[2] != state:
+                    body.append("state = {code}".format(code=codes[rule[2]]))
+                    body.append("break")
+                for line in body or ["pass"]:
+                    result += "                    " + line + "\n"
 
-        result += "for line in stdin:\n"
-        result += "    print(machine.execute(line))"
+            if if_ == 'if':
+                result += "                raise RuntimeError('Unexpected symbol: ' + symbol)\n"
+            else:
+                result += "                else:\n"
+                result += "                    raise RuntimeError('Unexpected symbol: ' + symbol)\n"
+
+        result += MAIN
         return result
 
-def build_machine(lines):
-    """Build machine from list of lines."""
+class TransitionTable:
+
+    """Machine, converted to dense integer tables.
+
+    Symbols are coded by bytes (alphabet index, symbols which can be
+    written but are missed in alphabet get next codes), states are coded by
+    offset of their row in the table: cell = row + symbol. For each cell
+    there are written symbol, head move and the row of the next state
+    (HALT for terminate state, ERROR for missed rule).
+    """
+
+    HALT = -1
+    ERROR = -2
+    MOVES = {'L': -1, 'N': 0, 'R': 1}
+
+    def __init__(self, machine):
+        """See help(type(x))."""
+        self.symbols = list(machine.alphabet)
+        for rules in machine.states.values():
+            for rule in rules:
+                if rule is not None and rule[0] not in self.symbols:
+                    self.symbols.append(rule[0])
+        if len(self.symbols) > 256:
+            raise SyntaxError('Too many symbols for table: {count}'
+                              .format(count=len(self.symbols)))
+
+        self.codes = {} # Repeated symbol is coded by its first place, as alphabet.index does
+        for code, symbol in enumerate(self.symbols):
+            self.codes.setdefault(symbol, code)
+        self.width = len(self.symbols)
+        self.blank = self.codes[machine.EMPTY_SYMBOL]
+
+        self.names = list(machine.states)
+        self.term = machine.TERM_STATE
+        self.rows = {name: number * self.width for number, name in enumerate(self.names)}
+        self.rows[self.term] = self.HALT
+
+        # Lists are a bit faster than arrays for reading in the hot loop
+        size = len(self.names) * self.width
+        self.write = bytearray(size)
+        self.move = [0] * size
+        self.target = [self.ERROR] * size
+        for name in self.names:
+            for index, rule in enumerate(machine.states[name]):
+                if rule is not None:
+                    cell = self.rows[name] + index
+                    self.write[cell] = self.codes[rule[0]]
+                    self.move[cell] = self.MOVES[rule[1]]
+                    self.target[cell] = self.rows[rule[2]]
+        # Same tables for the native loop
+        self.packed = (bytes(self.write), array('b', self.move), array('i', self.target))
+
+        # Input encoding: one-char symbols are coded as is
+        self.encoding = {ord(symbol): code for symbol, code in self.codes.items()
+                         if len(symbol) == 1 and code < len(machine.alphabet)}
+        # Output decoding: empty symbol is shown as space
+        self.decoding = {code: symbol for symbol, code in self.codes.items()}
+        self.decoding[self.blank] = ' '
+        self.filled = re.compile(b'[^' + re.escape(bytes([self.blank])) + b']')
+
+    def state_name(self, row):
+        """Return name of state by its row."""
+        return self.term if row == self.HALT else self.names[row // self.width]
+
+    def encode(self, string, spaces=()):
+        """Convert input string to bytearray of codes.
+
+        String should be valid: symbols of alphabet and given spaces.
+        """
+        encoding = dict(self.encoding)
+        for char in spaces:
+            encoding[ord(char)] = self.blank
+        return bytearray(string.translate(encoding).encode('latin-1'))
+
+    def decode(self, tape):
+        """Convert bytearray of codes to output string."""
+        return tape.decode('latin-1').translate(self.decoding).strip()
+
+    def snapshot(self, tape):
+        """Return cut(self.decode(tape)) for reports, only its beginning is decoded."""
+        found = self.filled.search(tape)
+        if found is None:
+            return ''
+        first = found.start()
+        stop = first + SNAPSHOT_SIZE
+        text = bytes(tape[first:stop]).decode('latin-1').translate(self.decoding)
+        if self.filled.search(tape, stop) is not None:
+            return text[:SNAPSHOT_SIZE] + '...'
+        return cut(text.rstrip())
+
+
+class TableMachine(Machine):
+
+    """Turing Machine, which is executed over dense tables.
+
+    Transitions are stored in TransitionTable, tape is bytearray, which
+    grows in both directions (cell with position i is tape[i + origin]).
+    It's the same machine, but tacts are much cheaper.
+
+    >>> x = TableMachine(['a', 'b', 'c', '_'])
+    >>> x.add_state('0 ,R, ,R, ,R, a,N,!')
+    >>> x.execute('abacab')
+    'abacaba'
+    """
+
+    def __init__(self, alphabet, backend=None):
+        """See help(type(x))."""
+        super().__init__(alphabet, backend)
+        self.table = None
+        self.origin = None
+
+    def add_state(self, string):
+        """Add state and rules to machine."""
+        super().add_state(string)
+        self.table = None
+
+    def prune(self):
+        """Remove unreachable states, table is built again without them."""
+        self.table = None
+        return super().prune()
+
+    def get_table(self):
+        """Return transition table (it's built once)."""
+        if self.table is None:
+            self.check()
+            self.table = TransitionTable(self)
+        return self.table
+
+    def prepare(self):
+        """Do all checks and build transition table before execution."""
+        self.get_table()
+
+    def init_tape(self, string):
+        """Init system values."""
+        spaces = self._check_input(string)
+        table = self.get_table()
+        self.tape = table.encode(string, spaces)
+        self.origin = 0
+        self.state = self.START_STATE
+        self.head = 0
+
+    def get_tape(self):
+        """Get content of tape."""
+        return self.get_table().decode(self.tape)
+
+    def snapshot(self):
+        """Return beginning of the content of tape for reports: cut(self.get_tape())."""
+        return self.get_table().snapshot(self.tape)
+
+    def tape_cells(self, start, stop):
+        """Return list of symbols in cells [start, stop), empty cells are EMPTY_SYMBOL."""
+        table = self.get_table()
+        size = max(stop - start, 0)
+        start += self.origin
+        window = self.tape[max(start, 0):max(start + size, 0)]
+        before = min(max(-start, 0), size)
+        after = size - before - len(window)
+        return ([self.EMPTY_SYMBOL] * before + [table.symbols[code] for code in window] +
+                [self.EMPTY_SYMBOL] * after)
+
+    def _grow(self, head):
+        """Extend tape to make head position valid, return new head index."""
+        extra = bytes([self.table.blank]) * (len(self.tape) + 16)
+        if head < 0:
+            self.tape[0:0] = extra
+            self.origin += len(extra)
+            return head + len(extra)
+        self.tape.extend(extra)
+        return head
+
+    def execute_once(self):
+        """One step of execution."""
+        table = self.get_table()
+        head = self.head + self.origin
+        if head < 0 or head >= len(self.tape):
+            head = self._grow(head)
+        cell = table.rows[self.state] + self.tape[head]
+        if table.target[cell] == table.ERROR:
+            raise RuntimeError('Unexpected symbol: ' + table.symbols[self.tape[head]])
+
+        self.tape[head] = table.write[cell]
+        self.head += table.move[cell]
+        self.state = table.state_name(table.target[cell])
+
+    def _read(self):
+        """Return symbol under the head."""
+        head = self.head + self.origin
+        if head < 0 or head >= len(self.tape):
+            return self.EMPTY_SYMBOL
+        return self.table.symbols[self.tape[head]]
+
+    def _symbol(self, position):
+        """Return symbol in the cell."""
+        position += self.origin
+        if position < 0 or position >= len(self.tape):
+            return self.EMPTY_SYMBOL
+        return self.table.symbols[self.tape[position]]
+
+    def _loop_key(self):
+        """Return cheap key of configuration: state, head in the word and cells near it."""
+        size = 2 * self.WINDOW + 1
+        start = self.head + self.origin - self.WINDOW
+        window = bytes(self.tape[max(start, 0):max(start + size, 0)])
+        before = min(max(-start, 0), size)
+        blank = bytes([self.table.blank])
+        return self.state, self._word_key(), (blank * before + window +
+                                              blank * (size - before - len(window)))
+
+    def _configuration(self):
+        """Return state, position of the head and content of tape without empty ends."""
+        blank = bytes([self.get_table().blank])
+        content = self.tape.lstrip(blank)
+        first = len(self.tape) - len(content)
+        content = bytes(content.rstrip(blank))
+        if content == b'':
+            return self.state, 0, b''
+        return self.state, self.head + self.origin - first, content
+
+    def execute(self, string, max_tacts=None, max_time=None, detect_loops=False,
+                profile=None, trace=None):
+        """Execute algorithm (if max_times = None, there can be forever loop).
+
+        Loop detection, profiling and tracing need configuration after every
+        tact, so they are done by slow step-by-step loop of Machine.
+        """
+        if detect_loops or profile is not None or trace is not None:
+            return Machine.execute(self, string, max_tacts, max_time, detect_loops, profile,
+                                   trace)
+        self.init_tape(string)
+        return self._run(self.table.rows[self.START_STATE], self.origin, 0,
+                         Budget(max_tacts, max_time))
+
+    def _run(self, row, head, counter, budget):
+        """Execute from the state row of the table and index of the head in self.tape.
+
+        Counter is count of tacts, which are already done; budget is Budget of the run.
+        """
+        native = get_native(self.backend)
+        if native is not None:
+            return self._run_native(native, row, head, counter, budget)
+        table = self.table
+        write, move, target = table.write, table.move, table.target
+        tape = self.tape
+        size = len(tape)
+        limit = budget.limit
+        self.tacts = counter
+
+        try:
+            while True:
+                if head < 0 or head >= size:
+                    head = self._grow(head)
+                    size = len(tape)
+                cell = row + tape[head]
+                row = target[cell]
+                if row < 0:
+                    if row == table.HALT:
+                        tape[head] = write[cell]
+                        head += move[cell]
+                        counter += 1
+                        break
+                    row = cell - tape[head]
+                    raise RuntimeError('Unexpected symbol: ' + table.symbols[tape[head]])
+                tape[head] = write[cell]
+                head += move[cell]
+                counter += 1
+                if counter >= limit:
+                    if budget.exceeded(counter):
+                        raise budget.error(counter, table.state_name(row), self.snapshot)
+                    limit = budget.limit
+        finally:
+            self.state = table.state_name(row)
+            self.head = head - self.origin
+            self.tacts = counter
+
+        return self.get_tape()
+
+    def _run_native(self, native, row, head, counter, budget):
+        """Execute machine by the loop of turingmarkov._native (see _run)."""
+        table = self.table
+        write, move, target = table.packed
+        self.tacts = counter
+
+        try:
+            while True:
+                status, row, head, counter = native.table_run(self.tape, write, move, target,
+                                                              row, head, counter, budget.limit)
+                if status == native.TABLE_GROW:
+                    head = self._grow(head)
+                elif status == native.TABLE_HALT:
+                    break
+                elif status == native.TABLE_ERROR:
+                    raise RuntimeError('Unexpected symbol: ' + table.symbols[self.tape[head]])
+                elif budget.exceeded(counter):
+                    raise budget.error(counter, table.state_name(row), self.snapshot)
+        finally:
+            self.state = table.state_name(row)
+            self.head = head - self.origin
+            self.tacts = counter
+
+        return self.get_tape()
+
+
+class MacroMachine(TableMachine):
+
+    """Turing Machine with run-length encoded tape and macro steps.
+
+    Tape is a list of runs [symbol code, length]. If the rule keeps the
+    state and moves the head, the machine will apply it to the whole run
+    under the head, so sweeps over long words cost one step. Tacts are
+    still counted one by one: the sweep is cut to the rest of max_tacts,
+    so the tape and the head are the same as in other engines.
+
+    >>> x = MacroMachine(['a', 'b', 'c', '_'])
+    >>> x.add_state('0 ,R, ,R, ,R, a,N,!')
+    >>> x.execute('a' * 10 ** 6)[-3:]
+    'aaa'
+    """
+
+    def __init__(self, alphabet, backend=None):
+        """See help(type(x))."""
+        super().__init__(alphabet, backend)
+        self.run = None
+        self.offset = None
+
+    def init_tape(self, string):
+        """Init system values."""
+        super().init_tape(string)
+        blank = self.table.blank
+        self.tape = [[code, len(list(group))] for code, group in groupby(self.tape)]
+        if self.tape == []:
+            self.tape.append([blank, 1])
+        self.run, self.offset = 0, 0
+
+    def get_tape(self):
+        """Get content of tape."""
+        table = self.get_table()
+        runs = self.tape
+        first, last = 0, len(runs)
+        # Don't render big empty areas at the ends
+        while first < last and runs[first][0] == table.blank:
+            first += 1
+        while last > first and runs[last - 1][0] == table.blank:
+            last -= 1
+        return ''.join(table.decoding[code] * count
+                       for code, count in runs[first:last]).strip()
+
+    def snapshot(self):
+        """Return beginning of the content of tape for reports: cut(self.get_tape()).
+
+        Only SNAPSHOT_SIZE cells after the first non-empty one are rendered.
+        """
+        table = self.get_table()
+        runs = self.tape
+        first, last = 0, len(runs)
+        while first < last and runs[first][0] == table.blank:
+            first += 1
+        while last > first and runs[last - 1][0] == table.blank:
+            last -= 1
+        parts, cells = [], 0
+        for index in range(first, last):
+            code, count = runs[index]
+            if cells + count > SNAPSHOT_SIZE:
+                parts.append(table.decoding[code] * (SNAPSHOT_SIZE - cells))
+                return ''.join(parts)[:SNAPSHOT_SIZE] + '...'
+            parts.append(table.decoding[code] * count)
+            cells += count
+        return cut(''.join(parts))
+
+    def tape_cells(self, start, stop):
+        """Return list of symbols in cells [start, stop), empty cells are EMPTY_SYMBOL."""
+        table = self.get_table()
+        low, high = start, max(stop, start)
+        cells = []
+        start = self.origin
+        for code, count in self.tape:
+            stop = start + count
+            if stop > low and start < high:
+                cells.extend([table.symbols[code]] * (min(stop, high) - max(start, low)))
+            elif start >= high:
+                break
+            start = stop
+        before = max(min(self.origin, high) - low, 0)
+        after = max(high - max(start, low), 0)
+        return [self.EMPTY_SYMBOL] * before + cells + [self.EMPTY_SYMBOL] * after
+
+    def tape_window(self, center=None, radius=Machine.WINDOW):
+        """Return cells [center - radius, center + radius] (center is head by default)."""
+        if center is None:
+            center = self._position()
+        return super().tape_window(center, radius)
+
+    def _position(self):
+        """Return absolute position of the head."""
+        return self.origin + sum(count for _, count in self.tape[:self.run]) + self.offset
+
+    def _rewrite(self, run, start, stop, code):
+        """Write code to cells [start, stop) of the run, return (run, start) of them."""
+        runs = self.tape
+        symbol, count = runs[run]
+        if symbol == code:
+            return run, start
+
+        middle = [[code, stop - start]]
+        if stop < count:
+            middle.append([symbol, count - stop])
+        if start > 0:
+            middle.insert(0, [symbol, start])
+        runs[run:run+1] = middle
+        if start > 0:
+            run += 1
+        start = 0
+
+        # Glue with neighbours
+        if run + 1 < len(runs) and runs[run + 1][0] == code:
+            runs[run][1] += runs.pop(run + 1)[1]
+        if run > 0 and runs[run - 1][0] == code:
+            start = runs[run - 1][1]
+            runs[run - 1][1] += runs.pop(run)[1]
+            run -= 1
+        return run, start
+
+    def _move(self, run, offset, shift):
+        """Move head by shift cells (within the run and one cell out)."""
+        runs = self.tape
+        offset += shift
+        if offset >= runs[run][1]:
+            offset -= runs[run][1]
+            run += 1
+            if run == len(runs):
+                if runs[-1][0] == self.table.blank:
+                    run -= 1
+                    runs[run][1] += 1
+                    offset = runs[run][1] - 1
+                else:
+                    runs.append([self.table.blank, 1])
+        elif offset < 0:
+            if run > 0:
+                run -= 1
+                offset += runs[run][1]
+            else:
+                self.origin -= 1
+                offset = 0
+                if runs[0][0] == self.table.blank:
+                    runs[0][1] += 1
+                else:
+                    runs.insert(0, [self.table.blank, 1])
+        return run, offset
+
+    def _step(self, row, cell, macro, most=None):
+        """Apply rule in the cell to the head (to the whole run, if macro).
+
+        Macro step applies the rule to at most `most` cells, return count of them.
+        """
+        table, runs = self.table, self.tape
+        run, offset = self.run, self.offset
+        move = table.move[cell]
+        if macro and move != 0 and table.target[cell] == row:
+            if move > 0:
+                start, stop = offset, runs[run][1]
+                if most is not None:
+                    stop = min(stop, offset + most)
+            else:
+                start, stop = 0, offset + 1
+                if most is not None:
+                    start = max(start, stop - most)
+        else:
+            start, stop = offset, offset + 1
+
+        length = stop - start
+        run, start = self._rewrite(run, start, stop, table.write[cell])
+        if move > 0:
+            self.run, self.offset = self._move(run, start, length)
+        elif move < 0:
+            self.run, self.offset = self._move(run, start, -1)
+        else:
+            self.run, self.offset = run, start
+        return length
+
+    def execute_once(self):
+        """One step of execution."""
+        table = self.get_table()
+        symbol = self.tape[self.run][0]
+        cell = table.rows[self.state] + symbol
+        if table.target[cell] == table.ERROR:
+            raise RuntimeError('Unexpected symbol: ' + table.symbols[symbol])
+        self._step(table.rows[self.state], cell, False)
+        self.state = table.state_name(table.target[cell])
+        self.head += table.move[cell]
+
+    def _read(self):
+        """Return symbol under the head."""
+        return self.table.symbols[self.tape[self.run][0]]
+
+    def _loop_key(self):
+        """Return cheap key of configuration: state, head and count of runs in the word.
+
+        Word is runs without empty ones at the ends, head is its run and
+        offset (offset from the word, if the head is in the empty run before it).
+        """
+        runs, blank = self.tape, self.table.blank
+        first = 1 if runs[0][0] == blank else 0
+        last = len(runs) - 1 if runs[-1][0] == blank else len(runs)
+        if first >= last:
+            return self.state, 0, 0, 0
+        offset = self.offset
+        if self.run < first:
+            offset -= runs[0][1]
+        return self.state, self.run - first, offset, last - first
+
+    def _configuration(self):
+        """Return state, position of the head and runs of tape without empty ends."""
+        blank = self.get_table().blank
+        runs = []
+        for code, count in self.tape:
+            if runs and runs[-1][0] == code:
+                runs[-1] = (code, runs[-1][1] + count)
+            elif count > 0:
+                runs.append((code, count))
+        first = self.origin
+        while runs and runs[0][0] == blank:
+            first += runs.pop(0)[1]
+        while runs and runs[-1][0] == blank:
+            runs.pop()
+        if runs == []:
+            return self.state, 0, ()
+        return self.state, self._position() - first, tuple(runs)
+
+    def execute(self, string, max_tacts=None, max_time=None, detect_loops=False,
+                profile=None, trace=None):
+        """Execute algorithm (if max_times = None, there can be forever loop)."""
+        if detect_loops or profile is not None or trace is not None:
+            return Machine.execute(self, string, max_tacts, max_time, detect_loops, profile,
+                                   trace)
+        self.init_tape(string)
+        table = self.table
+        blank, target, move = table.blank, table.target, table.move
+        runs = self.tape
+        row = table.rows[self.START_STATE]
+        budget = Budget(max_tacts, max_time)
+        limit = budget.limit
+        counter = 0
+        self.tacts = 0
+
+        try:
+            while True:
+                symbol = runs[self.run][0]
+                cell = row + symbol
+                if target[cell] < 0:
+                    if target[cell] == table.ERROR:
+                        raise RuntimeError('Unexpected symbol: ' + table.symbols[symbol])
+                    self._step(row, cell, False)
+                    row = table.HALT
+                    counter += 1
+                    break
+
+                # Sweep to the infinite empty area never stops: make the empty
+                # area long enough for the rest of the budget and sweep over it
+                if (limit < budget.NEVER and target[cell] == row and symbol == blank and
+                        move[cell] != 0):
+                    rest = limit - counter
+                    if move[cell] > 0 and self.run == len(runs) - 1:
+                        runs[-1][1] = max(runs[-1][1], self.offset + rest + 1)
+                    elif move[cell] < 0 and self.run == 0:
+                        runs[0][1] += rest
+                        self.offset += rest
+                        self.origin -= rest
+                counter += self._step(row, cell, True, limit - counter)
+                row = target[cell]
+                if counter >= limit:
+                    if budget.exceeded(counter):
+                        raise budget.error(counter, table.state_name(row), self.snapshot)
+                    limit = budget.limit
+        finally:
+            self.state = table.state_name(row)
+            self.head = self._position()
+            self.tacts = counter
+
+        return self.get_tape()
+
+
+class BlockMachine(TableMachine):
+
+    """Turing Machine with memoized macro-transitions over tape blocks.
+
+    Tape is split to aligned blocks of BLOCK cells, pairs of neighbour
+    blocks form blocks of the next level, and so on up to LEVELS levels.
+    Traversal of the block (from the moment the head enters it, until it
+    leaves it) is remembered in the bounded cache: (state, position of the
+    head, content of the block) -> (exit state, exit position, rewritten
+    block, count of tacts). When the head enters blocks, the biggest known
+    traversal is applied at once, otherwise the smallest block is executed
+    tact by tact. Repeated sweeps over long words take a few lookups, but
+    tacts are counted exactly: traversal, which doesn't fit into the rest
+    of max_tacts, is executed by smaller steps.
+
+    >>> x = BlockMachine(['a', 'b', 'c', '_'])
+    >>> x.add_state('0 ,R, ,R, ,R, a,N,!')
+    >>> x.execute('ab' * 1000)[-3:]
+    'aba'
+    """
+
+    BLOCK = 8
+    LEVELS = 8
+    MAX_MEMORY = 64 * 1024 * 1024 # Size of the cache, least recently used are removed first
+    ENTRY_OVERHEAD = 200 # Dict slot, tuples and counters, roughly
+
+    def __init__(self, alphabet, backend=None):
+        """See help(type(x))."""
+        super().__init__(alphabet, backend)
+        self.blocks = OrderedDict()
+        self.memory = 0
+
+    def add_state(self, string):
+        """Add state and rules to machine."""
+        super().add_state(string)
+        self.blocks.clear()
+        self.memory = 0
+
+    def prune(self):
+        """Remove unreachable states, forget traversals (rows are changed)."""
+        self.blocks.clear()
+        self.memory = 0
+        return super().prune()
+
+    def _remember(self, key, traversal):
+        """Put traversal of the block to the cache."""
+        if key not in self.blocks:
+            self.memory += 2 * len(key[2]) + self.ENTRY_OVERHEAD
+        self.blocks[key] = traversal
+        while self.memory > self.MAX_MEMORY:
+            _, (_, _, block, _) = self.blocks.popitem(last=False)
+            self.memory -= 2 * len(block) + self.ENTRY_OVERHEAD
+
+    def init_tape(self, string):
+        """Init system values, length of the tape is multiple of the biggest block."""
+        super().init_tape(string)
+        top = self.BLOCK << (self.LEVELS - 1)
+        self.tape.extend(bytes([self.table.blank]) * (-len(self.tape) % top))
+
+    def _grow(self, head):
+        """Extend tape by whole blocks to make head position valid, return new head index."""
+        top = self.BLOCK << (self.LEVELS - 1)
+        extra = bytes([self.table.blank]) * (len(self.tape) + top)
+        if head < 0:
+            self.tape[0:0] = extra
+            self.origin += len(extra)
+            return head + len(extra)
+        self.tape.extend(extra)
+        return head
+
+    def execute(self, string, max_tacts=None, max_time=None, detect_loops=False,
+                profile=None, trace=None):
+        """Execute algorithm (if max_times = None, there can be forever loop)."""
+        if detect_loops or profile is not None or trace is not None:
+            return Machine.execute(self, string, max_tacts, max_time, detect_loops, profile,
+                                   trace)
+        self.init_tape(string)
+        table, blocks = self.table, self.blocks
+        write, move, target = table.write, table.move, table.target
+        sizes = [self.BLOCK << level for level in range(self.LEVELS)]
+        tape = self.tape
+        row = table.rows[self.START_STATE]
+        head = self.origin
+        budget = Budget(max_tacts, max_time)
+        limit = budget.limit
+        counter = 0
+        self.tacts = 0
+        # For every level: (key, start, counter) of the block, which the head has entered
+        entered = [None] * self.LEVELS
+        changed = self.LEVELS # Count of levels, whose blocks have just been entered
+
+        try:
+            while True:
+                if head < 0 or head >= len(tape):
+                    origin = self.origin
+                    head = self._grow(head)
+                    shift = self.origin - origin
+                    entered = [item and (item[0], item[1] + shift, item[2]) for item in entered]
+
+                before = head
+                for level in reversed(range(changed)):
+                    size = sizes[level]
+                    start = head - head % size
+                    key = row, head - start, bytes(tape[start:start + size])
+                    known = blocks.get(key)
+                    if known is not None and counter + known[3] <= limit:
+                        blocks.move_to_end(key)
+                        row, offset, tape[start:start + size], tacts = known
+                        head = start + offset
+                        counter += tacts
+                        entered[:level + 1] = [None] * (level + 1)
+                        break
+                    entered[level] = key, start, counter
+                else:
+                    # Execute the smallest block tact by tact
+                    start = head - head % sizes[0]
+                    stop = start + sizes[0]
+                    while start <= head < stop:
+                        cell = row + tape[head]
+                        row = target[cell]
+                        if row < 0:
+                            if row == table.HALT:
+                                tape[head] = write[cell]
+                                head += move[cell]
+                                counter += 1
+                                return self.get_tape()
+                            row = cell - tape[head]
+                            raise RuntimeError('Unexpected symbol: ' +
+                                               table.symbols[tape[head]])
+                        tape[head] = write[cell]
+                        head += move[cell]
+                        counter += 1
+                        if counter >= limit:
+                            break
+
+                # Remember traversals of the blocks, which the head has left
+                changed = 0
+                while changed < self.LEVELS and (before // sizes[changed] !=
+                                                 head // sizes[changed]):
+                    if entered[changed] is not None:
+                        key, start, tacts = entered[changed]
+                        self._remember(key, (row, head - start,
+                                             bytes(tape[start:start + sizes[changed]]),
+                                             counter - tacts))
+                    changed += 1
+
+                if counter >= limit:
+                    if budget.exceeded(counter):
+                        raise budget.error(counter, table.state_name(row), self.snapshot)
+                    limit = budget.limit
+        finally:
+            self.state = table.state_name(row)
+            self.head = head - self.origin
+            self.tacts = counter
+
+
+ENGINES = {'dict': Machine,
+           'table': TableMachine,
+           'macro': MacroMachine,
+           'block': BlockMachine}
+
+def get_engine(name):
+    """Return class of machine by engine name."""
+    if name == 'numpy': # Needs optional numpy, so it's imported only here
+        from .vectorized import NumpyMachine
+        return NumpyMachine
+    if name not in ENGINES:
+        raise ValueError('Unknown engine: ' + name)
+    return ENGINES[name]
+
+def build_machine(lines, engine=None, backend=None):
+    """Build machine from list of lines, unreachable states are removed (see Machine.prune).
+
+    Default engine is 'table', if its native loop is built and the machine
+    fits to the transition table, otherwise 'dict'.
+    """
+    if engine is None:
+        if get_native(backend) is not None:
+            try:
+                machine = build_machine(lines, 'table', backend)
+                machine.get_table()
+                return machine
+            except SyntaxError: # Too many symbols, or error, which dict engine will report
+                pass
+        engine = 'dict'
+    machine_class = get_engine(engine)
     if lines == []:
         raise SyntaxError('Empty file')
     else:
-        machine = Machine(lines[0].split())
+        machine = machine_class(lines[0].split(), backend)
         for line in lines[1:]:
             if line.strip() != '':
                 machine.add_state(line)
-    machine.check()
+    machine.prune()
     return machine
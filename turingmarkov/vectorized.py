@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+"""Turing machine, which executes many lines at once by numpy.
+
+Tapes of all lines are rows of 2-D uint8 array (codes of TransitionTable),
+heads and states are vectors. One step of all running lines is a few
+vector operations: read symbols under heads, look up cells of the table,
+write, move and change states; halted and broken lines are masked out.
+Few remaining long lines are continued from their tapes, heads and
+states by usual table loop, vector steps don't pay off for them. Lines,
+whose heads go far from the input, are continued the same way, so one
+runaway line doesn't widen tapes of the whole batch.
+
+Numpy is optional dependency, this module is imported only by engine
+'numpy' (see turingmarkov.turing.get_engine).
+"""
+
+from itertools import islice
+import numpy as np
+from .limits import Budget
+from .turing import TableMachine
+
+class NumpyMachine(TableMachine):
+
+    """Table machine with vectorized execute_many.
+
+    Lines are executed in this process by batches of BATCH lines. Time limit
+    is common for the batch: lines are executed simultaneously, and the
+    last SCALAR_ROWS lines continue with the rest of tacts and time. Loop
+    detection, profiling and tracing need separate runs, so they are done
+    line by line.
+
+    >>> x = NumpyMachine(['a', 'b', 'c', '_'])
+    >>> x.add_state('0 ,R, ,R, ,R, a,N,!')
+    >>> list(x.execute_many(['ab', 'c']))
+    ['aba', 'ca']
+    """
+
+    BATCH = 4096
+    SCALAR_ROWS = 8 # Lines, which are continued by table loop
+    MARGIN = 16 # Empty cells on both sides of the words
+    GROWTH = 4 # Tapes grow up to GROWTH widths of the input (at least to WIDTH cells),
+    WIDTH = 4096 # lines, which go out of them, are continued by table loop
+
+    def execute_many(self, strings, workers=None, catch=(), **options):
+        """Execute machine on every string, yield results in input order.
+
+        See turingmarkov.batch.execute_many, workers are not used.
+        """
+        if (options.get('detect_loops') or options.get('profile') is not None or
+                options.get('trace') is not None):
+            return super().execute_many(strings, workers=workers, catch=catch, **options)
+        return self._execute_batches(strings, catch, options.get('max_tacts'),
+                                     options.get('max_time'))
+
+    def _execute_batches(self, strings, catch, max_tacts, max_time):
+        """Split strings to batches, yield results (and exceptions from catch)."""
+        strings = iter(strings)
+        while True:
+            batch = list(islice(strings, self.BATCH))
+            if batch == []:
+                return
+            for result, err in self.execute_batch(batch, max_tacts, max_time):
+                if err is None:
+                    yield result
+                elif isinstance(err, catch):
+                    yield err
+                else:
+                    raise err
+
+    def _continue_scalar(self, tape, origin, lines, budget, step):
+        """Continue lines one by one by table loop, yield (index, outcome).
+
+        Lines are (index of tape row, head, state row), origin is the column
+        of position 0, all lines have done step tacts of the budget.
+        """
+        table = self.table
+        for index, head, row in lines:
+            head, row = int(head), int(row)
+            self.tape = bytearray(tape[index].tobytes())
+            self.origin = origin
+            try:
+                if budget.resume(step): # Time could run out on previous lines
+                    self.state, self.head = table.state_name(row), head - origin
+                    raise budget.error(step, self.state, self.snapshot)
+                yield index, (self._run(row, head, step, budget), None)
+            except Exception as err: # Returned as outcome of the line
+                yield index, (None, err)
+
+    def execute_batch(self, strings, max_tacts=None, max_time=None):
+        """Execute machine on list of strings simultaneously.
+
+        Return list of pairs (result, None) or (None, exception).
+        """
+        table = self.get_table()
+        outcomes = [None] * len(strings)
+        numbers, words = [], []
+        for number, string in enumerate(strings):
+            try:
+                self.init_tape(string)
+            except RuntimeError as err:
+                outcomes[number] = (None, err)
+                continue
+            numbers.append(number)
+            words.append(self.tape)
+        if numbers == []:
+            return outcomes
+
+        write = np.frombuffer(table.packed[0], dtype=np.uint8)
+        move = np.array(table.move, dtype=np.int64)
+        target = np.array(table.target, dtype=np.int64)
+        width = max(len(word) for word in words) + 2 * self.MARGIN
+        max_width = max(self.GROWTH * width, self.WIDTH)
+        tape = np.full((len(words), width), table.blank, dtype=np.uint8)
+        for index, word in enumerate(words):
+            tape[index, self.MARGIN:self.MARGIN + len(word)] = np.frombuffer(word, np.uint8)
+
+        # Vectors of running lines: index of tape row, head and state row
+        alive = np.arange(len(words))
+        heads = np.full(len(words), self.MARGIN, dtype=np.int64)
+        origin = self.MARGIN
+        rows = np.full(len(words), table.rows[self.START_STATE], dtype=np.int64)
+        budget = Budget(max_tacts, max_time)
+        step = 0
+
+        while alive.size > 0:
+            if alive.size <= self.SCALAR_ROWS:
+                for index, outcome in self._continue_scalar(tape, origin,
+                                                            zip(alive, heads, rows),
+                                                            budget, step):
+                    outcomes[numbers[index]] = outcome
+                break
+
+            symbols = tape[alive, heads]
+            cells = rows + symbols
+            targets = target[cells]
+            broken = targets == table.ERROR
+            if broken.any():
+                for index, symbol in zip(alive[broken], symbols[broken]):
+                    outcomes[numbers[index]] = (None, RuntimeError('Unexpected symbol: ' +
+                                                                   table.symbols[symbol]))
+                works = ~broken
+                alive, heads, cells, targets = (alive[works], heads[works], cells[works],
+                                                targets[works])
+
+            tape[alive, heads] = write[cells]
+            heads += move[cells]
+            rows = targets
+            step += 1
+
+            halted = rows == table.HALT
+            if halted.any():
+                for index in alive[halted]:
+                    outcomes[numbers[index]] = (table.decode(tape[index].tobytes()), None)
+                works = ~halted
+                alive, heads, rows = alive[works], heads[works], rows[works]
+            if alive.size == 0:
+                break
+
+            if step >= budget.limit and budget.exceeded(step):
+                for index, row in zip(alive, rows):
+                    outcomes[numbers[index]] = (None, budget.error(
+                        step, table.state_name(row), table.snapshot, tape[index]))
+                break
+
+            # Heads move by one cell, so it's enough to grow tapes by width
+            low, high = heads.min(), heads.max()
+            if low < 0 or high >= width:
+                left = width if low < 0 else 0
+                right = width if high >= width else 0
+                if width + left + right <= max_width:
+                    tape = np.pad(tape, ((0, 0), (left, right)), constant_values=table.blank)
+                    heads += left
+                    origin += left
+                    width = tape.shape[1]
+                else: # Don't grow all tapes for few long lines, continue them alone
+                    out = (heads < 0) | (heads >= width)
+                    for index, outcome in self._continue_scalar(
+                            tape, origin, zip(alive[out], heads[out], rows[out]), budget,
+                            step):
+                        outcomes[numbers[index]] = outcome
+                    works = ~out
+                    alive, heads, rows = alive[works], heads[works], rows[works]
+                    # Continued lines have moved the limit, check the budget on the next step
+                    budget.limit = min(budget.limit, step + 1)
+
+        return outcomes
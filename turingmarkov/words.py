@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+
+"""Representations of the word for markov algorithm.
+
+Word kind is a class with static methods:
+make(string) creates word, substitute(word, pos, length, text) replaces
+word[pos:pos+length] by text and returns the new word, render(word)
+returns content as str and prefix(word, size) only its first size
+characters. accepts(string) tells if the string can be stored in such
+word, encode(text) converts parts of rules to the same alphabet. Words
+support find(sub[, start[, end]]), len() and iteration over characters,
+so matchers can work with any of them.
+"""
+
+from bisect import bisect_right
+from itertools import chain
+
+class StrWord:
+
+    """Immutable python string: every substitution copies the whole word."""
+
+    @staticmethod
+    def accepts(string):
+        """Any string can be stored."""
+        return True
+
+    @staticmethod
+    def encode(text):
+        """Parts of rules are strings too."""
+        return text
+
+    @staticmethod
+    def make(string):
+        """Create word from string."""
+        return string
+
+    @staticmethod
+    def substitute(word, pos, length, text):
+        """Return word with word[pos:pos+length] replaced by text."""
+        return word[:pos] + text + word[pos+length:]
+
+    @staticmethod
+    def render(word):
+        """Return word as string."""
+        return word
+
+    @staticmethod
+    def prefix(word, size):
+        """Return first size characters of the word."""
+        return word[:size]
+
+
+class Rope:
+
+    """Mutable word, stored as list of short chunks.
+
+    Substitution rebuilds only chunks touched by the edit, so it costs
+    O(CHUNK + len(text)) instead of O(len(word)).
+
+    >>> rope = Rope('abacaba')
+    >>> rope.substitute(3, 1, 'xyz')
+    >>> str(rope), rope.find('ab', 1)
+    ('abaxyzaba', 6)
+    """
+
+    CHUNK = 4096
+
+    def __init__(self, string=''):
+        """See help(type(x))."""
+        self.chunks = self._split(string) or ['']
+        self.length = len(string)
+        self.starts = [0]
+
+    def _split(self, string):
+        """Split string to chunks of normal size."""
+        if len(string) <= 2 * self.CHUNK:
+            return [string] if string != '' else []
+        return [string[i:i+self.CHUNK] for i in range(0, len(string), self.CHUNK)]
+
+    def _locate(self, pos):
+        """Return index of chunk, which contains position pos."""
+        starts, chunks = self.starts, self.chunks
+        # Offsets after the last substitution are calculated lazily
+        index = len(starts) - 1
+        while starts[-1] <= pos and index + 1 < len(chunks):
+            starts.append(starts[-1] + len(chunks[index]))
+            index += 1
+        return bisect_right(starts, pos) - 1
+
+    def __len__(self):
+        """Length of the word."""
+        return self.length
+
+    def __str__(self):
+        """Content of the word."""
+        return ''.join(self.chunks)
+
+    def __iter__(self):
+        """Iterate over characters."""
+        return chain.from_iterable(self.chunks)
+
+    def _following(self, index, count):
+        """Return first count characters after chunk with given index."""
+        result = ''
+        for chunk in self.chunks[index+1:]:
+            if len(result) >= count:
+                break
+            result += chunk[:count-len(result)]
+        return result
+
+    def find(self, sub, start=0, end=None):
+        """Same as str.find."""
+        if end is None or end > self.length:
+            end = self.length
+        if start + len(sub) > end:
+            return -1
+        if sub == '':
+            return start
+
+        index = self._locate(start)
+        offset = self.starts[index]
+        while index < len(self.chunks) and offset + len(sub) <= end:
+            chunk = self.chunks[index]
+            low = max(start - offset, 0)
+
+            # Occurrence inside of the chunk
+            result = chunk.find(sub, low, end - offset)
+            if result != -1:
+                result += offset
+
+            # Occurrence, which starts in the chunk and ends in the next ones
+            border = max(low, len(chunk) - len(sub) + 1)
+            if result == -1 and border < len(chunk) and end - offset - border >= len(sub):
+                window = chunk[border:] + self._following(index, len(sub) - 1)
+                found = window.find(sub, 0, end - offset - border)
+                if found != -1 and found < len(chunk) - border:
+                    result = offset + border + found
+
+            if result != -1:
+                return result
+            offset += len(chunk)
+            index += 1
+        return -1
+
+    def substitute(self, pos, length, text):
+        """Replace self[pos:pos+length] by text."""
+        first = self._locate(pos)
+        last = first
+        end = pos + length
+        stop = self.starts[first] + len(self.chunks[first])
+        while stop < end and last + 1 < len(self.chunks):
+            last += 1
+            stop += len(self.chunks[last])
+
+        head = self.chunks[first][:pos - self.starts[first]]
+        tail = self.chunks[last][len(self.chunks[last]) - (stop - end):]
+        replacement = self._split(head + text + tail)
+
+        # Glue too small piece to the neighbour
+        if len(replacement) <= 1 and len(self.chunks) > last - first + 1:
+            small = replacement[0] if replacement else ''
+            if len(small) < self.CHUNK // 4:
+                if last + 1 < len(self.chunks):
+                    last += 1
+                    replacement = self._split(small + self.chunks[last])
+                else:
+                    first -= 1
+                    replacement = self._split(self.chunks[first] + small)
+
+        self.chunks[first:last+1] = replacement
+        if not self.chunks:
+            self.chunks.append('')
+        self.length += len(text) - length
+        del self.starts[min(first + 1, len(self.chunks)):]
+
+
+class RopeWord:
+
+    """Rope-backed word: substitution costs O(edit), not O(word)."""
+
+    @staticmethod
+    def accepts(string):
+        """Any string can be stored."""
+        return True
+
+    @staticmethod
+    def encode(text):
+        """Parts of rules are strings."""
+        return text
+
+    @staticmethod
+    def make(string):
+        """Create word from string."""
+        return Rope(string)
+
+    @staticmethod
+    def substitute(word, pos, length, text):
+        """Replace word[pos:pos+length] by text in place."""
+        word.substitute(pos, length, text)
+        return word
+
+    @staticmethod
+    def render(word):
+        """Return word as string."""
+        return str(word)
+
+    @staticmethod
+    def prefix(word, size):
+        """Return first size characters of the word."""
+        parts = []
+        for chunk in word.chunks:
+            if size <= 0:
+                break
+            parts.append(chunk[:size])
+            size -= len(chunk)
+        return ''.join(parts)
+
+
+class BytesWord:
+
+    """ASCII word in bytearray: substitution is done in place, without new objects.
+
+    Only ASCII strings are accepted, rules are encoded to bytes.
+    """
+
+    @staticmethod
+    def accepts(string):
+        """Return True for ASCII string."""
+        return string.isascii()
+
+    @staticmethod
+    def encode(text):
+        """Return part of rule as bytes."""
+        return text.encode('ascii')
+
+    @staticmethod
+    def make(string):
+        """Create word from string."""
+        return bytearray(string, 'ascii')
+
+    @staticmethod
+    def substitute(word, pos, length, text):
+        """Replace word[pos:pos+length] by text in place."""
+        word[pos:pos+length] = text
+        return word
+
+    @staticmethod
+    def render(word):
+        """Return word as string."""
+        return word.decode('ascii')
+
+    @staticmethod
+    def prefix(word, size):
+        """Return first size characters of the word."""
+        return word[:size].decode('ascii')
+
+
+WORDS = {'str': StrWord,
+         'rope': RopeWord,
+         'bytes': BytesWord}
+
+def get_word_kind(name):
+    """Return word kind by its name."""
+    if name not in WORDS:
+        raise ValueError('Unknown word representation: ' + name)
+    return WORDS[name]